@@ -0,0 +1,89 @@
+"""
+Cache-Control headers for pages that can be cached by a CDN - used for the
+home, shop, product details and markets pages.
+The bag in the header is loaded by bag.js after the page loads (see
+cart.views.bag_summary), so these pages are the same for every anonymous
+user. They're marked public unless the response is specific to the user:
+- the user is logged in
+- a message toast was shown on the page
+- a form on the page has a CSRF token, or a cookie is being set
+Otherwise they're marked private, so shared caches don't store them.
+A request without a session cookie is anonymous, so the session isn't
+read to decide. The pages still read the session (the user in the
+header), which makes SessionMiddleware add Vary: Cookie - and every
+visitor has different cookies (e.g. the CSRF cookie from the bag summary),
+so a CDN would never share the page. PublicCacheMiddleware removes Cookie
+from Vary on public responses. The CDN should pass requests with the
+session cookie straight to the site rather than serve them from its cache.
+"""
+from functools import wraps
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.utils.cache import cc_delim_re, patch_cache_control
+from django.utils.deprecation import MiddlewareMixin
+
+# how long (seconds) a shared cache can serve the page without checking
+PUBLIC_MAX_AGE = 300
+
+
+def _is_anonymous(request):
+    """
+    True if the user isn't logged in - without reading the session if there
+    is no session cookie
+    """
+    return (
+        settings.SESSION_COOKIE_NAME not in request.COOKIES
+        or not request.user.is_authenticated
+    )
+
+
+def _is_public(request, response):
+    """True if the response is the same for every anonymous user"""
+    return (
+        response.status_code == 200
+        and _is_anonymous(request)
+        and not get_messages(request).used
+        and not request.META.get('CSRF_COOKIE_USED')
+        and not response.cookies
+    )
+
+
+def public_for_anonymous(max_age=PUBLIC_MAX_AGE):
+    """
+    View decorator - add Cache-Control: public with max_age to the response
+    if it's the same for every anonymous user, otherwise private
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped_view(request, *args, **kwargs):
+            response = view(request, *args, **kwargs)
+            if hasattr(response, 'render') and callable(response.render):
+                response.render()
+            if _is_public(request, response):
+                patch_cache_control(response, public=True, max_age=max_age)
+                response.public_for_anonymous = True
+            else:
+                patch_cache_control(response, private=True)
+            return response
+        return wrapped_view
+    return decorator
+
+
+class PublicCacheMiddleware(MiddlewareMixin):
+    """
+    Remove Cookie from the Vary header of responses marked public by
+    public_for_anonymous. Must be above SessionMiddleware in MIDDLEWARE, so
+    it runs after SessionMiddleware adds the header.
+    """
+    def process_response(self, request, response):
+        if (getattr(response, 'public_for_anonymous', False)
+                and response.has_header('Vary')):
+            vary = [
+                header for header in cc_delim_re.split(response['Vary'])
+                if header.lower() != 'cookie'
+            ]
+            if vary:
+                response['Vary'] = ', '.join(vary)
+            else:
+                del response['Vary']
+        return response
@@ -1,3 +1,19 @@
+"""admin set up for 'cart' app, show CartItems inside Carts"""
 from django.contrib import admin
+from .models import Cart, CartItem
 
-# Register your models here.
+
+class CartItemAdminInline(admin.TabularInline):
+    """CartItems will show up inside the relevant Cart"""
+    model = CartItem
+    readonly_fields = ('updated_on',)
+
+
+class CartAdmin(admin.ModelAdmin):
+    """Admin set up for Cart model, to check on users' carts"""
+    inlines = (CartItemAdminInline,)
+    list_display = ('user', 'created_on',)
+    ordering = ('-created_on',)
+
+
+admin.site.register(Cart, CartAdmin)
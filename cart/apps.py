@@ -1,6 +1,15 @@
+"""
+config for cart app - added function to override ready method, to import
+signals module - used to add the session cart to the user's saved cart
+when they log in
+"""
 from django.apps import AppConfig
 
 
 class CartConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'cart'
+
+    def ready(self):
+        """ override ready method - import signals module """
+        import cart.signals
@@ -1,26 +1,33 @@
 """context processor for cart items, totals and delivery charges"""
 from decimal import Decimal
 from django.conf import settings
-from django.shortcuts import get_object_or_404
+from django.http import Http404
+from django.utils.functional import SimpleLazyObject
 from products.models import Product
+from .storage import get_cart
 
 
-def cart_contents(request):
+def get_cart_summary(cart):
     """
-    Context processor - returns context dict for use by any template.
-    Get cart from session, if not there then create cart empty dictionary.
-    Iterate through items in cart dict, get product, set total and count,
-    append dict of item_id, quantity, product object to cart_items list.
+    Build the cart items, totals and delivery charges for a cart dictionary
+    of {item_id: quantity}.
+    All products in the cart are fetched in one query (with their category
+    joined), rather than one query per item. Raise 404 if a product in the
+    cart no longer exists.
     Calculate delivery charge based on threshold in settings.py and amt
     of spend left to get free delivery
     """
     cart_items = []
     total = 0
     product_count = 0
-    cart = request.session.get('cart', {})
+    products = Product.objects.select_related('category').in_bulk(
+        [int(item_id) for item_id in cart]
+        )
 
     for item_id, quantity in cart.items():
-        product = get_object_or_404(Product, pk=item_id)
+        product = products.get(int(item_id))
+        if product is None:
+            raise Http404('No Product matches the given query.')
         total += quantity * product.price
         product_count += quantity
         cart_items.append({
@@ -38,7 +45,7 @@ def cart_contents(request):
 
     grand_total = delivery + total
 
-    context = {
+    return {
         'cart_items': cart_items,
         'total': total,
         'product_count': product_count,
@@ -47,4 +54,34 @@ def cart_contents(request):
         'free_delivery_threshold': settings.FREE_DELIVERY_THRESHOLD,
         'grand_total': grand_total,
     }
+
+
+def cart_contents(request):
+    """
+    Context processor - returns context dict for use by any template.
+    Nothing is calculated until a template uses one of the variables, so
+    pages that don't show the bag don't query the products. The summary is
+    then built once (see get_cart_summary) and shared by all the variables.
+    cart_items is a lazy list; the totals are callables, which templates
+    call when they are used.
+    """
+    summary = SimpleLazyObject(
+        lambda: get_cart_summary(get_cart(request).contents())
+        )
+
+    def lazy_value(key):
+        """return a function that looks up key in the summary when called"""
+        return lambda: summary[key]
+
+    context = {
+        'cart_items': SimpleLazyObject(lambda: summary['cart_items']),
+        'total': lazy_value('total'),
+        'product_count': lazy_value('product_count'),
+        'delivery': lazy_value('delivery'),
+        'free_delivery_spend_needed': lazy_value(
+            'free_delivery_spend_needed'
+            ),
+        'free_delivery_threshold': settings.FREE_DELIVERY_THRESHOLD,
+        'grand_total': lazy_value('grand_total'),
+    }
     return context
@@ -0,0 +1,17 @@
+"""
+Middleware for 'cart' app - writes the cart cookie to the response when
+the cart of an anonymous user changed (see storage.CookieCart)
+"""
+from django.utils.deprecation import MiddlewareMixin
+from .storage import update_cart_cookie
+
+
+class CartCookieMiddleware(MiddlewareMixin):
+    """
+    Set or delete the cart cookie after the view has run. Using
+    MiddlewareMixin so it works with async views too (checkout app)
+    without running them in a separate thread.
+    """
+    def process_response(self, request, response):
+        update_cart_cookie(request, response)
+        return response
@@ -1,3 +1,46 @@
+"""
+Models for 'cart' app - the cart of a logged in user, saved in the
+database so it's kept between sessions and devices. Anonymous users' carts
+are kept in a signed cookie, or the session (see storage.py), and added to
+this at login.
+"""
 from django.db import models
+from django.contrib.auth.models import User
+from products.models import Product
 
-# Create your models here.
+
+class Cart(models.Model):
+    """One cart per user, holding the CartItems"""
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, related_name='cart'
+        )
+    created_on = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        """string method - return the user the cart is for"""
+        return f'Cart for {self.user}'
+
+
+class CartItem(models.Model):
+    """
+    Quantity of a product in a cart. One row per product in each cart, so
+    quantities are updated in place (see storage.DatabaseCart).
+    """
+    class Meta:
+        """one row for each product in a cart"""
+        constraints = [
+            models.UniqueConstraint(
+                fields=['cart', 'product'], name='unique_cart_product',
+            ),
+        ]
+
+    cart = models.ForeignKey(
+        Cart, on_delete=models.CASCADE, related_name='items'
+        )
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    quantity = models.PositiveSmallIntegerField()
+    updated_on = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        """string method - return quantity and product"""
+        return f'{self.quantity} x {self.product}'
@@ -0,0 +1,21 @@
+"""
+To listen for users logging in - the cart they built up while logged out
+(in the cart cookie or session) is added to their saved cart (see
+storage.py).
+"""
+from django.contrib.auth.signals import user_logged_in
+from django.dispatch import receiver
+from .storage import DatabaseCart, get_anonymous_cart
+
+
+@receiver(user_logged_in)
+def merge_anonymous_cart_on_login(sender, request, user, **kwargs):
+    """
+    Handles signals from user logging in
+    Move items from the cookie/session cart into the user's database cart
+    """
+    anonymous_cart = get_anonymous_cart(request)
+    contents = anonymous_cart.contents()
+    if contents:
+        DatabaseCart(user).merge(contents)
+        anonymous_cart.clear()
@@ -0,0 +1,271 @@
+"""
+Where the cart is kept - used by the cart views, context processor and
+checkout. get_cart(request) returns:
+- CookieCart for anonymous users: item ids and quantities packed into a
+  signed cookie (e.g. '12:1|7:3'), so adding to the bag doesn't write to
+  the session table. Written to the response by CartCookieMiddleware.
+- or SessionCart for anonymous users if settings.CART_STORAGE is
+  'session': dict of {item_id: quantity} in the 'cart' session variable
+- DatabaseCart for logged in users: Cart/CartItem rows. Each change is a
+  single UPDATE of the quantity in the row (quantity = quantity + n), so
+  adding to the bag from two tabs at the same time doesn't lose either
+  change, and the session isn't saved on every change to the bag.
+All have the same methods, and contents() returns the same dict, so
+the rest of the code doesn't need to know which one it has.
+When a user logs in, their cookie/session cart is added to their database
+cart (see signals.py).
+"""
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.functions import Least
+from django.utils import timezone
+from products.models import Product
+from .models import Cart, CartItem
+
+# max quantity of each item in the cart (handmade items)
+MAX_QUANTITY = 10
+CART_COOKIE_NAME = 'cart'
+CART_COOKIE_SALT = 'cart.storage'
+CART_COOKIE_MAX_AGE = 60 * 60 * 24 * 30
+
+
+class QuantityLimitError(Exception):
+    """
+    Adding the quantity would bring the item above MAX_QUANTITY.
+    quantity is the quantity already in the cart.
+    """
+    def __init__(self, quantity):
+        super().__init__(f'{quantity} already in cart')
+        self.quantity = quantity
+
+
+class SessionCart:
+    """Cart kept in the session, for anonymous users"""
+    def __init__(self, session):
+        self.session = session
+
+    def contents(self):
+        """dict of {item_id: quantity}"""
+        return dict(self.session.get('cart', {}))
+
+    def _save(self, cart):
+        self.session['cart'] = cart
+
+    def add(self, item_id, quantity):
+        """
+        Add quantity of the item, return the new quantity. Raise
+        QuantityLimitError if it would be above MAX_QUANTITY.
+        """
+        cart = self.contents()
+        current = cart.get(item_id, 0)
+        if current + quantity > MAX_QUANTITY:
+            raise QuantityLimitError(current)
+        cart[item_id] = current + quantity
+        self._save(cart)
+        return cart[item_id]
+
+    def set(self, item_id, quantity):
+        """set the quantity of the item"""
+        cart = self.contents()
+        cart[item_id] = quantity
+        self._save(cart)
+
+    def remove(self, item_id):
+        """remove the item, KeyError if it's not in the cart"""
+        cart = self.contents()
+        cart.pop(item_id)
+        self._save(cart)
+
+    def clear(self):
+        """remove everything from the cart"""
+        self.session.pop('cart', None)
+
+
+def pack_cart(cart):
+    """dict of {item_id: quantity} to string for the cookie, '12:1|7:3'"""
+    return '|'.join(
+        f'{item_id}:{quantity}' for item_id, quantity in cart.items()
+        )
+
+
+def unpack_cart(value):
+    """string from the cookie to dict of {item_id: quantity}"""
+    try:
+        return {
+            item_id: int(quantity)
+            for item_id, quantity in (
+                pair.split(':') for pair in value.split('|') if pair
+                )
+        }
+    except ValueError:
+        return {}
+
+
+class CookieCart(SessionCart):
+    """
+    Cart kept in a signed cookie, for anonymous users. The cart is read
+    once per request and kept on the request, changes are written to the
+    response by CartCookieMiddleware (see update_cart_cookie).
+    A cart in the session from before the cookie was used is read if there
+    is no cookie, and moved to the cookie on the next change.
+    """
+    def __init__(self, request):
+        self.request = request
+
+    def _load(self):
+        value = self.request.get_signed_cookie(
+            CART_COOKIE_NAME, default=None, salt=CART_COOKIE_SALT,
+            max_age=CART_COOKIE_MAX_AGE,
+            )
+        if value is not None:
+            return unpack_cart(value)
+        if self.request.session.session_key:
+            return dict(self.request.session.get('cart', {}))
+        return {}
+
+    def contents(self):
+        """dict of {item_id: quantity}"""
+        if not hasattr(self.request, '_cookie_cart'):
+            self.request._cookie_cart = self._load()
+        return dict(self.request._cookie_cart)
+
+    def _save(self, cart):
+        self.request._cookie_cart = cart
+        self.request._cookie_cart_changed = True
+        if self.request.session.session_key:
+            self.request.session.pop('cart', None)
+
+    def clear(self):
+        """remove everything from the cart"""
+        self._save({})
+
+
+def update_cart_cookie(request, response):
+    """set the cart cookie if the cart changed, delete it if now empty"""
+    if not getattr(request, '_cookie_cart_changed', False):
+        return
+    if request._cookie_cart:
+        response.set_signed_cookie(
+            CART_COOKIE_NAME, pack_cart(request._cookie_cart),
+            salt=CART_COOKIE_SALT, max_age=CART_COOKIE_MAX_AGE,
+            secure=settings.SESSION_COOKIE_SECURE, httponly=True,
+            samesite='Lax',
+            )
+    else:
+        response.delete_cookie(CART_COOKIE_NAME, samesite='Lax')
+
+
+class DatabaseCart:
+    """Cart kept in the database (Cart/CartItem), for logged in users"""
+    def __init__(self, user):
+        self.user = user
+
+    def _items(self):
+        return CartItem.objects.filter(cart__user=self.user)
+
+    def _cart(self):
+        cart, _ = Cart.objects.get_or_create(user=self.user)
+        return cart
+
+    def contents(self):
+        """dict of {item_id: quantity}, in the order items were added"""
+        return {
+            str(product_id): quantity
+            for product_id, quantity in self._items().order_by('id')
+            .values_list('product_id', 'quantity')
+        }
+
+    def _update_or_create(self, item_id, quantity, new_quantity,
+                          items=None):
+        """
+        Update the quantity of the item's row to new_quantity (expression
+        using F('quantity')) - if there is no row, create it with quantity.
+        Only rows in items (queryset, default all of the user's items) are
+        updated. Returns the number of rows updated/created (0 or 1).
+        If two requests create the row at the same time, the unique
+        constraint stops the second, which then updates the row instead.
+        """
+        items = (items if items is not None else self._items()).filter(
+            product_id=item_id
+            )
+        now = timezone.now()
+        if items.update(quantity=new_quantity, updated_on=now):
+            return 1
+        try:
+            with transaction.atomic():
+                CartItem.objects.create(
+                    cart=self._cart(), product_id=item_id, quantity=quantity
+                    )
+            return 1
+        except IntegrityError:
+            return items.update(quantity=new_quantity, updated_on=now)
+
+    def _quantity(self, item_id):
+        return self._items().values_list('quantity', flat=True).get(
+            product_id=item_id
+            )
+
+    def add(self, item_id, quantity):
+        """
+        Add quantity of the item, return the new quantity. Raise
+        QuantityLimitError if it would be above MAX_QUANTITY - the limit is
+        checked in the UPDATE, so it holds with concurrent requests too.
+        The first add of an item creates the row instead, so the quantity
+        is checked before that.
+        """
+        if quantity > MAX_QUANTITY:
+            raise QuantityLimitError(self.contents().get(str(item_id), 0))
+        below_limit = self._items().filter(
+            quantity__lte=MAX_QUANTITY - quantity
+            )
+        if not self._update_or_create(
+                item_id, quantity, F('quantity') + quantity, below_limit):
+            raise QuantityLimitError(self._quantity(item_id))
+        return self._quantity(item_id)
+
+    def set(self, item_id, quantity):
+        """set the quantity of the item"""
+        self._update_or_create(item_id, quantity, quantity)
+
+    def remove(self, item_id):
+        """remove the item, KeyError if it's not in the cart"""
+        deleted, _ = self._items().filter(product_id=item_id).delete()
+        if not deleted:
+            raise KeyError(item_id)
+
+    def clear(self):
+        """remove everything from the cart"""
+        self._items().delete()
+
+    def merge(self, cart):
+        """
+        Add the items in cart (dict of {item_id: quantity}, e.g. from the
+        session) to this cart, up to MAX_QUANTITY of each. Items for
+        products that no longer exist are left out.
+        """
+        existing = set(
+            Product.objects.filter(pk__in=[int(item_id) for item_id in cart])
+            .values_list('pk', flat=True)
+            )
+        with transaction.atomic():
+            for item_id, quantity in cart.items():
+                if int(item_id) in existing:
+                    self._update_or_create(
+                        item_id, min(quantity, MAX_QUANTITY),
+                        Least(F('quantity') + quantity, MAX_QUANTITY)
+                        )
+
+
+def get_anonymous_cart(request):
+    """cart for a user who isn't logged in - cookie or session"""
+    if settings.CART_STORAGE == 'cookie':
+        return CookieCart(request)
+    return SessionCart(request.session)
+
+
+def get_cart(request):
+    """cart for the request - in the database if logged in, else cookie"""
+    if request.user.is_authenticated:
+        return DatabaseCart(request.user)
+    return get_anonymous_cart(request)
@@ -0,0 +1,91 @@
+"""Tests for the cart_contents context processor in 'cart' app"""
+from decimal import Decimal
+from django.contrib.auth.models import AnonymousUser, User
+from django.test import TestCase, RequestFactory, override_settings
+from django.http import Http404
+from products.models import Category, Product
+from .contexts import cart_contents, get_cart_summary
+from .storage import DatabaseCart
+
+
+@override_settings(CART_STORAGE='session')
+class TestCartContents(TestCase):
+    """
+    To test the cart_contents context processor and get_cart_summary, with
+    the cart in the session (see test_storage.py for the cookie)
+    """
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Create instance of Category and 10 instances of Product for tests,
+        prices set as 1 to 10.
+        """
+        category = Category.objects.create(
+            name='category_name',
+            friendly_name='Category'
+        )
+        for product in range(10):
+            Product.objects.create(
+                category=category,
+                name=f'product name {product}',
+                sku=f'44444{product}',
+                description='product description',
+                price=product + 1,
+            )
+
+    def setUp(self):
+        """Create a request with a session containing a cart of 10 items"""
+        self.request = RequestFactory().get('/')
+        self.request.user = AnonymousUser()
+        self.request.session = {
+            'cart': {
+                str(product.id): 1 for product in Product.objects.all()
+            }
+        }
+
+    def test_no_queries_until_context_is_used(self):
+        """Calling the context processor alone should not hit the database"""
+        with self.assertNumQueries(0):
+            cart_contents(self.request)
+
+    def test_all_products_fetched_in_one_query(self):
+        """
+        Using the cart items, their products and categories, and the totals
+        should only take one query, however many items are in the cart.
+        """
+        context = cart_contents(self.request)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(context['cart_items']), 10)
+            for item in context['cart_items']:
+                self.assertEqual(item['product'].category.name,
+                                 'category_name')
+            self.assertEqual(context['total'](), Decimal('55.00'))
+            self.assertEqual(context['product_count'](), 10)
+            self.assertEqual(
+                round(context['grand_total'](), 2), Decimal('60.50')
+                )
+
+    def test_saved_cart_fetched_in_two_queries(self):
+        """
+        For a logged in user, one query for the cart items in the database,
+        then one for the products
+        """
+        self.request.user = User.objects.create_user('user', password='x')
+        DatabaseCart(self.request.user).merge(self.request.session['cart'])
+        context = cart_contents(self.request)
+        with self.assertNumQueries(2):
+            self.assertEqual(len(context['cart_items']), 10)
+            self.assertEqual(context['total'](), Decimal('55.00'))
+
+    def test_summary_totals_with_free_delivery(self):
+        """Total above the free delivery threshold means no delivery cost"""
+        summary = get_cart_summary({'10': 7})
+        self.assertEqual(summary['total'], Decimal('70.00'))
+        self.assertEqual(summary['delivery'], 0)
+        self.assertEqual(summary['free_delivery_spend_needed'], 0)
+        self.assertEqual(summary['grand_total'], Decimal('70.00'))
+
+    def test_missing_product_raises_404(self):
+        """If a product in the cart doesn't exist, raise 404"""
+        with self.assertRaises(Http404):
+            get_cart_summary({'99': 1})
@@ -0,0 +1,224 @@
+"""Tests for the cookie, session and database carts in storage.py"""
+from django.contrib.auth import login
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core import signing
+from django.http import HttpResponse
+from django.test import TestCase, RequestFactory, override_settings
+from products.models import Category, Product
+from .models import CartItem
+from .storage import (
+    CART_COOKIE_NAME, CART_COOKIE_SALT, DatabaseCart, QuantityLimitError,
+    SessionCart, pack_cart, unpack_cart, update_cart_cookie
+    )
+
+
+def cookie_cart(client):
+    """contents of the cart cookie in the test client"""
+    signer = signing.get_cookie_signer(
+        salt=CART_COOKIE_NAME + CART_COOKIE_SALT
+        )
+    return unpack_cart(signer.unsign(client.cookies[CART_COOKIE_NAME].value))
+
+
+class TestDatabaseCart(TestCase):
+    """Tests for the cart of a logged in user, saved in the database"""
+    @classmethod
+    def setUpTestData(cls):
+        """Create user, category and 3 products"""
+        cls.user = User.objects.create_user('shopper', password='secret12')
+        category = Category.objects.create(
+            name='category_name', friendly_name='Category'
+            )
+        for number in range(3):
+            Product.objects.create(
+                category=category,
+                name=f'product {number}',
+                description='product description',
+                price=10,
+            )
+
+    def test_add_set_and_remove(self):
+        """Quantities updated in the rows, contents same as session cart"""
+        cart = DatabaseCart(self.user)
+        self.assertEqual(cart.add('1', 2), 2)
+        self.assertEqual(cart.add('2', 1), 1)
+        self.assertEqual(cart.add('1', 3), 5)
+        self.assertEqual(cart.contents(), {'1': 5, '2': 1})
+        cart.set('2', 4)
+        cart.remove('1')
+        self.assertEqual(cart.contents(), {'2': 4})
+        with self.assertRaises(KeyError):
+            cart.remove('1')
+        cart.clear()
+        self.assertEqual(cart.contents(), {})
+
+    def test_adds_from_two_requests_both_counted(self):
+        """
+        Adds from separate requests (e.g. two tabs) increment the quantity
+        in the database, rather than overwriting each other
+        """
+        first_tab = DatabaseCart(self.user)
+        second_tab = DatabaseCart(self.user)
+        first_tab.contents()
+        second_tab.contents()
+        first_tab.add('1', 2)
+        second_tab.add('1', 3)
+        self.assertEqual(CartItem.objects.get().quantity, 5)
+
+    def test_quantity_limit(self):
+        """Can't go above 10 of an item, error has the current quantity"""
+        cart = DatabaseCart(self.user)
+        cart.add('1', 8)
+        with self.assertRaises(QuantityLimitError) as error:
+            cart.add('1', 3)
+        self.assertEqual(error.exception.quantity, 8)
+        self.assertEqual(cart.add('1', 2), 10)
+
+    def test_quantity_limit_on_first_add(self):
+        """Adding more than 10 of an item not in the cart is refused too"""
+        cart = DatabaseCart(self.user)
+        with self.assertRaises(QuantityLimitError) as error:
+            cart.add('1', 11)
+        self.assertEqual(error.exception.quantity, 0)
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_cart_not_kept_in_session(self):
+        """Adding to the bag when logged in doesn't add cart to session"""
+        self.client.login(username='shopper', password='secret12')
+        self.client.post('/cart/add/1', {
+            'quantity': 2, 'redirect_url': '/products/1'
+            })
+        self.assertNotIn('cart', self.client.session)
+        self.assertEqual(DatabaseCart(self.user).contents(), {'1': 2})
+
+    def test_cookie_cart_merged_at_login(self):
+        """
+        Items added when logged out are added to the saved cart at login,
+        and the cookie is deleted
+        """
+        DatabaseCart(self.user).add('1', 7)
+        self.client.post('/cart/add/1', {
+            'quantity': 5, 'redirect_url': '/products/1'
+            })
+        request = RequestFactory().get('/')
+        request.COOKIES = {
+            CART_COOKIE_NAME: self.client.cookies[CART_COOKIE_NAME].value
+            }
+        request.session = self.client.session
+        login(request, self.user,
+              backend='django.contrib.auth.backends.ModelBackend')
+        self.assertEqual(DatabaseCart(self.user).contents(), {'1': 10})
+        response = HttpResponse()
+        update_cart_cookie(request, response)
+        self.assertEqual(response.cookies[CART_COOKIE_NAME]['max-age'], 0)
+
+    @override_settings(CART_STORAGE='session')
+    def test_session_cart_merged_at_login(self):
+        """
+        Items added when logged out are added to the saved cart at login,
+        up to 10 of each, and removed from the session
+        """
+        DatabaseCart(self.user).add('1', 7)
+        self.client.post('/cart/add/1', {
+            'quantity': 5, 'redirect_url': '/products/1'
+            })
+        self.client.post('/cart/add/2', {
+            'quantity': 1, 'redirect_url': '/products/2'
+            })
+        self.client.login(username='shopper', password='secret12')
+        self.assertNotIn('cart', self.client.session)
+        self.assertEqual(
+            DatabaseCart(self.user).contents(), {'1': 10, '2': 1}
+            )
+        response = self.client.get('/cart/')
+        self.assertEqual(len(response.context['cart_items']), 2)
+
+    def test_merge_skips_deleted_products(self):
+        """Session cart item for a product that was deleted is left out"""
+        DatabaseCart(self.user).merge({'3': 1, '99': 2})
+        self.assertEqual(DatabaseCart(self.user).contents(), {'3': 1})
+
+
+class TestCookieCart(TestCase):
+    """Tests for the cart in a signed cookie, for anonymous users"""
+    @classmethod
+    def setUpTestData(cls):
+        """Create category and 2 products"""
+        category = Category.objects.create(
+            name='category_name', friendly_name='Category'
+            )
+        cls.products = [
+            Product.objects.create(
+                category=category,
+                name=f'product {number}',
+                description='product description',
+                price=10,
+            )
+            for number in range(2)
+        ]
+
+    def add(self, product, quantity):
+        """post add to cart form for the product"""
+        return self.client.post(f'/cart/add/{product.id}', {
+            'quantity': quantity, 'redirect_url': '/products/'
+            })
+
+    def test_pack_and_unpack(self):
+        """Cart packed into a short string and back"""
+        self.assertEqual(pack_cart({'12': 1, '7': 3}), '12:1|7:3')
+        self.assertEqual(unpack_cart('12:1|7:3'), {'12': 1, '7': 3})
+        self.assertEqual(unpack_cart('12:x'), {})
+
+    def test_bag_changes_dont_write_session(self):
+        """
+        Adding to the bag and showing the message needs no session, the
+        cart and message are in cookies
+        """
+        first, second = self.products
+        self.add(first, 2)
+        self.add(second, 1)
+        response = self.client.get('/cart/')
+        self.assertContains(response, 'added to your bag')
+        self.assertEqual(len(response.context['cart_items']), 2)
+        self.assertEqual(
+            cookie_cart(self.client), {str(first.id): 2, str(second.id): 1}
+            )
+        self.assertFalse(Session.objects.exists())
+        self.assertNotIn('sessionid', self.client.cookies)
+
+    def test_tampered_cookie_ignored(self):
+        """Cookie that doesn't match its signature gives empty cart"""
+        self.add(self.products[0], 2)
+        value = self.client.cookies[CART_COOKIE_NAME].value
+        self.client.cookies[CART_COOKIE_NAME] = value.replace(':2', ':9', 1)
+        response = self.client.get('/cart/')
+        self.assertEqual(len(response.context['cart_items']), 0)
+
+    def test_cart_from_session_moved_to_cookie(self):
+        """Cart in the session from before is used, then moved"""
+        product = self.products[0]
+        session = self.client.session
+        session['cart'] = {str(product.id): 3}
+        session.save()
+        response = self.client.get('/cart/')
+        self.assertEqual(response.context['cart_items'][0]['quantity'], 3)
+        self.add(product, 1)
+        self.assertNotIn('cart', self.client.session)
+        self.assertEqual(cookie_cart(self.client), {str(product.id): 4})
+
+
+class TestSessionCart(TestCase):
+    """Tests for the cart in the session, for anonymous users"""
+
+    def test_add_and_limit(self):
+        """Quantities kept in the session dict, max of 10 of each"""
+        session = {}
+        cart = SessionCart(session)
+        self.assertEqual(cart.add('1', 4), 4)
+        self.assertEqual(cart.add('1', 6), 10)
+        with self.assertRaises(QuantityLimitError):
+            cart.add('1', 1)
+        self.assertEqual(session, {'cart': {'1': 10}})
+        cart.clear()
+        self.assertEqual(session, {})
@@ -4,6 +4,7 @@ from django.test import TestCase
 from django.contrib.messages import get_messages
 from products.models import Category, Product
 from .templatetags.cart_tools import calc_subtotal
+from .test_storage import cookie_cart
 
 
 class TestViewCartView(TestCase):
@@ -360,3 +361,72 @@ class TestRemoveFromView(TestCase):
             messages[0].message,
             "Error removing item: '1'"
             )
+
+
+class TestCartJsonViews(TestCase):
+    """To test the JSON views used by script.js to change the cart"""
+    @classmethod
+    def setUpTestData(cls):
+        """Create instance of Category and Product for test"""
+        Category.objects.create(
+            name='category_name',
+            friendly_name='Category'
+        )
+        Product.objects.create(
+            category=Category.objects.get(id=1),
+            name='Large Wall Hanging',
+            sku='12345',
+            description='product description',
+            price=12.50,
+            is_active=True,
+        )
+
+    def test_add_returns_item_totals_and_bag_summary(self):
+        """
+        Adding returns the item's quantity and subtotal, the bag totals,
+        and a success toast with the bag summary. No message is left for
+        the next page.
+        """
+        self.client.post('/cart/json/add/1/', {'quantity': 1})
+        response = self.client.post('/cart/json/add/1/', {'quantity': 2})
+        data = response.json()
+        self.assertEqual(data['item'], {
+            'item_id': '1', 'quantity': 3, 'subtotal': '37.50'
+            })
+        self.assertEqual(data['product_count'], 3)
+        self.assertEqual(data['total'], '37.50')
+        self.assertIn('Quantity for Large Wall Hanging updated to 3',
+                      data['toast'])
+        self.assertIn('Your Bag (3)', data['toast'])
+        self.assertIn('View Bag & Checkout', data['toast'])
+        self.assertEqual(cookie_cart(self.client), {'1': 3})
+        response = self.client.get('/cart/')
+        self.assertEqual(len(list(get_messages(response.wsgi_request))), 0)
+
+    def test_add_above_limit_returns_error(self):
+        """Going above 10 returns 400 with error toast, cart unchanged"""
+        self.client.post('/cart/json/add/1/', {'quantity': 9})
+        response = self.client.post('/cart/json/add/1/', {'quantity': 2})
+        self.assertEqual(response.status_code, 400)
+        data = response.json()
+        self.assertEqual(data['item']['quantity'], 9)
+        self.assertIn('Error!', data['toast'])
+        self.assertIn('You have 9 of', data['toast'])
+
+    def test_adjust_and_remove(self):
+        """Adjust sets quantity, adjust to 0 or remove takes item out"""
+        self.client.post('/cart/json/add/1/', {'quantity': 1})
+        response = self.client.post('/cart/json/adjust/1/', {'quantity': 4})
+        self.assertEqual(response.json()['item']['quantity'], 4)
+        self.assertEqual(response.json()['grand_total'], '55.00')
+        response = self.client.post('/cart/json/adjust/1/', {'quantity': 0})
+        self.assertIsNone(response.json()['item'])
+        self.assertEqual(response.json()['product_count'], 0)
+        response = self.client.post('/cart/json/remove/1/')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('is not in your bag', response.json()['toast'])
+
+    def test_get_not_allowed(self):
+        """JSON views only accept POST"""
+        response = self.client.get('/cart/json/add/1/')
+        self.assertEqual(response.status_code, 405)
@@ -5,7 +5,14 @@ from . import views
 
 urlpatterns = [
     path('', views.view_cart, name='view_cart'),
+    path('summary/', views.bag_summary, name='bag_summary'),
     path('add/<item_id>', views.add_to_cart, name='add_to_cart'),
     path('adjust/<item_id>', views.adjust_cart, name='adjust_cart'),
     path('remove/<item_id>/', views.remove_from_cart, name='remove_from_cart'),
+    path('json/add/<item_id>/', views.add_to_cart_json,
+         name='add_to_cart_json'),
+    path('json/adjust/<item_id>/', views.adjust_cart_json,
+         name='adjust_cart_json'),
+    path('json/remove/<item_id>/', views.remove_from_cart_json,
+         name='remove_from_cart_json'),
 ]
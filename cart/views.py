@@ -1,9 +1,24 @@
-"""Views for cart app - view, adjust, remove items to be purchased"""
+"""
+Views for cart app - view, adjust, remove items to be purchased.
+Add, adjust and remove each have a form view, which redirects, and a JSON
+view used by script.js, which returns the updated item, the totals and a
+toast with the bag summary, so the page doesn't need to be reloaded.
+"""
 from django.shortcuts import (
     render, redirect, reverse, HttpResponse, get_object_or_404
     )
 from django.contrib import messages
+from django.contrib.messages.storage.base import Message
+from django.http import JsonResponse
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+from django.views.decorators.cache import never_cache
+from django.views.decorators.http import require_POST
 from products.models import Product
+from .contexts import get_cart_summary
+from .storage import get_cart, QuantityLimitError
+
+BAG_TAG = 'show_bag_in_toast'
 
 
 def view_cart(request):
@@ -11,93 +26,187 @@ def view_cart(request):
     return render(request, 'cart/cart.html')
 
 
+@never_cache
+def bag_summary(request):
+    """
+    Number of items and grand total in the cart, for the bag in the header
+    (loaded by bag.js after page load, so the pages themselves can be
+    cached). Also a CSRF token for forms on cached pages, which don't have
+    one (see cache_headers.py).
+    """
+    summary = get_cart_summary(get_cart(request).contents())
+    return JsonResponse({
+        'product_count': summary['product_count'],
+        'grand_total': f"{summary['grand_total']:.2f}",
+        'csrf_token': get_token(request),
+    })
+
+
+def _add_item(request, item_id, product, quantity):
+    """
+    Get the cart for the user (see storage.py - session if logged out,
+    database if logged in) and add the quantity. If the total would be
+    above max of 10, return error, else the new quantity (or that the item
+    was added, if it wasn't in the cart already).
+    Returns tuple of (message level, message).
+    """
+    try:
+        new_quantity = get_cart(request).add(item_id, quantity)
+    except QuantityLimitError as error:
+        return messages.ERROR, (
+            'As these are handmade items, I only sell a max of 10 of each '
+            f'at a time. You have {error.quantity} of "{product.name}" '
+            f'in your bag and adding another {quantity} will bring total '
+            f'quantity for that item above 10. Thank you for your interest'
+            ' but please reduce the quantity and try again. Thank you!'
+            )
+    if new_quantity == quantity:
+        return messages.SUCCESS, f'{product.name} added to your bag'
+    return (
+        messages.SUCCESS,
+        f'Quantity for {product.name} updated to {new_quantity}'
+        )
+
+
+def _adjust_item(request, item_id, product, quantity):
+    """
+    If quantity greater than zero, set the new quantity, otherwise remove
+    the item. Returns tuple of (message level, message).
+    """
+    cart = get_cart(request)
+    if quantity > 0:
+        cart.set(item_id, quantity)
+        return (
+            messages.SUCCESS,
+            f'Quantity for {product.name} updated to {quantity}'
+            )
+    return _remove_item(request, item_id, product)
+
+
+def _remove_item(request, item_id, product):
+    """
+    Remove the item from the cart. Returns tuple of (message level,
+    message), error if it wasn't in the cart.
+    """
+    try:
+        get_cart(request).remove(item_id)
+    except KeyError:
+        return messages.ERROR, f'{product.name} is not in your bag'
+    return messages.SUCCESS, f'{product.name} removed from your bag'
+
+
+def _add_message(request, level, message):
+    """add message for the next page, with the bag summary if success"""
+    messages.add_message(
+        request, level, message,
+        extra_tags=BAG_TAG if level == messages.SUCCESS else ''
+        )
+
+
+def _cart_json(request, item_id, level, message):
+    """
+    JSON response for the cart JSON views, with the item (None if removed),
+    totals for the bag, and the toast to show - success toast with the bag
+    summary (cart/includes/mini_bag.html), or error toast with status 400.
+    The cart and its products are read once, for all of these.
+    """
+    summary = get_cart_summary(get_cart(request).contents())
+    item = next(
+        (item for item in summary['cart_items']
+         if item['item_id'] == item_id),
+        None
+        )
+    if level == messages.SUCCESS:
+        template = 'includes/toasts/toast_success.html'
+        toast_message = Message(level, message, extra_tags=BAG_TAG)
+    else:
+        template = 'includes/toasts/toast_error.html'
+        toast_message = Message(level, message)
+    return JsonResponse({
+        'item': item and {
+            'item_id': item_id,
+            'quantity': item['quantity'],
+            'subtotal': f"{item['quantity'] * item['product'].price:.2f}",
+        },
+        'product_count': summary['product_count'],
+        'total': f"{summary['total']:.2f}",
+        'delivery': f"{summary['delivery']:.2f}",
+        'grand_total': f"{summary['grand_total']:.2f}",
+        'free_delivery_spend_needed':
+            f"{summary['free_delivery_spend_needed']:.2f}",
+        'toast': render_to_string(
+            template, {**summary, 'message': toast_message}, request=request
+            ),
+    }, status=200 if level == messages.SUCCESS else 400)
+
+
 def add_to_cart(request, item_id):
     """
-    Add item to the cart. Get quantity from posted form.
-    Get cart from session, if not there then create cart empty dictionary.
-    If item already in cart, check if total will be above max of 10, if yes
-    then show error, else increase quantity.
-    If item not already in cart then add it to the cart.
-    Overwrite the session variable cart with new cart.
+    Add item to the cart (see _add_item). Get quantity from posted form.
     Use 'redirect_url' hidden input in form to redirect user back to same page.
     """
     product = get_object_or_404(Product, pk=item_id)
     quantity = int(request.POST.get('quantity'))
     redirect_url = request.POST.get('redirect_url')
-    cart = request.session.get('cart', {})
-    if item_id in list(cart.keys()):
-        if cart[item_id] + quantity > 10:
-            messages.error(
-                request,
-                'As these are handmade items, I only sell a max of 10 of each '
-                f'at a time. You have {cart[item_id]} of "{product.name}" '
-                f'in your bag and adding another {quantity} will bring total '
-                f'quantity for that item above 10. Thank you for your interest'
-                ' but please reduce the quantity and try again. Thank you!'
-                )
-        else:
-            cart[item_id] += quantity
-            messages.success(
-                request,
-                f'Quantity for {product.name} updated to {cart[item_id]}',
-                extra_tags='show_bag_in_toast'
-                )
-    else:
-        cart[item_id] = quantity
-        messages.success(
-            request,
-            f'{product.name} added to your bag',
-            extra_tags='show_bag_in_toast'
-            )
-    request.session['cart'] = cart
+    _add_message(request, *_add_item(request, item_id, product, quantity))
     return redirect(redirect_url)
 
 
 def adjust_cart(request, item_id):
     """
-    Handles the form submitted from cart.html page to adjust quantity.
-    If quantity greater than zero, set the new quantity, otherwise remove it.
-    Overwrite cart session variable with new cart.
-    Return user to cart page.
+    Handles the form submitted from cart.html page to adjust quantity (see
+    _adjust_item). Return user to cart page.
     """
     product = get_object_or_404(Product, pk=item_id)
     quantity = int(request.POST.get('quantity'))
-    cart = request.session.get('cart', {})
-    if quantity > 0:
-        cart[item_id] = quantity
-        messages.success(
-            request,
-            f'Quantity for {product.name} updated to {cart[item_id]}',
-            extra_tags='show_bag_in_toast'
-            )
-    else:
-        cart.pop(item_id)
-        messages.success(
-            request,
-            f'{product.name} removed from your bag',
-            extra_tags='show_bag_in_toast'
-            )
-    request.session['cart'] = cart
+    _add_message(request, *_adjust_item(request, item_id, product, quantity))
     return redirect(reverse('view_cart'))
 
 
 def remove_from_cart(request, item_id):
     """
     Handles the link from cart.html to remove an item (via javascript).
-    Get cart from session, remove item, update cart session variable.
+    Get the cart for the user, remove item.
     Return success response. If error, raise server error.
     """
     try:
         product = get_object_or_404(Product, pk=item_id)
-        cart = request.session.get('cart', {})
-        cart.pop(item_id)
-        request.session['cart'] = cart
+        get_cart(request).remove(item_id)
         messages.success(
             request,
             f'{product.name} removed from your bag',
-            extra_tags='show_bag_in_toast'
+            extra_tags=BAG_TAG
             )
         return HttpResponse(status=200)
     except Exception as error:
         messages.error(request, f'Error removing item: {error}')
         return HttpResponse(status=500)
+
+
+@require_POST
+def add_to_cart_json(request, item_id):
+    """Add item to the cart from the product page (script.js)"""
+    product = get_object_or_404(Product, pk=item_id)
+    quantity = int(request.POST.get('quantity'))
+    return _cart_json(
+        request, item_id, *_add_item(request, item_id, product, quantity)
+        )
+
+
+@require_POST
+def adjust_cart_json(request, item_id):
+    """Adjust quantity of item from the cart page (script.js)"""
+    product = get_object_or_404(Product, pk=item_id)
+    quantity = int(request.POST.get('quantity'))
+    return _cart_json(
+        request, item_id, *_adjust_item(request, item_id, product, quantity)
+        )
+
+
+@require_POST
+def remove_from_cart_json(request, item_id):
+    """Remove item from the cart page (script.js)"""
+    product = get_object_or_404(Product, pk=item_id)
+    return _cart_json(
+        request, item_id, *_remove_item(request, item_id, product)
+        )
@@ -1,6 +1,6 @@
 """admin set up for 'checkout' app, show OrderLineItem inside Orders"""
 from django.contrib import admin
-from .models import Order, OrderLineItem
+from .models import Order, OrderLineItem, OutboxEmail, WebhookEvent
 
 
 class OrderLineItemAdminInline(admin.TabularInline):
@@ -32,4 +32,26 @@ class OrderAdmin(admin.ModelAdmin):
     ordering = ('-date',)
 
 
+class WebhookEventAdmin(admin.ModelAdmin):
+    """
+    Admin set up for WebhookEvent model, to check on events that failed
+    """
+    list_display = ('stripe_event_id', 'event_type', 'status', 'attempts',
+                    'created_on', 'processed_on', 'processing_ms',)
+    list_filter = ('status', 'event_type',)
+    ordering = ('-created_on',)
+
+
+class OutboxEmailAdmin(admin.ModelAdmin):
+    """
+    Admin set up for OutboxEmail model, to check on emails that failed
+    """
+    list_display = ('order', 'to_email', 'status', 'attempts',
+                    'next_attempt_on', 'sent_on',)
+    list_filter = ('status',)
+    ordering = ('-created_on',)
+
+
 admin.site.register(Order, OrderAdmin)
+admin.site.register(WebhookEvent, WebhookEventAdmin)
+admin.site.register(OutboxEmail, OutboxEmailAdmin)
@@ -1,7 +1,8 @@
 """
 config for checkout app - added function to override ready
 method, to import signals module - used to listen for signals
-from OrderLineItem instance to call method to update Order instance
+from OrderLineItem instance to call method to update Order instance,
+and to configure the stripe library (see stripe_client.py)
 """
 from django.apps import AppConfig
 
@@ -11,5 +12,7 @@ class CheckoutConfig(AppConfig):
     name = 'checkout'
 
     def ready(self):
-        """ override ready method - import signals module """
+        """ override ready method - import signals module, set up stripe """
         import checkout.signals
+        from checkout.stripe_client import configure_stripe
+        configure_stripe()
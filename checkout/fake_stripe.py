@@ -0,0 +1,260 @@
+"""
+Fake Stripe API server for tests and local measurement - runs on
+localhost in a thread, and handles the payment intent calls the checkout
+app makes. Point the stripe library at it by setting stripe.api_base to
+server.url. Every request is recorded in server.requests, so tests can
+count the round trips to Stripe, and the connections used in
+server.connections.
+Confirming a payment intent (what stripe.js does in the browser) marks it
+succeeded and sends a payment_intent.succeeded event, signed with
+webhook_secret like Stripe does, to send_webhook - e.g. post_webhook(url)
+to post it to the webhook view of a running server, or see load_test.py.
+Usage:
+    with FakeStripeServer() as server:
+        stripe.api_base = server.url
+        ...
+"""
+import hashlib
+import hmac
+import json
+import re
+import secrets
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+from urllib.request import Request, urlopen
+
+
+def parse_form(body):
+    """
+    Decode form encoded body as sent by the stripe library, where nested
+    values are sent as e.g. metadata[cart]=... into nested dicts
+    """
+    data = {}
+    for key, value in parse_qsl(body, keep_blank_values=True):
+        parts = re.findall(r'[^\[\]]+', key)
+        target = data
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        target[parts[-1]] = value
+    return data
+
+
+def stripe_signature(payload, secret, timestamp=None):
+    """Stripe-Signature header for the payload (str), signed with secret"""
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    signature = hmac.new(
+        secret.encode(), f'{timestamp}.{payload}'.encode(), hashlib.sha256
+        ).hexdigest()
+    return f't={timestamp},v1={signature}'
+
+
+def post_webhook(url):
+    """send_webhook function that posts the event to the url"""
+    def send_webhook(payload, signature):
+        request = Request(url, data=payload.encode(), headers={
+            'Content-Type': 'application/json',
+            'Stripe-Signature': signature,
+        })
+        with urlopen(request) as response:
+            return response.status
+    return send_webhook
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """
+    Request handler - routes requests to the FakeStripeServer. HTTP/1.1,
+    so connections are kept alive between requests, like Stripe's.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        """don't log requests to stderr"""
+
+    def setup(self):
+        super().setup()
+        self.server.fake_stripe._sockets.append(self.connection)
+
+    def _respond(self, status, body):
+        content = json.dumps(body).encode()
+        try:
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+        except (BrokenPipeError, ConnectionResetError):
+            # client stopped waiting (timed out)
+            self.close_connection = True
+
+    def _handle(self, method):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length).decode()
+        self.server.fake_stripe.connections.add(self.client_address)
+        status, response = self.server.fake_stripe.handle(
+            method, self.path, parse_form(body)
+            )
+        self._respond(status, response)
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+
+class FakeStripeServer:
+    """
+    In memory Stripe: payment intents can be created, modified, retrieved
+    and confirmed. latency (seconds) is added to each request to act like
+    the round trip to the real Stripe API.
+    When an intent is confirmed, send_webhook(payload, signature) is called
+    in a new thread with the payment_intent.succeeded event, as Stripe
+    sends webhooks separately from the API response. Events sent are kept
+    in server.events.
+    """
+    def __init__(self, latency=0, webhook_secret='whsec_fake',
+                 send_webhook=None):
+        self.latency = latency
+        self.webhook_secret = webhook_secret
+        self.send_webhook = send_webhook
+        self.payment_intents = {}
+        self.events = []
+        self.requests = []
+        self.connections = set()
+        self._sockets = []
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        """base url to set as stripe.api_base"""
+        host, port = self._server.server_address
+        return f'http://{host}:{port}'
+
+    def start(self):
+        """start the server on a free port in a background thread"""
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.fake_stripe = self
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True
+            )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """shut down the server, closing kept alive connections"""
+        self._server.shutdown()
+        self._server.server_close()
+        for connection in self._sockets:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def count(self, method, path_prefix):
+        """number of requests made with the method, to paths starting with"""
+        return len([
+            request for request in self.requests
+            if request[0] == method and request[1].startswith(path_prefix)
+        ])
+
+    def handle(self, method, path, data):
+        """Return (status, response body) for the request"""
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.requests.append((method, path, data))
+            match = re.fullmatch(
+                r'/v1/payment_intents(?:/(\w+))?(/confirm)?', path
+                )
+            if match is None:
+                return 404, _error(f'Unrecognized request URL: {path}')
+            pid, confirm = match.groups()
+            if pid is None and method == 'POST':
+                return 200, self.create_payment_intent(data)
+            intent = self.payment_intents.get(pid)
+            if intent is None:
+                return 404, _error(f'No such payment_intent: {pid}')
+            if method == 'GET':
+                return 200, intent
+            if intent['status'] in ('succeeded', 'canceled'):
+                return 400, _error(
+                    'This PaymentIntent could not be updated because it '
+                    f'has a status of {intent["status"]}.'
+                    )
+            if confirm:
+                return 200, self.confirm_payment_intent(intent, data)
+            return 200, self.modify_payment_intent(intent, data)
+
+    def create_payment_intent(self, data):
+        """new intent with id and client secret like Stripe's"""
+        pid = f'pi_{secrets.token_hex(12)}'
+        intent = {
+            'id': pid,
+            'object': 'payment_intent',
+            'amount': int(data['amount']),
+            'currency': data.get('currency', 'eur'),
+            'client_secret': f'{pid}_secret_{secrets.token_hex(12)}',
+            'metadata': data.get('metadata', {}),
+            'status': 'requires_payment_method',
+        }
+        self.payment_intents[pid] = intent
+        return intent
+
+    def modify_payment_intent(self, intent, data):
+        """update amount and merge in metadata"""
+        if 'amount' in data:
+            intent['amount'] = int(data['amount'])
+        intent['metadata'].update(data.get('metadata', {}))
+        return intent
+
+    def confirm_payment_intent(self, intent, data):
+        """
+        Payment succeeded: add the shipping details and a charge with the
+        billing email (receipt_email), and send the webhook event
+        """
+        if 'shipping' in data:
+            intent['shipping'] = data['shipping']
+        intent['status'] = 'succeeded'
+        intent['charges'] = {'object': 'list', 'data': [{
+            'id': f'ch_{secrets.token_hex(12)}',
+            'object': 'charge',
+            'amount': intent['amount'],
+            'billing_details': {'email': data.get('receipt_email')},
+        }]}
+        event = {
+            'id': f'evt_{secrets.token_hex(12)}',
+            'object': 'event',
+            'type': 'payment_intent.succeeded',
+            'created': int(time.time()),
+            'data': {'object': json.loads(json.dumps(intent))},
+        }
+        self.events.append(event)
+        if self.send_webhook is not None:
+            threading.Thread(
+                target=self._send_event, args=(event,), daemon=True
+                ).start()
+        return intent
+
+    def _send_event(self, event):
+        """sign the event and pass it to send_webhook"""
+        payload = json.dumps(event)
+        self.send_webhook(
+            payload, stripe_signature(payload, self.webhook_secret)
+            )
+
+
+def _error(message):
+    """body of a Stripe invalid request error"""
+    return {'error': {'type': 'invalid_request_error', 'message': message}}
@@ -0,0 +1,223 @@
+"""
+End-to-end checkout load test, against the fake Stripe server (see
+fake_stripe.py) - used by the load_test_checkout management command.
+Each simulated shopper, all at the same time: adds a product to the bag,
+loads the checkout page (payment intent created), posts to
+cache_checkout_data, confirms the payment at the fake Stripe server (as
+stripe.js does), submits the checkout form and loads the success page.
+The fake Stripe server sends the signed payment_intent.succeeded event for
+each payment, which is posted to the webhook view.
+Requests go through Django's AsyncClient in this process, so this measures
+the views (one process, as one uvicorn worker), not the network.
+"""
+import asyncio
+import math
+import re
+import time
+from asgiref.sync import sync_to_async
+from django.test import AsyncClient
+from django.urls import reverse
+from django.utils.http import urlencode
+
+import stripe
+
+from .models import Order
+from .stripe_client import call_stripe
+
+STEPS = [
+    'add_to_bag', 'checkout_page', 'cache_checkout_data', 'confirm_payment',
+    'place_order', 'checkout_success',
+]
+SHIPPING = {
+    'name': 'Load Test',
+    'phone': '12345678',
+    'address': {
+        'line1': 'My street',
+        'line2': '',
+        'city': 'My town',
+        'state': 'My county',
+        'postal_code': 'A12',
+        'country': 'IE',
+    },
+}
+# seconds to wait for the last webhooks after the shoppers finish
+WEBHOOK_TIMEOUT = 10
+
+
+class LoadTestError(Exception):
+    """A shopper got an unexpected response"""
+
+
+def percentile(times, percent):
+    """percent'th percentile (nearest rank) of the list of times"""
+    ordered = sorted(times)
+    rank = max(0, math.ceil(percent / 100 * len(ordered)) - 1)
+    return ordered[rank]
+
+
+def _form(data):
+    """
+    kwargs to post data urlencoded - AsyncClient can't send multipart in
+    this version of Django
+    """
+    return {
+        'data': urlencode(data),
+        'content_type': 'application/x-www-form-urlencoded',
+    }
+
+
+def _check(response, status, step):
+    """raise LoadTestError if the response status isn't as expected"""
+    if response.status_code != status:
+        raise LoadTestError(
+            f'{step}: expected {status}, got {response.status_code}'
+            )
+    return response
+
+
+class Shopper:
+    """One simulated shopper, with their own cookies (cart, session)"""
+    def __init__(self, number, product_id):
+        self.number = number
+        self.product_id = product_id
+        self.client = AsyncClient()
+        self.timings = {}
+
+    async def _timed(self, step, request):
+        """await the request, record how long it took"""
+        start = time.perf_counter()
+        result = await request
+        self.timings[step] = time.perf_counter() - start
+        return result
+
+    async def checkout(self):
+        """go through checkout, return the order number"""
+        _check(await self._timed('add_to_bag', self.client.post(
+            reverse('add_to_cart_json', args=[self.product_id]),
+            **_form({'quantity': 1})
+            )), 200, 'add_to_bag')
+        page = _check(await self._timed(
+            'checkout_page', self.client.get(reverse('checkout'))
+            ), 200, 'checkout_page')
+        client_secret = re.search(
+            r'value="(pi_\w+)" name="client_secret"', page.content.decode()
+            ).group(1)
+        pid = client_secret.split('_secret')[0]
+        _check(await self._timed('cache_checkout_data', self.client.post(
+            reverse('cache_checkout_data'),
+            **_form({'client_secret': client_secret, 'save_info': 'false'})
+            )), 200, 'cache_checkout_data')
+        email = f'shopper{self.number}@example.com'
+        await self._timed('confirm_payment', call_stripe(
+            stripe.PaymentIntent.confirm, pid,
+            shipping=SHIPPING, receipt_email=email,
+            ))
+        address = SHIPPING['address']
+        placed = _check(await self._timed('place_order', self.client.post(
+            reverse('checkout'), **_form({
+                'full_name': SHIPPING['name'],
+                'email': email,
+                'phone_number': SHIPPING['phone'],
+                'street_address1': address['line1'],
+                'street_address2': address['line2'],
+                'town_or_city': address['city'],
+                'county': address['state'],
+                'postcode': address['postal_code'],
+                'country': address['country'],
+                'client_secret': client_secret,
+            })
+            )), 302, 'place_order')
+        _check(await self._timed(
+            'checkout_success', self.client.get(placed.url)
+            ), 200, 'checkout_success')
+        return placed.url.rstrip('/').rsplit('/', 1)[-1]
+
+
+class WebhookSender:
+    """
+    Posts the events from the fake Stripe server to the webhook view, as
+    they arrive - set as the server's send_webhook
+    """
+    def __init__(self, loop):
+        self.loop = loop
+        self.client = AsyncClient()
+        self.tasks = []
+        self.timings = []
+        self.errors = []
+
+    def __call__(self, payload, signature):
+        """called from the fake Stripe server's thread"""
+        self.loop.call_soon_threadsafe(self._start, payload, signature)
+
+    def _start(self, payload, signature):
+        self.tasks.append(
+            self.loop.create_task(self._post(payload, signature))
+            )
+
+    async def _post(self, payload, signature):
+        start = time.perf_counter()
+        # AsyncClient takes extra headers by their name, not META key
+        response = await self.client.post(
+            reverse('webhook'), payload, content_type='application/json',
+            **{'Stripe-Signature': signature}
+            )
+        self.timings.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            self.errors.append(f'webhook: got {response.status_code}')
+
+    async def wait(self, expected):
+        """wait until expected events have been posted"""
+        deadline = time.perf_counter() + WEBHOOK_TIMEOUT
+        while len(self.tasks) < expected:
+            if time.perf_counter() > deadline:
+                self.errors.append(
+                    f'webhook: {expected - len(self.tasks)} not sent'
+                    )
+                break
+            await asyncio.sleep(0.01)
+        await asyncio.gather(*self.tasks)
+
+
+async def run_load_test(server, product_id, shoppers):
+    """
+    Run shoppers simulated shoppers through checkout at the same time,
+    against the fake Stripe server (already started, with stripe.api_base
+    pointing at it). Returns dict with the number of orders created, time
+    taken, orders per second, list of times (seconds) for each step, the
+    whole checkout and the webhook, and any errors.
+    """
+    sender = WebhookSender(asyncio.get_running_loop())
+    server.send_webhook = sender
+    people = [Shopper(number, product_id) for number in range(shoppers)]
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *(shopper.checkout() for shopper in people), return_exceptions=True
+        )
+    elapsed = time.perf_counter() - start
+    await sender.wait(len(server.events))
+    order_numbers = [
+        result for result in results if not isinstance(result, Exception)
+        ]
+    orders = await sync_to_async(
+        Order.objects.filter(order_number__in=order_numbers).count
+        )()
+    completed = [
+        shopper for shopper, result in zip(people, results)
+        if not isinstance(result, Exception)
+        ]
+    return {
+        'orders': orders,
+        'elapsed': elapsed,
+        'orders_per_second': orders / elapsed if elapsed else 0,
+        'steps': {
+            step: [shopper.timings[step] for shopper in completed]
+            for step in STEPS
+        },
+        'checkout': [
+            sum(shopper.timings.values()) for shopper in completed
+            ],
+        'webhook': sender.timings,
+        'errors': [
+            str(result) for result in results if isinstance(result, Exception)
+            ] + sender.errors,
+    }
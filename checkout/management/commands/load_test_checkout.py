@@ -0,0 +1,117 @@
+"""
+Management command to load test checkout end to end against the fake
+Stripe server (see checkout/load_test.py): N shoppers at the same time go
+through add to bag, checkout and payment, with the webhook for each
+payment. Reports p50/p95/p99 latency of each step and orders per second,
+and of each kind of Stripe call (see stripe_client.stripe_metrics).
+Runs in a transaction that is rolled back, so the database is left
+unchanged.
+Usage: python manage.py load_test_checkout [--shoppers N] [--latency S]
+"""
+import statistics
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import override_settings
+from checkout.fake_stripe import FakeStripeServer
+from checkout.load_test import percentile, run_load_test, STEPS
+from checkout.models import WebhookEvent
+from checkout.reconcile import process_pending_events
+from checkout.stripe_client import metrics, stripe_metrics
+from products.models import Category, Product
+
+
+class Command(BaseCommand):
+    help = 'Load test checkout with simulated shoppers and a fake Stripe'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--shoppers', type=int, default=50,
+            help='number of shoppers checking out at once (default 50)'
+            )
+        parser.add_argument(
+            '--latency', type=float, default=0.2,
+            help='seconds added to each fake Stripe request (default 0.2)'
+            )
+
+    def handle(self, *args, **options):
+        """
+        Inside a transaction: create a product, run the load test, process
+        the recorded webhook events, print results, then roll back.
+        """
+        server = FakeStripeServer(latency=options['latency']).start()
+        try:
+            with mock.patch('stripe.api_base', server.url), \
+                    override_settings(
+                        ALLOWED_HOSTS=settings.ALLOWED_HOSTS + ['testserver'],
+                        STRIPE_SECRET_KEY='sk_test_fake',
+                        STRIPE_PUBLIC_KEY='pk_test_fake',
+                        STRIPE_WH_SECRET=server.webhook_secret,
+                        ), transaction.atomic():
+                category = Category.objects.create(
+                    name='load_test', friendly_name='Load Test'
+                    )
+                product = Product.objects.create(
+                    category=category, sku='LOAD-TEST', name='Load test',
+                    description='Load test product', price=10,
+                    )
+                metrics.reset()
+                results = async_to_sync(run_load_test)(
+                    server, product.id, options['shoppers']
+                    )
+                while process_pending_events():
+                    pass
+                processed = WebhookEvent.objects.filter(
+                    status=WebhookEvent.PROCESSED
+                    ).count()
+                transaction.set_rollback(True)
+        finally:
+            server.stop()
+        self._report(results, options['shoppers'], processed)
+        self._report_stripe(stripe_metrics())
+
+    def _line(self, name, times):
+        """p50/p95/p99 and max of the times, in ms"""
+        if not times:
+            return f'{name:<22} no requests'
+        p50, p95, p99 = (
+            percentile(times, percent) * 1000 for percent in (50, 95, 99)
+            )
+        return (
+            f'{name:<22} p50 {p50:7.1f}ms  p95 {p95:7.1f}ms  '
+            f'p99 {p99:7.1f}ms  max {max(times) * 1000:7.1f}ms'
+            )
+
+    def _report_stripe(self, stripe_calls):
+        """print latency of the Stripe calls, and any failed or refused"""
+        for name, method in sorted(stripe_calls.items()):
+            self.stdout.write(self._line(name, method['times']))
+            if method['failures'] or method['refused']:
+                self.stdout.write(self.style.WARNING(
+                    f'{name}: {method["failures"]} failed, '
+                    f'{method["refused"]} refused (circuit open)'
+                    ))
+
+    def _report(self, results, shoppers, processed):
+        """print latency of each step, orders per second and errors"""
+        for step in STEPS:
+            self.stdout.write(self._line(step, results['steps'][step]))
+        self.stdout.write(self._line('webhook', results['webhook']))
+        self.stdout.write(self._line('whole checkout', results['checkout']))
+        if results['checkout']:
+            self.stdout.write(
+                f'Mean checkout {statistics.mean(results["checkout"]):.2f}s'
+                )
+        for error in results['errors']:
+            self.stdout.write(self.style.ERROR(error))
+        message = (
+            f'{results["orders"]}/{shoppers} orders in '
+            f'{results["elapsed"]:.2f}s ({results["orders_per_second"]:.1f} '
+            f'orders/s), {processed} webhook events processed'
+            )
+        if results['orders'] == shoppers and not results['errors']:
+            self.stdout.write(self.style.SUCCESS(message))
+        else:
+            self.stdout.write(self.style.WARNING(message))
@@ -0,0 +1,46 @@
+"""
+Management command to process the Stripe webhook events recorded by the
+webhook handler - finds or creates the order and sends the confirmation
+email (see checkout/reconcile.py). Run with --loop as the worker process.
+--stats shows the processing time for each event type instead.
+Usage: python manage.py process_webhook_events [--loop] [--interval N]
+       python manage.py process_webhook_events --stats
+"""
+import time
+from django.core.management.base import BaseCommand
+from checkout.reconcile import latency_by_event_type, process_pending_events
+
+
+class Command(BaseCommand):
+    help = 'Process pending Stripe webhook events'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='keep running, checking for new events every interval'
+            )
+        parser.add_argument(
+            '--interval', type=float, default=2,
+            help='seconds to wait between checks with --loop (default 2)'
+            )
+        parser.add_argument(
+            '--stats', action='store_true',
+            help='show processing time for each event type and exit'
+            )
+
+    def handle(self, *args, **options):
+        """process pending events once, or keep going if --loop is set"""
+        if options['stats']:
+            for row in latency_by_event_type():
+                self.stdout.write(
+                    f'{row["event_type"]}: {row["events"]} events, '
+                    f'avg {row["avg_ms"]:.1f}ms, max {row["max_ms"]}ms'
+                    )
+            return
+        while True:
+            processed = process_pending_events()
+            if processed:
+                self.stdout.write(f'Processed {processed} webhook events')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,41 @@
+"""
+Management command to send the order confirmation emails waiting in the
+outbox (see checkout/outbox.py). Run with --loop as the worker process.
+Usage: python manage.py send_outbox_emails [--loop] [--interval N]
+"""
+import time
+from django.core.management.base import BaseCommand
+from checkout.outbox import send_pending_emails, BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Send pending order confirmation emails from the outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='keep running, checking for new emails every interval'
+            )
+        parser.add_argument(
+            '--interval', type=float, default=5,
+            help='seconds to wait between checks with --loop (default 5)'
+            )
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help=f'emails to send per connection (default {BATCH_SIZE})'
+            )
+
+    def handle(self, *args, **options):
+        """
+        send batches until there are none due, then stop, or wait and
+        check again if --loop is set
+        """
+        while True:
+            sent, failed = send_pending_emails(options['batch_size'])
+            if sent or failed:
+                self.stdout.write(f'Sent {sent} emails, {failed} failed')
+            if sent + failed == options['batch_size']:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,63 @@
+# Generated by Django 3.2 on 2026-10-18 07:42
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def blank_duplicate_stripe_pids(apps, schema_editor):
+    """
+    Before stripe_pid is made unique: where the checkout view and the
+    webhook both created an order for a payment intent, keep the pid on the
+    first order and blank it on the others, so the constraint can be
+    added. The duplicate orders are kept, with their line items.
+    """
+    Order = apps.get_model('checkout', 'Order')
+    duplicates = (
+        Order.objects.exclude(stripe_pid='').values('stripe_pid')
+        .annotate(orders=Count('id')).filter(orders__gt=1)
+        .values_list('stripe_pid', flat=True)
+        )
+    for stripe_pid in duplicates:
+        first = Order.objects.filter(stripe_pid=stripe_pid).order_by('id')[0]
+        Order.objects.filter(stripe_pid=stripe_pid).exclude(
+            id=first.id
+            ).update(stripe_pid='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checkout', '0003_order_user_profile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebhookEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stripe_event_id', models.CharField(max_length=255, unique=True)),
+                ('event_type', models.CharField(max_length=100)),
+                ('payload', models.JSONField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processed', 'Processed'), ('failed', 'Failed')], db_index=True, default='pending', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('created_on', models.DateTimeField(auto_now_add=True)),
+                ('processed_on', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['created_on'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='stripe_pid',
+            field=models.CharField(db_index=True, default='', max_length=254),
+        ),
+        migrations.RunPython(
+            blank_duplicate_stripe_pids, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='order',
+            constraint=models.UniqueConstraint(condition=models.Q(_negated=True, stripe_pid=''), fields=('stripe_pid',), name='unique_order_stripe_pid'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 3.2 on 2026-10-18 07:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checkout', '0004_webhookevent_order_stripe_pid_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEmail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('to_email', models.EmailField(max_length=254)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('sent', 'Sent'), ('failed', 'Failed')], db_index=True, default='pending', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt_on', models.DateTimeField(auto_now_add=True)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('created_on', models.DateTimeField(auto_now_add=True)),
+                ('sent_on', models.DateTimeField(blank=True, null=True)),
+                ('order', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='confirmation_email', to='checkout.order')),
+            ],
+            options={
+                'ordering': ['created_on'],
+            },
+        ),
+    ]
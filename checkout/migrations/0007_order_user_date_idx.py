@@ -0,0 +1,17 @@
+# Generated by Django 3.2 on 2026-10-18 08:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checkout', '0006_alter_order_order_number'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user_profile', 'date', 'id'], name='order_user_date_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2 on 2026-10-18 08:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checkout', '0008_webhookevent_processing'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='stripe_pid',
+            field=models.CharField(default='', max_length=254),
+        ),
+    ]
@@ -13,11 +13,35 @@ from profiles.models import UserProfile
 class Order(models.Model):
     """
     The order as a whole, with the delivery details.
-    Two fields are unique identifiers in webhook handler to check if order
-    already exists (so can create if not): original_cart and stripe_pid.
-    UserProfile attached so order history can be shown in profile page.
+    stripe_pid (payment intent id) is unique - the unique constraint's
+    index is used by the webhook handler to check if the order already
+    exists (so can create if not).
+    Orders from before this have blank stripe_pid, so these are excluded
+    from the unique constraint.
+    order_number is unique, so it's indexed for checkout_success and
+    previous_order_detail views.
+    UserProfile attached so order history can be shown in profile page,
+    indexed with date and id for the pages of order history (newest first).
     """
-    order_number = models.CharField(max_length=32, null=False, editable=False)
+    class Meta:
+        """stripe_pid unique if not blank, index for order history"""
+        indexes = [
+            models.Index(
+                fields=['user_profile', 'date', 'id'],
+                name='order_user_date_idx'
+                ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['stripe_pid'],
+                condition=~models.Q(stripe_pid=''),
+                name='unique_order_stripe_pid',
+            ),
+        ]
+
+    order_number = models.CharField(
+        max_length=32, null=False, editable=False, unique=True
+        )
     user_profile = models.ForeignKey(
         UserProfile,
         on_delete=models.SET_NULL,
@@ -52,7 +76,7 @@ class Order(models.Model):
         max_length=254,
         null=False,
         blank=False,
-        default=''
+        default='',
         )
 
     def _generate_order_number(self):
@@ -65,10 +89,19 @@ class Order(models.Model):
     def update_total(self):
         """
         Sum across line items, calculate delivery costs and get the
-        new grand total - each time a line item is added.
+        new grand total - each time a line item is saved or deleted
+        individually (e.g. edited in admin site).
         """
-        self.order_total = self.lineitems.aggregate(
-            Sum('lineitem_total'))['lineitem_total__sum'] or 0
+        self.set_totals(self.lineitems.aggregate(
+            Sum('lineitem_total'))['lineitem_total__sum'] or 0)
+        self.save()
+
+    def set_totals(self, order_total):
+        """
+        Set the order total, calculate delivery costs and get the grand
+        total. Doesn't save the order - see update_total and services.py
+        """
+        self.order_total = order_total
         if self.order_total < settings.FREE_DELIVERY_THRESHOLD:
             self.delivery_cost = (
                 self.order_total * settings.STANDARD_DELIVERY_PERCENTAGE / 100
@@ -76,7 +109,6 @@ class Order(models.Model):
         else:
             self.delivery_cost = 0
         self.grand_total = self.order_total + self.delivery_cost
-        self.save()
 
     def save(self, *args, **kwargs):
         """
@@ -129,3 +161,93 @@ class OrderLineItem(models.Model):
     def __str__(self):
         """string method - return sku plus order number"""
         return f'SKU {self.product.sku} on order {self.order.order_number}'
+
+
+class WebhookEvent(models.Model):
+    """
+    Stripe webhook event, recorded by the webhook handler so that it can
+    respond to Stripe straight away. The event is then processed later by
+    the process_webhook_events management command (see reconcile.py).
+    stripe_event_id is unique, so an event Stripe sends again is found with
+    one indexed lookup, and two deliveries at the same time can't both
+    record it. A worker sets the status to processing (started_on) before
+    working on the event, so other workers skip it. If processing fails it
+    is tried again from next_attempt_on, waiting longer after each attempt.
+    processing_ms is how long the last attempt took, for latency per event
+    type.
+    """
+    class Meta:
+        """oldest events first"""
+        ordering = ['created_on']
+
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    PROCESSED = 'processed'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (PROCESSING, 'Processing'),
+        (PROCESSED, 'Processed'),
+        (FAILED, 'Failed'),
+    ]
+
+    stripe_event_id = models.CharField(max_length=255, unique=True)
+    event_type = models.CharField(max_length=100)
+    payload = models.JSONField()
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=PENDING, db_index=True
+        )
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_on = models.DateTimeField(auto_now_add=True)
+    last_error = models.TextField(blank=True, default='')
+    created_on = models.DateTimeField(auto_now_add=True)
+    started_on = models.DateTimeField(null=True, blank=True)
+    processed_on = models.DateTimeField(null=True, blank=True)
+    processing_ms = models.PositiveIntegerField(null=True, blank=True)
+
+    def __str__(self):
+        """string method - return event type and id"""
+        return f'{self.event_type} {self.stripe_event_id}'
+
+
+class OutboxEmail(models.Model):
+    """
+    Order confirmation email waiting to be sent. Saved in the same
+    transaction as the order (see services.create_order), then sent by the
+    send_outbox_emails management command (see outbox.py), so sending
+    email doesn't hold up checkout or the webhook.
+    claimed_on is when a worker marked it as sending - if it isn't sent or
+    failed by STALE_AFTER, another worker sends it.
+    """
+    class Meta:
+        """oldest emails first"""
+        ordering = ['created_on']
+
+    PENDING = 'pending'
+    SENDING = 'sending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENDING, 'Sending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    ]
+
+    order = models.OneToOneField(
+        Order, on_delete=models.CASCADE, related_name='confirmation_email'
+        )
+    to_email = models.EmailField(max_length=254)
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=PENDING, db_index=True
+        )
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_on = models.DateTimeField(auto_now_add=True)
+    last_error = models.TextField(blank=True, default='')
+    created_on = models.DateTimeField(auto_now_add=True)
+    claimed_on = models.DateTimeField(null=True, blank=True)
+    sent_on = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        """string method - return order number and email address"""
+        return f'{self.order.order_number} to {self.to_email}'
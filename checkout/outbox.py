@@ -0,0 +1,136 @@
+"""
+Send the order confirmation emails saved in the outbox (OutboxEmail) -
+used by the send_outbox_emails management command.
+Emails are sent in batches over one connection to the mail server. A
+batch is claimed (marked as sending) in a short transaction, then sent
+outside it, and the result of each email saved as soon as it is sent - so
+rows aren't locked while talking to the mail server, and sent emails stay
+sent if the worker stops part way through a batch. Emails left sending by
+a stopped worker are claimed again after STALE_AFTER. If an email can't be
+sent it is tried again later, waiting longer each time, and marked as
+failed after MAX_ATTEMPTS.
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+from .models import OutboxEmail
+
+BATCH_SIZE = 50
+MAX_ATTEMPTS = 6
+# wait 1, 2, 4, 8... minutes between attempts, up to an hour
+RETRY_DELAY = timedelta(minutes=1)
+MAX_RETRY_DELAY = timedelta(hours=1)
+# emails claimed but not sent or failed after this long are claimed again
+# (e.g. if the worker was stopped while sending them)
+STALE_AFTER = timedelta(minutes=10)
+
+
+def retry_delay(attempts):
+    """time to wait before trying again after this many failed attempts"""
+    return min(RETRY_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+
+
+def build_confirmation_email(outbox_email, connection=None):
+    """EmailMessage for the order confirmation, from the email templates"""
+    order = outbox_email.order
+    subject = render_to_string(
+        'checkout/confirmation_emails/confirmation_email_subject.txt',
+        {'order': order}
+        ).strip()
+    body = render_to_string(
+        'checkout/confirmation_emails/confirmation_email_body.txt',
+        {'order': order, 'contact_email': settings.DEFAULT_FROM_EMAIL}
+        )
+    return EmailMessage(
+        subject,
+        body,
+        settings.DEFAULT_FROM_EMAIL,
+        [outbox_email.to_email],
+        connection=connection,
+    )
+
+
+def _record_failure(outbox_email, error, now):
+    """count the failed attempt, and set when to try again"""
+    outbox_email.attempts += 1
+    outbox_email.last_error = str(error)
+    if outbox_email.attempts >= MAX_ATTEMPTS:
+        outbox_email.status = OutboxEmail.FAILED
+    else:
+        outbox_email.status = OutboxEmail.PENDING
+        outbox_email.next_attempt_on = (
+            now + retry_delay(outbox_email.attempts)
+            )
+    outbox_email.save(update_fields=[
+        'attempts', 'last_error', 'status', 'next_attempt_on'
+        ])
+
+
+def _record_sent(outbox_email):
+    """mark the email as sent"""
+    outbox_email.status = OutboxEmail.SENT
+    outbox_email.sent_on = timezone.now()
+    outbox_email.save(update_fields=['status', 'sent_on'])
+
+
+def _claim_emails(batch_size, now):
+    """
+    Mark up to batch_size pending emails that are due (or stale sending
+    ones) as sending, and return them with their orders. Rows are locked
+    while claiming them where the database supports it, so that two
+    workers don't take the same emails.
+    """
+    with transaction.atomic():
+        batch = list(
+            OutboxEmail.objects
+            .select_for_update(skip_locked=True, of=('self',))
+            .filter(
+                Q(status=OutboxEmail.PENDING, next_attempt_on__lte=now)
+                | Q(status=OutboxEmail.SENDING,
+                    claimed_on__lt=now - STALE_AFTER)
+                )
+            .select_related('order')
+            .prefetch_related('order__lineitems__product')
+            [:batch_size]
+            )
+        OutboxEmail.objects.filter(
+            pk__in=[outbox_email.pk for outbox_email in batch]
+            ).update(status=OutboxEmail.SENDING, claimed_on=now)
+    return batch
+
+
+def send_pending_emails(batch_size=BATCH_SIZE):
+    """
+    Claim one batch of pending emails that are due, oldest first, and send
+    them over one connection, saving the result of each one as it is sent.
+    Return tuple of (number sent, number failed).
+    """
+    now = timezone.now()
+    sent = failed = 0
+    batch = _claim_emails(batch_size, now)
+    if not batch:
+        return sent, failed
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as error:
+        for outbox_email in batch:
+            _record_failure(outbox_email, error, now)
+        return sent, len(batch)
+    try:
+        for outbox_email in batch:
+            try:
+                build_confirmation_email(outbox_email, connection).send()
+            except Exception as error:
+                _record_failure(outbox_email, error, now)
+                failed += 1
+            else:
+                _record_sent(outbox_email)
+                sent += 1
+    finally:
+        connection.close()
+    return sent, failed
@@ -0,0 +1,88 @@
+"""
+Reuse the Stripe payment intent across loads of the checkout page - used
+by checkout view (async, Stripe calls made with stripe_client.call_stripe).
+The intent id and client secret are kept in the session, along with the
+amount. Reloading the checkout page, or coming back to it, reuses the
+intent without calling Stripe; if the grand total has changed the intent
+amount is updated with PaymentIntent.modify. Only the amount matters to
+Stripe - the cart is added to the intent by cache_checkout_data.
+A new intent is created if there isn't one in the session, if there is
+already an order for the one in the session (it was paid, but the shopper
+didn't reach the success page, which removes it from the session), or if
+it can't be updated any more (e.g. paid, and the order isn't saved yet).
+"""
+import re
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+import stripe
+
+from .services import order_for_payment_intent
+from .stripe_client import call_stripe
+
+SESSION_KEY = 'payment_intent'
+# client secret of a payment intent, e.g. pi_123_secret_456
+CLIENT_SECRET = re.compile(r'(pi_[A-Za-z0-9]+)_secret_[A-Za-z0-9]+')
+
+
+def payment_intent_id(client_secret):
+    """id of the payment intent from its client secret, None if malformed"""
+    match = CLIENT_SECRET.fullmatch(client_secret or '')
+    return match and match.group(1)
+
+
+async def _create(amount):
+    """create a new payment intent for the amount"""
+    return await call_stripe(
+        stripe.PaymentIntent.create,
+        amount=amount,
+        currency=settings.STRIPE_CURRENCY,
+    )
+
+
+def _unpaid_saved_intent(request):
+    """
+    intent saved in the session, or None if there isn't one or there is
+    already an order for it (reads the session and order from the
+    database, so run with sync_to_async from the async view)
+    """
+    saved = request.session.get(SESSION_KEY)
+    if saved and order_for_payment_intent(saved['id']) is not None:
+        forget_payment_intent(request)
+        return None
+    return saved
+
+
+async def get_payment_intent(request, amount):
+    """
+    Return the client secret of the payment intent for amount (integer in
+    cents). Uses the unpaid intent saved in the session if there is one,
+    updating the amount if it has changed, otherwise creates one.
+    The session is loaded from the database in a thread, after that it's
+    only changed in memory (saved by the session middleware).
+    """
+    saved = await sync_to_async(_unpaid_saved_intent)(request)
+    if saved and saved['amount'] == amount:
+        return saved['client_secret']
+    intent = None
+    if saved:
+        try:
+            intent = await call_stripe(
+                stripe.PaymentIntent.modify, saved['id'], amount=amount
+                )
+        except stripe.error.InvalidRequestError:
+            # intent can't be changed (paid or cancelled), so make a new one
+            intent = None
+    if intent is None:
+        intent = await _create(amount)
+    request.session[SESSION_KEY] = {
+        'id': intent.id,
+        'client_secret': intent.client_secret,
+        'amount': amount,
+    }
+    return intent.client_secret
+
+
+def forget_payment_intent(request):
+    """remove the intent from the session once the order is complete"""
+    request.session.pop(SESSION_KEY, None)
@@ -0,0 +1,211 @@
+"""
+Reconcile Stripe webhook events recorded by the webhook handler - the
+handler only records the event and responds to Stripe, then the
+process_webhook_events management command calls process_pending_events to
+do the work: find the order by stripe_pid, or create it if the checkout
+view hasn't (see services.get_or_create_order).
+Each event is claimed (status set to processing with a conditional
+UPDATE) before it's processed, so if more than one worker is running,
+only one of them processes each event. An event that fails is tried
+again later, waiting longer each time, and marked as failed after
+MAX_ATTEMPTS. The time taken is recorded on the event, see
+latency_by_event_type.
+"""
+import json
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Avg, Count, Max, Q
+from django.utils import timezone
+
+import stripe
+
+from profiles.models import UserProfile
+from .models import Order, WebhookEvent
+from .services import get_or_create_order
+
+# events still failing after this many attempts are marked as failed
+MAX_ATTEMPTS = 5
+# wait 30 seconds, 1, 2, 4... minutes between attempts, up to 30 minutes
+RETRY_DELAY = timedelta(seconds=30)
+MAX_RETRY_DELAY = timedelta(minutes=30)
+# event still processing after this long is assumed to be from a worker
+# that stopped, and is processed again
+CLAIM_TIMEOUT = timedelta(minutes=5)
+
+
+def retry_delay(attempts):
+    """time to wait before trying again after this many failed attempts"""
+    return min(RETRY_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+
+
+def _update_profile(intent):
+    """
+    If user was logged in, return their profile. If save info box was
+    ticked, attach delivery info to the profile and save it.
+    """
+    username = intent.metadata.username
+    if username == 'AnonymousUser':
+        return None
+    profile = UserProfile.objects.get(user__username=username)
+    if intent.metadata.save_info:
+        shipping_details = intent.shipping
+        profile.default_phone_number = shipping_details.phone
+        profile.default_street_address1 = shipping_details.address.line1
+        profile.default_street_address2 = shipping_details.address.line2
+        profile.default_town_or_city = shipping_details.address.city
+        profile.default_county = shipping_details.address.state
+        profile.default_postcode = shipping_details.address.postal_code
+        profile.default_country = shipping_details.address.country
+        profile.save()
+    return profile
+
+
+def _get_or_create_order_from_intent(intent, profile):
+    """
+    Get or create the order using info from payment intent, including cart
+    info which was added to intent metadata in cache_checkout_data view.
+    If the checkout view saved the order first, or saves it at the same
+    time, its order is returned (see services.get_or_create_order).
+    """
+    shipping_details = intent.shipping
+    return get_or_create_order(
+        Order(
+            full_name=shipping_details.name,
+            user_profile=profile,
+            email=intent.charges.data[0].billing_details.email,
+            phone_number=shipping_details.phone,
+            country=shipping_details.address.country,
+            postcode=shipping_details.address.postal_code,
+            town_or_city=shipping_details.address.city,
+            street_address1=shipping_details.address.line1,
+            street_address2=shipping_details.address.line2,
+            county=shipping_details.address.state,
+            original_cart=intent.metadata.cart,
+            stripe_pid=intent.id,
+        ),
+        json.loads(intent.metadata.cart)
+    )
+
+
+def reconcile_payment_intent_succeeded(webhook_event):
+    """
+    Get the order for the payment intent by its stripe_pid (unique and
+    indexed), or create it if the checkout view hasn't - straight away, as
+    the unique stripe_pid means only one of them can create it. The
+    confirmation email is added to the outbox when the order is created.
+    Return True when done.
+    """
+    event = stripe.Event.construct_from(
+        webhook_event.payload, settings.STRIPE_SECRET_KEY
+        )
+    intent = event.data.object
+    # set the non-required fields to none if they're blank
+    for field, value in intent.shipping.address.items():
+        if value == "":
+            intent.shipping.address[field] = None
+    _get_or_create_order_from_intent(intent, _update_profile(intent))
+    return True
+
+
+RECONCILERS = {
+    'payment_intent.succeeded': reconcile_payment_intent_succeeded,
+}
+
+
+def _ready_to_process():
+    """
+    Q for events that are pending and due to be tried, or were claimed too
+    long ago
+    """
+    now = timezone.now()
+    return Q(status=WebhookEvent.PENDING, next_attempt_on__lte=now) | Q(
+        status=WebhookEvent.PROCESSING,
+        started_on__lt=now - CLAIM_TIMEOUT,
+        )
+
+
+def claim_event(webhook_event):
+    """
+    Set the event's status to processing, if it's still ready to process.
+    Done in one UPDATE, so if two workers try to claim the same event only
+    one of them gets it. Return True if claimed.
+    """
+    now = timezone.now()
+    claimed = WebhookEvent.objects.filter(
+        _ready_to_process(), pk=webhook_event.pk
+        ).update(status=WebhookEvent.PROCESSING, started_on=now)
+    if claimed:
+        webhook_event.status = WebhookEvent.PROCESSING
+        webhook_event.started_on = now
+    return bool(claimed)
+
+
+def process_event(webhook_event):
+    """
+    Claim the event, run the reconciler for the event type, and record the
+    outcome and time taken on the event. Errors are stored on the event,
+    which is tried again after retry_delay until MAX_ATTEMPTS is reached.
+    Return False if another worker claimed the event first.
+    """
+    if not claim_event(webhook_event):
+        return False
+    reconciler = RECONCILERS.get(webhook_event.event_type)
+    start = time.perf_counter()
+    done = True
+    try:
+        if reconciler is not None:
+            done = reconciler(webhook_event)
+    except Exception as error:
+        done = False
+        webhook_event.attempts += 1
+        webhook_event.last_error = str(error)
+        webhook_event.next_attempt_on = (
+            timezone.now() + retry_delay(webhook_event.attempts)
+            )
+    webhook_event.processing_ms = round(
+        (time.perf_counter() - start) * 1000
+        )
+    if done:
+        webhook_event.status = WebhookEvent.PROCESSED
+        webhook_event.processed_on = timezone.now()
+    elif webhook_event.attempts >= MAX_ATTEMPTS:
+        webhook_event.status = WebhookEvent.FAILED
+    else:
+        webhook_event.status = WebhookEvent.PENDING
+    webhook_event.save(update_fields=[
+        'status', 'attempts', 'next_attempt_on', 'last_error',
+        'processed_on', 'processing_ms',
+        ])
+    return True
+
+
+def process_pending_events(limit=100):
+    """
+    Process pending events that are due (and ones left processing by a
+    worker that stopped), oldest first. Return the number of events that
+    were looked at.
+    """
+    events = list(
+        WebhookEvent.objects.filter(_ready_to_process())[:limit]
+        )
+    for webhook_event in events:
+        process_event(webhook_event)
+    return len(events)
+
+
+def latency_by_event_type():
+    """
+    Number of processed events and average/max processing time (ms) for
+    each event type, e.g. [{'event_type': 'payment_intent.succeeded',
+    'events': 12, 'avg_ms': 35.5, 'max_ms': 80}]
+    """
+    return list(
+        WebhookEvent.objects.filter(
+            status=WebhookEvent.PROCESSED, processing_ms__isnull=False
+            ).values('event_type').annotate(
+                events=Count('id'),
+                avg_ms=Avg('processing_ms'),
+                max_ms=Max('processing_ms'),
+                ).order_by('event_type')
+        )
@@ -0,0 +1,83 @@
+"""
+Order building for checkout app - used by checkout view and webhook handler
+to create an order and its line items from the cart.
+Both call get_or_create_order, so whichever of them gets there first
+creates the order for the payment intent, and the other one gets that
+order - the unique constraint on stripe_pid decides, so neither has to
+wait for the other.
+"""
+from django.db import IntegrityError, transaction
+from products.models import Product
+from .models import Order, OrderLineItem, OutboxEmail
+
+
+def create_order(order, cart):
+    """
+    Save the order (an unsaved Order instance with the delivery details
+    set) and create an OrderLineItem for each item in the cart dictionary
+    of {item_id: quantity}, in one transaction.
+    All products are fetched in one query, the totals are calculated once
+    and saved with the order, and the line items are inserted together with
+    bulk_create - so the post_save signal that updates the order total for
+    each line item is not needed here.
+    The confirmation email is added to the outbox in the same transaction,
+    to be sent by the send_outbox_emails management command.
+    Raise Product.DoesNotExist if a product in the cart isn't found, in
+    which case nothing is saved.
+    """
+    products = Product.objects.in_bulk([int(item_id) for item_id in cart])
+    line_items = []
+    for item_id, quantity in cart.items():
+        product = products.get(int(item_id))
+        if product is None:
+            raise Product.DoesNotExist(f'Product {item_id} not found')
+        line_items.append(OrderLineItem(
+            product=product,
+            quantity=quantity,
+            lineitem_total=product.price * quantity,
+        ))
+    order.set_totals(sum(item.lineitem_total for item in line_items))
+    with transaction.atomic():
+        order.save()
+        for line_item in line_items:
+            line_item.order = order
+        OrderLineItem.objects.bulk_create(line_items)
+        OutboxEmail.objects.create(order=order, to_email=order.email)
+    return order
+
+
+def order_for_payment_intent(stripe_pid):
+    """
+    order for the payment intent, or None. Blank stripe_pid excluded, as in
+    the unique constraint, so its index is used.
+    """
+    return Order.objects.exclude(stripe_pid='').filter(
+        stripe_pid=stripe_pid
+        ).first()
+
+
+def get_or_create_order(order, cart):
+    """
+    Return (order, created) - the order already saved for the payment
+    intent (order.stripe_pid, which must be set), or the order created
+    with create_order.
+    If the order is saved by the checkout view and the webhook at the same
+    time, the unique constraint on stripe_pid stops the second INSERT, and
+    the second one returns the order the first saved (one more query).
+    Raise Product.DoesNotExist as create_order does, and ValueError if
+    the stripe_pid is blank - orders from before stripe_pid was set are
+    blank, and mustn't be returned for someone else's checkout.
+    """
+    if not order.stripe_pid:
+        raise ValueError('Order has no stripe_pid')
+    existing = order_for_payment_intent(order.stripe_pid)
+    if existing is not None:
+        return existing, False
+    try:
+        return create_order(order, cart), True
+    except IntegrityError:
+        existing = order_for_payment_intent(order.stripe_pid)
+        if existing is None:
+            # not the stripe_pid constraint
+            raise
+        return existing, False
@@ -0,0 +1,238 @@
+"""
+Calls to the Stripe API from the async checkout views (see views.py).
+The stripe library is blocking, so each call is run in a thread from a
+pool kept for Stripe calls, rather than on the event loop. Not the thread
+used for database access, or the event loop's default pool (which only
+has a few threads on a small dyno), so calls for different shoppers run at
+the same time, and a slow Stripe response doesn't hold up other requests.
+The stripe library is configured once, at startup (CheckoutConfig.ready):
+- one HTTP client for all the threads, with a pool of keep-alive
+  connections to Stripe, so calls don't each open a new connection
+- connect and read timeouts, so a slow Stripe can't hold a thread forever
+- failed requests retried by the library, with exponential backoff and
+  jitter (POST requests get an idempotency key, so retrying is safe)
+Calls go through a circuit breaker: after FAILURE_THRESHOLD calls in a row
+fail with Stripe unreachable or erroring, calls fail straight away with
+StripeUnavailable for RESET_TIMEOUT, so checkout shows an error at once
+rather than every shopper waiting for the timeouts. Then one call is let
+through to see if Stripe is back.
+The time each call takes is recorded in metrics (see stripe_metrics).
+"""
+import asyncio
+import functools
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+import requests
+import stripe
+from stripe.http_client import RequestsClient
+
+# most Stripe calls waiting at the same time, per process
+STRIPE_THREADS = 32
+# seconds to connect to Stripe, and to wait for the response
+CONNECT_TIMEOUT = 3
+READ_TIMEOUT = 10
+# retries of a failed request, made by the stripe library
+MAX_NETWORK_RETRIES = 2
+# failed calls in a row before the circuit opens, and seconds it stays open
+FAILURE_THRESHOLD = 5
+RESET_TIMEOUT = 30
+# latest call times kept for each method, for metrics
+METRICS_SIZE = 1000
+
+# errors that mean Stripe is down or slow, rather than a bad request
+UNAVAILABLE_ERRORS = (
+    stripe.error.APIConnectionError,
+    stripe.error.APIError,
+    stripe.error.RateLimitError,
+)
+
+_executor = ThreadPoolExecutor(
+    max_workers=STRIPE_THREADS, thread_name_prefix='stripe'
+    )
+
+
+class StripeUnavailable(Exception):
+    """Stripe can't be reached or is erroring, or the circuit is open"""
+
+
+class CircuitBreaker:
+    """
+    Counts failed calls in a row. Open (calls refused) for reset_timeout
+    seconds after failure_threshold failures, then lets one trial call
+    through - closed again if it succeeds, open again if it fails.
+    """
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD,
+                 reset_timeout=RESET_TIMEOUT, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        """'closed', 'open' or 'half-open' (trial call allowed)"""
+        if self.opened_at is None:
+            return 'closed'
+        if self.clock() - self.opened_at < self.reset_timeout:
+            return 'open'
+        return 'half-open'
+
+    def before_call(self):
+        """raise StripeUnavailable if the call isn't allowed"""
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return
+            if state == 'open' or self._trial:
+                raise StripeUnavailable('Stripe circuit open')
+            self._trial = True
+
+    def record_success(self):
+        """Stripe responded - close the circuit"""
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def cancel_trial(self):
+        """
+        The call ended without an answer from Stripe (e.g. cancelled, or a
+        bug) - let another trial call through, without changing the state
+        """
+        with self._lock:
+            self._trial = False
+
+    def record_failure(self):
+        """Stripe failed - open the circuit if too many in a row"""
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+            self._trial = False
+
+
+class StripeMetrics:
+    """Number of calls, failures and refused calls, and recent call times"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """clear the metrics"""
+        with self._lock:
+            self._methods = defaultdict(lambda: {
+                'calls': 0, 'failures': 0, 'refused': 0,
+                'times': deque(maxlen=METRICS_SIZE),
+            })
+
+    def record(self, name, seconds=None, failed=False, refused=False):
+        """record a call to the method - seconds is None if refused"""
+        with self._lock:
+            method = self._methods[name]
+            method['calls'] += 1
+            method['failures'] += failed
+            method['refused'] += refused
+            if seconds is not None:
+                method['times'].append(seconds)
+
+    def snapshot(self):
+        """dict of {method name: {calls, failures, refused, times}}"""
+        with self._lock:
+            return {
+                name: {**method, 'times': list(method['times'])}
+                for name, method in self._methods.items()
+            }
+
+
+breaker = CircuitBreaker()
+metrics = StripeMetrics()
+
+
+def _http_client():
+    """stripe HTTP client with a pooled session shared by all threads"""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=1, pool_maxsize=STRIPE_THREADS
+        )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return RequestsClient(
+        timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), session=session
+        )
+
+
+def configure_stripe():
+    """
+    Set up the stripe library - key, HTTP client and retries. Called once
+    at startup, and again if the Stripe settings change (in tests), which
+    also closes the circuit.
+    """
+    stripe.api_key = settings.STRIPE_SECRET_KEY
+    stripe.max_network_retries = MAX_NETWORK_RETRIES
+    stripe.default_http_client = _http_client()
+    breaker.record_success()
+
+
+@receiver(setting_changed)
+def _reconfigure(setting, **kwargs):
+    """configure the stripe library again when a Stripe setting changes"""
+    if setting.startswith('STRIPE_'):
+        configure_stripe()
+
+
+def stripe_metrics():
+    """metrics of the Stripe calls made by this process, see StripeMetrics"""
+    return metrics.snapshot()
+
+
+def _name(method):
+    """name of the method for metrics, e.g. 'PaymentIntent.modify'"""
+    owner = getattr(method, '__self__', None)
+    if isinstance(owner, type):
+        return f'{owner.__name__}.{method.__name__}'
+    return getattr(method, '__qualname__', repr(method))
+
+
+async def call_stripe(method, *args, **kwargs):
+    """
+    Run the stripe library method (e.g. stripe.PaymentIntent.modify) with
+    the args in a Stripe thread, return the result. Raises
+    StripeUnavailable if the circuit is open, or Stripe couldn't be reached
+    or errored (after retries); other stripe errors are raised as they are.
+    """
+    name = _name(method)
+    try:
+        breaker.before_call()
+    except StripeUnavailable:
+        metrics.record(name, refused=True)
+        raise
+    start = time.perf_counter()
+    try:
+        result = await asyncio.get_running_loop().run_in_executor(
+            _executor, functools.partial(method, *args, **kwargs)
+            )
+    except UNAVAILABLE_ERRORS as error:
+        breaker.record_failure()
+        metrics.record(name, time.perf_counter() - start, failed=True)
+        raise StripeUnavailable(str(error)) from error
+    except stripe.error.StripeError:
+        # Stripe responded, the request was refused (e.g. intent paid)
+        breaker.record_success()
+        metrics.record(name, time.perf_counter() - start)
+        raise
+    except BaseException:
+        # no answer from Stripe either way, e.g. the request was cancelled
+        breaker.cancel_trial()
+        raise
+    breaker.record_success()
+    metrics.record(name, time.perf_counter() - start)
+    return result
@@ -0,0 +1,145 @@
+"""
+Tests for the async checkout views - run against the fake Stripe server
+with a delay on each request, to check that checkouts for many shoppers
+wait for Stripe at the same time rather than one after the other
+"""
+import asyncio
+import json
+import re
+import time
+from unittest import mock
+from django.core import signing
+from django.test import AsyncClient, Client, TestCase, override_settings
+from django.utils.http import urlencode
+from cart.storage import CART_COOKIE_NAME, CART_COOKIE_SALT, pack_cart
+from products.models import Product, Category
+from .fake_stripe import FakeStripeServer
+from .test_webhooks import payment_intent_event
+from .models import WebhookEvent
+
+# delay on each request to the fake Stripe server, seconds
+STRIPE_LATENCY = 0.3
+SHOPPERS = 10
+
+
+def shopper(product_id):
+    """AsyncClient for an anonymous shopper with the product in their bag"""
+    client = AsyncClient()
+    signer = signing.get_cookie_signer(
+        salt=CART_COOKIE_NAME + CART_COOKIE_SALT
+        )
+    client.cookies[CART_COOKIE_NAME] = signer.sign(
+        pack_cart({str(product_id): 1})
+        )
+    return client
+
+
+@override_settings(STRIPE_SECRET_KEY='sk_test_fake')
+class TestConcurrentCheckouts(TestCase):
+    """Load test of checkout and cache_checkout_data with slow Stripe"""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create category and product priced 10.00"""
+        category = Category.objects.create(
+            name='category_name', friendly_name='Category'
+        )
+        cls.product = Product.objects.create(
+            category=category,
+            name='product name',
+            sku='12340',
+            description='product description',
+            price=10,
+        )
+
+    def setUp(self):
+        """start fake Stripe server and point stripe library at it"""
+        self.server = FakeStripeServer().start()
+        patcher = mock.patch('stripe.api_base', self.server.url)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.server.stop)
+
+    async def load_checkout_pages(self, clients):
+        """load checkout page for each client at the same time, timed"""
+        start = time.perf_counter()
+        responses = await asyncio.gather(
+            *(client.get('/checkout/') for client in clients)
+            )
+        return responses, time.perf_counter() - start
+
+    async def test_checkout_pages_wait_for_stripe_together(self):
+        """
+        Loading 10 checkout pages, each creating a payment intent, when
+        Stripe is slow takes about one Stripe request longer than when it's
+        instant - not 10 one after the other, as with a sync worker
+        """
+        _, instant = await self.load_checkout_pages(
+            [shopper(self.product.id) for _ in range(SHOPPERS)]
+            )
+        self.server.latency = STRIPE_LATENCY
+        responses, slow = await self.load_checkout_pages(
+            [shopper(self.product.id) for _ in range(SHOPPERS)]
+            )
+        for response in responses:
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, '_secret_')
+        self.assertEqual(len(self.server.payment_intents), SHOPPERS * 2)
+        self.assertLess(slow - instant, SHOPPERS * STRIPE_LATENCY / 2)
+
+    async def test_cache_checkout_data_waits_for_stripe_together(self):
+        """10 shoppers paying at the same time, metadata added to each"""
+        clients = [shopper(self.product.id) for _ in range(SHOPPERS)]
+        responses, _ = await self.load_checkout_pages(clients)
+        # from the page, as response.context mixes up concurrent requests
+        secrets = [
+            re.search(r'value="(pi_\w+)" name="client_secret"',
+                      response.content.decode()).group(1)
+            for response in responses
+            ]
+        self.server.latency = STRIPE_LATENCY
+        start = time.perf_counter()
+        # urlencoded, as AsyncClient can't send multipart in this version
+        responses = await asyncio.gather(*(
+            client.post(
+                '/checkout/cache_checkout_data/',
+                urlencode({'client_secret': secret, 'save_info': 'false'}),
+                content_type='application/x-www-form-urlencoded'
+                )
+            for client, secret in zip(clients, secrets)
+        ))
+        elapsed = time.perf_counter() - start
+        for response in responses:
+            self.assertEqual(response.status_code, 200)
+        for intent in self.server.payment_intents.values():
+            self.assertEqual(
+                json.loads(intent['metadata']['cart']),
+                {str(self.product.id): 1}
+                )
+            self.assertEqual(intent['metadata']['username'], 'AnonymousUser')
+        self.assertLess(elapsed, SHOPPERS * STRIPE_LATENCY / 2)
+
+    async def test_get_not_allowed_for_cache_checkout_data(self):
+        """async view still only accepts post requests"""
+        response = await AsyncClient().get('/checkout/cache_checkout_data/')
+        self.assertEqual(response.status_code, 405)
+
+
+class TestAsyncWebhook(TestCase):
+    """Tests for the async webhook view"""
+
+    def test_webhook_is_csrf_exempt(self):
+        """Stripe doesn't send a CSRF token - get 400 for bad signature"""
+        client = Client(enforce_csrf_checks=True)
+        response = client.post(
+            '/checkout/wh/', json.dumps(payment_intent_event()),
+            content_type='application/json',
+            HTTP_STRIPE_SIGNATURE=f't={int(time.time())},v1=bad'
+            )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(WebhookEvent.objects.count(), 0)
+
+    def test_get_not_allowed(self):
+        """webhook only accepts post requests"""
+        response = self.client.get('/checkout/wh/')
+        self.assertEqual(response.status_code, 405)
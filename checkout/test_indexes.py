@@ -0,0 +1,30 @@
+"""
+Tests that order lookups use the unique indexes on Order, by checking the
+SQLite query plan (EXPLAIN QUERY PLAN)
+"""
+from unittest import skipUnless
+from django.db import connection
+from django.test import TestCase
+from .models import Order
+
+
+@skipUnless(connection.vendor == 'sqlite', 'query plans are for SQLite')
+class TestOrderIndexes(TestCase):
+    """Query plans for looking up an order"""
+
+    def test_order_number_lookup_uses_index(self):
+        """checkout_success and previous_order_detail lookup"""
+        plan = Order.objects.filter(order_number='abc').explain()
+        self.assertIn('USING INDEX', plan)
+        self.assertIn('(order_number=?)', plan)
+
+    def test_stripe_pid_lookup_uses_index(self):
+        """
+        get_or_create_order lookup (services.py) - uses the partial unique
+        index, as it excludes blank stripe_pid like the index does
+        """
+        plan = Order.objects.exclude(stripe_pid='').filter(
+            stripe_pid='pi_1'
+            ).explain()
+        self.assertIn('USING INDEX', plan)
+        self.assertIn('(stripe_pid=?)', plan)
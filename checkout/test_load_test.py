@@ -0,0 +1,148 @@
+"""
+Tests for the confirm/webhook part of the fake Stripe server, and the
+checkout load test in load_test.py
+"""
+import json
+import threading
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.test import TestCase, override_settings
+
+import stripe
+
+from products.models import Product, Category
+from .fake_stripe import FakeStripeServer, stripe_signature
+from .load_test import percentile, run_load_test, STEPS
+from .models import Order, WebhookEvent
+from .reconcile import process_pending_events
+
+
+@override_settings(STRIPE_SECRET_KEY='sk_test_fake')
+class TestFakeStripeWebhook(TestCase):
+    """Tests for confirming a payment intent at the fake Stripe server"""
+
+    def setUp(self):
+        """start fake Stripe server, collect the webhooks it sends"""
+        self.sent = []
+        self.webhook_sent = threading.Event()
+        self.server = FakeStripeServer(send_webhook=self.send_webhook).start()
+        patcher = mock.patch('stripe.api_base', self.server.url)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.server.stop)
+
+    def send_webhook(self, payload, signature):
+        """keep the webhook sent by the server"""
+        self.sent.append((payload, signature))
+        self.webhook_sent.set()
+
+    def test_confirm_sends_signed_event(self):
+        """
+        Confirmed intent succeeds, and the event sent is signed so that
+        stripe library accepts it with the webhook secret
+        """
+        intent = stripe.PaymentIntent.create(amount=1000, currency='eur')
+        stripe.PaymentIntent.confirm(
+            intent.id, receipt_email='email@email.com',
+            shipping={'name': 'Name', 'address': {'line1': 'Street'}},
+            )
+        self.assertEqual(
+            stripe.PaymentIntent.retrieve(intent.id).status, 'succeeded'
+            )
+        self.assertTrue(self.webhook_sent.wait(5))
+        payload, signature = self.sent[0]
+        event = stripe.Webhook.construct_event(
+            payload, signature, self.server.webhook_secret
+            )
+        self.assertEqual(event.type, 'payment_intent.succeeded')
+        self.assertEqual(event.data.object.id, intent.id)
+        self.assertEqual(
+            event.data.object.charges.data[0].billing_details.email,
+            'email@email.com'
+            )
+        self.assertEqual(event.data.object.shipping.address.line1, 'Street')
+
+    def test_paid_intent_cannot_be_confirmed_again(self):
+        """Second confirm is rejected, no second event"""
+        intent = stripe.PaymentIntent.create(amount=1000, currency='eur')
+        stripe.PaymentIntent.confirm(intent.id)
+        with self.assertRaises(stripe.error.InvalidRequestError):
+            stripe.PaymentIntent.confirm(intent.id)
+        self.assertEqual(len(self.server.events), 1)
+
+    def test_signature_rejected_with_other_secret(self):
+        """stripe_signature is checked against the secret"""
+        payload = json.dumps({'id': 'evt_1', 'object': 'event'})
+        with self.assertRaises(stripe.error.SignatureVerificationError):
+            stripe.Webhook.construct_event(
+                payload, stripe_signature(payload, 'whsec_other'),
+                'whsec_fake'
+                )
+
+
+@override_settings(
+    STRIPE_SECRET_KEY='sk_test_fake', STRIPE_WH_SECRET='whsec_fake'
+    )
+class TestCheckoutLoadTest(TestCase):
+    """Tests for run_load_test with a few shoppers"""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create category and product priced 10.00"""
+        category = Category.objects.create(
+            name='category_name', friendly_name='Category'
+        )
+        cls.product = Product.objects.create(
+            category=category,
+            name='product name',
+            sku='12340',
+            description='product description',
+            price=10,
+        )
+
+    def setUp(self):
+        """start fake Stripe server and point stripe library at it"""
+        self.server = FakeStripeServer().start()
+        patcher = mock.patch('stripe.api_base', self.server.url)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.server.stop)
+
+    async def test_shoppers_complete_checkout(self):
+        """
+        Each shopper gets an order, each payment's webhook is recorded,
+        and there are timings for each step
+        """
+        results = await run_load_test(self.server, self.product.id, 4)
+        self.assertEqual(results['errors'], [])
+        self.assertEqual(results['orders'], 4)
+        self.assertGreater(results['orders_per_second'], 0)
+        for step in STEPS:
+            self.assertEqual(len(results['steps'][step]), 4)
+        self.assertEqual(len(results['webhook']), 4)
+
+    def test_webhook_events_match_orders(self):
+        """Recorded events are processed, finding the checkout's orders"""
+        async_to_sync(run_load_test)(self.server, self.product.id, 3)
+        process_pending_events()
+        self.assertEqual(Order.objects.count(), 3)
+        self.assertEqual(
+            WebhookEvent.objects.filter(
+                status=WebhookEvent.PROCESSED
+                ).count(),
+            3
+            )
+        self.assertEqual(
+            set(WebhookEvent.objects.values_list(
+                'payload__data__object__id', flat=True
+                )),
+            set(Order.objects.values_list('stripe_pid', flat=True))
+            )
+
+    def test_percentile(self):
+        """nearest rank percentile"""
+        times = list(range(1, 101))
+        self.assertEqual(percentile(times, 50), 50)
+        self.assertEqual(percentile(times, 95), 95)
+        self.assertEqual(percentile(times, 99), 99)
+        self.assertEqual(percentile([3], 99), 3)
@@ -0,0 +1,49 @@
+"""Tests for data migrations in checkout app"""
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+
+BEFORE = [('checkout', '0003_order_user_profile')]
+AFTER = [('checkout', '0004_webhookevent_order_stripe_pid_unique')]
+
+
+class TestUniqueStripePidMigration(TransactionTestCase):
+    """Tests for migration 0004, which makes stripe_pid unique"""
+
+    def migrate(self, targets):
+        """migrate to targets, return the app registry at that point"""
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        """back to the latest migrations"""
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_duplicate_orders_for_payment_intent(self):
+        """
+        Orders created twice for a payment intent (by the checkout view and
+        the webhook) don't stop the constraint being added - the first
+        keeps the pid, the others are kept with a blank pid
+        """
+        Order = self.migrate(BEFORE).get_model('checkout', 'Order')
+        details = {
+            'full_name': 'Name', 'email': 'email@email.com',
+            'phone_number': '12345678', 'country': 'IE',
+            'town_or_city': 'My town', 'street_address1': 'My street',
+        }
+        ids = [
+            Order.objects.create(
+                order_number=f'order{number}', stripe_pid=pid, **details
+                ).id
+            for number, pid in enumerate(['pi_1', 'pi_1', 'pi_1', 'pi_2', ''])
+            ]
+        Order = self.migrate(AFTER).get_model('checkout', 'Order')
+        self.assertEqual(
+            list(Order.objects.order_by('id').values_list(
+                'id', 'stripe_pid'
+                )),
+            list(zip(ids, ['pi_1', '', '', 'pi_2', '']))
+            )
@@ -0,0 +1,148 @@
+"""Tests for sending confirmation emails from the outbox in outbox.py"""
+from datetime import timedelta
+from unittest import mock
+from django.core import mail
+from django.test import TestCase
+from django.utils import timezone
+from products.models import Product, Category
+from .models import OutboxEmail
+from .outbox import (
+    send_pending_emails, retry_delay, MAX_ATTEMPTS, STALE_AFTER
+    )
+from .services import create_order
+from .test_utils import new_order
+
+
+class TestSendPendingEmails(TestCase):
+    """Tests for send_pending_emails, using the locmem email backend"""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create category and product priced 5.00"""
+        Category.objects.create(
+            name='category_name',
+            friendly_name='Category'
+        )
+        Product.objects.create(
+            category=Category.objects.get(id=1),
+            name='product name',
+            sku='12345',
+            description='product description',
+            price=5,
+        )
+
+    def new_order(self, number):
+        """create order for 2 of the product, with outbox email"""
+        return create_order(new_order(
+            email=f'email{number}@email.com', stripe_pid=f'pi_{number}',
+            ), {'1': 2})
+
+    def test_emails_sent_and_marked_sent(self):
+        """Each pending email is sent once, with the order details"""
+        order = self.new_order(1)
+        self.new_order(2)
+        self.assertEqual(send_pending_emails(), (2, 0))
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(mail.outbox[0].to, ['email1@email.com'])
+        self.assertIn(order.order_number, mail.outbox[0].subject)
+        self.assertIn('product name x 2', mail.outbox[0].body)
+        self.assertFalse(
+            OutboxEmail.objects.exclude(status=OutboxEmail.SENT).exists()
+            )
+        self.assertEqual(send_pending_emails(), (0, 0))
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_batch_uses_one_connection_and_fixed_queries(self):
+        """
+        Batch of emails is sent over one connection, and the queries don't
+        depend on the number of line items: savepoint, emails with orders,
+        line items, products, claim emails, release, then update each email.
+        """
+        for number in range(3):
+            self.new_order(number)
+        with mock.patch(
+            'checkout.outbox.get_connection', wraps=mail.get_connection
+                ) as get_connection:
+            with self.assertNumQueries(9):
+                send_pending_emails()
+        get_connection.assert_called_once()
+
+    def test_batch_size(self):
+        """Only batch_size emails are sent at a time"""
+        for number in range(3):
+            self.new_order(number)
+        self.assertEqual(send_pending_emails(batch_size=2), (2, 0))
+        self.assertEqual(send_pending_emails(batch_size=2), (1, 0))
+
+    def test_failed_email_retried_later_with_backoff(self):
+        """
+        Email that can't be sent is tried again after the retry delay,
+        which gets longer each time
+        """
+        self.new_order(1)
+        with mock.patch(
+            'django.core.mail.EmailMessage.send',
+            side_effect=OSError('connection refused')
+                ):
+            self.assertEqual(send_pending_emails(), (0, 1))
+        outbox_email = OutboxEmail.objects.get()
+        self.assertEqual(outbox_email.status, OutboxEmail.PENDING)
+        self.assertEqual(outbox_email.attempts, 1)
+        self.assertEqual(outbox_email.last_error, 'connection refused')
+        self.assertGreater(outbox_email.next_attempt_on, timezone.now())
+        # not due yet, so not sent
+        self.assertEqual(send_pending_emails(), (0, 0))
+        OutboxEmail.objects.update(next_attempt_on=timezone.now())
+        self.assertEqual(send_pending_emails(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(retry_delay(1), timedelta(minutes=1))
+        self.assertEqual(retry_delay(3), timedelta(minutes=4))
+        self.assertEqual(retry_delay(20), timedelta(hours=1))
+
+    def test_connection_error_retries_whole_batch(self):
+        """If the mail server can't be reached, no emails are sent"""
+        self.new_order(1)
+        self.new_order(2)
+        with mock.patch(
+            'django.core.mail.backends.locmem.EmailBackend.open',
+            side_effect=OSError('no server'), create=True
+                ):
+            self.assertEqual(send_pending_emails(), (0, 2))
+        self.assertEqual(
+            OutboxEmail.objects.filter(attempts=1).count(), 2
+            )
+
+    def test_marked_failed_after_max_attempts(self):
+        """Email is given up on after MAX_ATTEMPTS"""
+        self.new_order(1)
+        OutboxEmail.objects.update(attempts=MAX_ATTEMPTS - 1)
+        with mock.patch(
+            'django.core.mail.EmailMessage.send',
+            side_effect=OSError('connection refused')
+                ):
+            send_pending_emails()
+        self.assertEqual(OutboxEmail.objects.get().status, OutboxEmail.FAILED)
+
+    def test_sent_emails_saved_if_worker_stops(self):
+        """
+        Emails sent before the worker stopped stay sent, the one being sent
+        is claimed again after STALE_AFTER
+        """
+        self.new_order(1)
+        self.new_order(2)
+        with mock.patch(
+            'django.core.mail.EmailMessage.send',
+            side_effect=[1, KeyboardInterrupt]
+                ):
+            with self.assertRaises(KeyboardInterrupt):
+                send_pending_emails()
+        first, second = OutboxEmail.objects.all()
+        self.assertEqual(first.status, OutboxEmail.SENT)
+        self.assertEqual(second.status, OutboxEmail.SENDING)
+        # not taken by another worker while it may still be sending
+        self.assertEqual(send_pending_emails(), (0, 0))
+        OutboxEmail.objects.filter(pk=second.pk).update(
+            claimed_on=timezone.now() - STALE_AFTER - timedelta(seconds=1)
+            )
+        self.assertEqual(send_pending_emails(), (1, 0))
+        self.assertEqual(mail.outbox[0].to, ['email2@email.com'])
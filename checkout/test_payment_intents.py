@@ -0,0 +1,137 @@
+"""
+Tests for reusing the payment intent across checkout page loads, in
+payment_intents.py - using the fake Stripe server to count calls to Stripe
+"""
+from unittest import mock
+from django.test import TestCase, override_settings
+from products.models import Product, Category
+from .fake_stripe import FakeStripeServer
+from .payment_intents import SESSION_KEY
+from .services import create_order
+from .models import Order
+
+
+@override_settings(STRIPE_SECRET_KEY='sk_test_fake')
+class TestReusePaymentIntent(TestCase):
+    """Tests for get_payment_intent, through the checkout view"""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create category and two products priced 10.00"""
+        Category.objects.create(
+            name='category_name',
+            friendly_name='Category'
+        )
+        for number in range(2):
+            Product.objects.create(
+                category=Category.objects.get(id=1),
+                name=f'product name {number}',
+                sku=f'1234{number}',
+                description='product description',
+                price=10,
+            )
+
+    def setUp(self):
+        """start fake Stripe server and point stripe library at it"""
+        self.server = FakeStripeServer().start()
+        patcher = mock.patch('stripe.api_base', self.server.url)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.server.stop)
+
+    def load_checkout(self):
+        """get the checkout page, return the client secret in context"""
+        response = self.client.get('/checkout/')
+        self.assertEqual(response.status_code, 200)
+        return response.context['client_secret']
+
+    def test_reloading_checkout_reuses_intent(self):
+        """Intent only created on first load, reloads don't call Stripe"""
+        self.client.post('/cart/add/1', {'quantity': 1, 'redirect_url': '/'})
+        client_secret = self.load_checkout()
+        for _ in range(3):
+            self.assertEqual(self.load_checkout(), client_secret)
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(self.server.count('POST', '/v1/payment_intents'), 1)
+
+    def test_amount_modified_when_total_changes(self):
+        """
+        Changing the quantity changes the total, so the same intent is
+        updated with the new amount instead of creating another
+        """
+        self.client.post('/cart/add/1', {'quantity': 1, 'redirect_url': '/'})
+        client_secret = self.load_checkout()
+        self.client.post('/cart/adjust/1', {'quantity': 3})
+        self.assertEqual(self.load_checkout(), client_secret)
+        pid = client_secret.split('_secret')[0]
+        self.assertEqual(len(self.server.payment_intents), 1)
+        # 3 x 10.00 + 10% delivery
+        self.assertEqual(self.server.payment_intents[pid]['amount'], 3300)
+        self.assertEqual(
+            self.server.count('POST', f'/v1/payment_intents/{pid}'), 1
+            )
+        self.assertEqual(self.client.session[SESSION_KEY]['amount'], 3300)
+
+    def test_different_items_same_total_not_modified(self):
+        """
+        Swapping an item for one with the same price doesn't call Stripe,
+        as the amount is the same
+        """
+        self.client.post('/cart/add/1', {'quantity': 1, 'redirect_url': '/'})
+        client_secret = self.load_checkout()
+        self.client.post('/cart/adjust/1', {'quantity': 0})
+        self.client.post('/cart/add/2', {'quantity': 1, 'redirect_url': '/'})
+        self.assertEqual(self.load_checkout(), client_secret)
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_new_intent_if_saved_one_already_paid(self):
+        """Intent that can't be modified any more is replaced"""
+        self.client.post('/cart/add/1', {'quantity': 1, 'redirect_url': '/'})
+        first_secret = self.load_checkout()
+        for intent in self.server.payment_intents.values():
+            intent['status'] = 'succeeded'
+        self.client.post('/cart/adjust/1', {'quantity': 2})
+        self.assertNotEqual(self.load_checkout(), first_secret)
+        self.assertEqual(len(self.server.payment_intents), 2)
+
+    def test_new_intent_if_order_saved_without_success_page(self):
+        """
+        Shopper paid and the order was saved (by the webhook), but they
+        didn't reach the success page - the paid intent isn't reused for
+        the same cart, a new one is created without calling Stripe for the
+        old one
+        """
+        self.client.post('/cart/add/1', {'quantity': 1, 'redirect_url': '/'})
+        client_secret = self.load_checkout()
+        create_order(Order(
+            full_name='Name',
+            email='email@email.com',
+            phone_number='12345678',
+            street_address1='My street',
+            town_or_city='My town',
+            country='IE',
+            stripe_pid=client_secret.split('_secret')[0],
+        ), {'1': 1})
+        new_secret = self.load_checkout()
+        self.assertNotEqual(new_secret, client_secret)
+        self.assertEqual(self.server.count('POST', '/v1/payment_intents'), 2)
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(self.load_checkout(), new_secret)
+
+    def test_intent_removed_from_session_after_checkout(self):
+        """Once the order is complete, the next checkout gets a new intent"""
+        self.client.post('/cart/add/1', {'quantity': 1, 'redirect_url': '/'})
+        client_secret = self.load_checkout()
+        order = create_order(Order(
+            full_name='Name',
+            email='email@email.com',
+            phone_number='12345678',
+            street_address1='My street',
+            town_or_city='My town',
+            country='IE',
+            stripe_pid=client_secret.split('_secret')[0],
+        ), {'1': 1})
+        self.client.get(f'/checkout/checkout_success/{order.order_number}')
+        self.assertNotIn(SESSION_KEY, self.client.session)
+        self.client.post('/cart/add/1', {'quantity': 1, 'redirect_url': '/'})
+        self.assertNotEqual(self.load_checkout(), client_secret)
@@ -0,0 +1,150 @@
+"""Tests for order building in services.py in checkout app"""
+from decimal import Decimal
+from unittest import mock
+from django.test import TestCase
+from products.models import Product, Category
+from .models import Order, OrderLineItem, OutboxEmail
+from .services import create_order, get_or_create_order
+from .test_utils import new_order
+
+
+class TestCreateOrder(TestCase):
+    """Tests for create_order"""
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Create instance of Category and 10 instances of Product - prices
+        set as 5, 10, 15 ... 50.
+        """
+        Category.objects.create(
+            name='category_and_category',
+            friendly_name='Category & Category'
+        )
+        for product in range(10):
+            Product.objects.create(
+                category=Category.objects.get(id=1),
+                name=f'product name {product}',
+                sku=f'44444{product}',
+                description='product description',
+                price=5 * (product + 1),
+            )
+
+    def test_line_items_and_totals_created(self):
+        """
+        Cart with 1 of product 1 (5.00) and 2 of product 2 (10.00), so
+        order total is 25, delivery 10%, grand total 27.50
+        """
+        order = create_order(new_order(), {'1': 1, '2': 2})
+        order = Order.objects.get(id=order.id)
+        self.assertEqual(order.lineitems.count(), 2)
+        self.assertEqual(
+            order.lineitems.get(product_id=2).lineitem_total,
+            Decimal('20.00')
+            )
+        self.assertEqual(order.order_total, Decimal('25.00'))
+        self.assertEqual(order.delivery_cost, Decimal('2.50'))
+        self.assertEqual(order.grand_total, Decimal('27.50'))
+        self.assertEqual(len(order.order_number), 32)
+        self.assertEqual(
+            order.confirmation_email.status, OutboxEmail.PENDING
+            )
+
+    def test_query_count_does_not_depend_on_number_of_items(self):
+        """
+        Order with 10 items takes the same queries as an order with 1:
+        products, savepoint, insert order, insert line items, insert
+        confirmation email into outbox, release.
+        """
+        with self.assertNumQueries(6):
+            create_order(new_order(), {'1': 1})
+        cart = {str(product_id): 1 for product_id in range(1, 11)}
+        with self.assertNumQueries(6):
+            order = create_order(new_order(), cart)
+        self.assertEqual(order.lineitems.count(), 10)
+        self.assertEqual(order.grand_total, Decimal('275.00'))
+
+    def test_nothing_saved_if_product_not_found(self):
+        """If a product doesn't exist, raise error and don't save order"""
+        with self.assertRaises(Product.DoesNotExist):
+            create_order(new_order(), {'1': 1, '99': 1})
+        self.assertEqual(Order.objects.count(), 0)
+        self.assertEqual(OrderLineItem.objects.count(), 0)
+        self.assertEqual(OutboxEmail.objects.count(), 0)
+
+    def test_totals_still_update_when_line_item_edited(self):
+        """Editing a line item later (e.g. in admin) updates order totals"""
+        order = create_order(new_order(), {'1': 1, '2': 2})
+        line_item = order.lineitems.get(product_id=1)
+        line_item.quantity = 3
+        line_item.save()
+        order.refresh_from_db()
+        self.assertEqual(order.order_total, Decimal('35.00'))
+
+
+class TestGetOrCreateOrder(TestCase):
+    """Tests for get_or_create_order"""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create instance of Category and Product priced 5.00"""
+        category = Category.objects.create(
+            name='category', friendly_name='Category'
+        )
+        cls.product = Product.objects.create(
+            category=category,
+            name='product name',
+            sku='444440',
+            description='product description',
+            price=5,
+        )
+
+    def setUp(self):
+        self.cart = {str(self.product.id): 2}
+
+    def test_created_then_found(self):
+        """Second call for the payment intent gets the first order"""
+        order, created = get_or_create_order(
+            new_order(stripe_pid='pi_1'), self.cart
+            )
+        self.assertTrue(created)
+        with self.assertNumQueries(1):
+            found, created = get_or_create_order(
+                new_order(full_name='Other', stripe_pid='pi_1'), self.cart
+                )
+        self.assertFalse(created)
+        self.assertEqual(found.id, order.id)
+        self.assertEqual(found.full_name, 'Name')
+
+    def test_second_writer_gets_first_order(self):
+        """
+        If the order is saved after the check (by the webhook at the same
+        time), the unique stripe_pid stops the second one, which gets the
+        saved order - no second order, line items or email
+        """
+        winner = create_order(new_order(stripe_pid='pi_1'), self.cart)
+        with mock.patch(
+                'checkout.services.order_for_payment_intent',
+                side_effect=[None, winner]):
+            order, created = get_or_create_order(
+                new_order(full_name='Other', stripe_pid='pi_1'), self.cart
+                )
+        self.assertFalse(created)
+        self.assertEqual(order.id, winner.id)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(OrderLineItem.objects.count(), 1)
+        self.assertEqual(OutboxEmail.objects.count(), 1)
+
+    def test_blank_stripe_pid_not_reused(self):
+        """Order with blank stripe_pid is never returned, ValueError"""
+        create_order(new_order(stripe_pid='pi_1'), self.cart)
+        Order.objects.update(stripe_pid='')
+        with self.assertRaises(ValueError):
+            get_or_create_order(new_order(full_name='Other'), self.cart)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_product_not_found(self):
+        """Product.DoesNotExist raised as for create_order"""
+        with self.assertRaises(Product.DoesNotExist):
+            get_or_create_order(new_order(stripe_pid='pi_1'), {'99': 1})
+        self.assertEqual(Order.objects.count(), 0)
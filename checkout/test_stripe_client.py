@@ -0,0 +1,206 @@
+"""
+Tests for stripe_client.py - pooled connections, timeouts, the circuit
+breaker and metrics, against the fake Stripe server
+"""
+from unittest import mock
+from django.test import TestCase, override_settings
+
+import stripe
+
+from products.models import Product, Category
+from . import stripe_client
+from .fake_stripe import FakeStripeServer
+from .stripe_client import (
+    call_stripe, configure_stripe, breaker, metrics, stripe_metrics,
+    CircuitBreaker, StripeUnavailable, FAILURE_THRESHOLD
+    )
+from .test_async_views import shopper
+
+
+class FakeClock:
+    """clock for the circuit breaker, moved on by the test"""
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCircuitBreaker(TestCase):
+    """Tests for CircuitBreaker states"""
+
+    def setUp(self):
+        """breaker opening after 3 failures, for 30 seconds"""
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker(
+            failure_threshold=3, reset_timeout=30, clock=self.clock
+            )
+
+    def test_opens_after_failures_in_a_row(self):
+        """Open after 3 failures in a row, a success starts the count again"""
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker.before_call()
+        self.assertEqual(self.breaker.state, 'closed')
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, 'open')
+        with self.assertRaises(StripeUnavailable):
+            self.breaker.before_call()
+
+    def test_one_trial_call_after_timeout(self):
+        """
+        After the timeout one call is let through - circuit closes if it
+        succeeds, opens again if it fails
+        """
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.clock.now = 30
+        self.assertEqual(self.breaker.state, 'half-open')
+        self.breaker.before_call()
+        with self.assertRaises(StripeUnavailable):
+            self.breaker.before_call()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, 'open')
+        self.clock.now = 60
+        self.breaker.before_call()
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, 'closed')
+        self.breaker.before_call()
+
+    def test_trial_call_cancelled(self):
+        """
+        Trial call that ends without an answer from Stripe (e.g. cancelled)
+        doesn't leave the breaker refusing every call
+        """
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.clock.now = 30
+        self.breaker.before_call()
+        self.breaker.cancel_trial()
+        self.assertEqual(self.breaker.state, 'half-open')
+        self.breaker.before_call()
+
+
+@override_settings(STRIPE_SECRET_KEY='sk_test_fake')
+class TestCallStripe(TestCase):
+    """Tests for call_stripe against the fake Stripe server"""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create category and product priced 10.00"""
+        category = Category.objects.create(
+            name='category_name', friendly_name='Category'
+        )
+        cls.product = Product.objects.create(
+            category=category,
+            name='product name',
+            sku='12340',
+            description='product description',
+            price=10,
+        )
+
+    def setUp(self):
+        """
+        start fake Stripe server and point stripe library at it, with no
+        retries so failures are quick
+        """
+        self.server = FakeStripeServer().start()
+        for patcher in (mock.patch('stripe.api_base', self.server.url),
+                        mock.patch('stripe.max_network_retries', 0)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(self.server.stop)
+        self.addCleanup(breaker.record_success)
+        metrics.reset()
+
+    async def test_connection_kept_alive(self):
+        """Calls one after the other use the same connection"""
+        for _ in range(5):
+            await call_stripe(
+                stripe.PaymentIntent.create, amount=1000, currency='eur'
+                )
+        self.assertEqual(len(self.server.requests), 5)
+        self.assertEqual(len(self.server.connections), 1)
+
+    async def test_metrics(self):
+        """Time of each call recorded, by method"""
+        intent = await call_stripe(
+            stripe.PaymentIntent.create, amount=1000, currency='eur'
+            )
+        await call_stripe(stripe.PaymentIntent.modify, intent.id, amount=10)
+        await call_stripe(stripe.PaymentIntent.modify, intent.id, amount=20)
+        calls = stripe_metrics()
+        self.assertEqual(calls['PaymentIntent.create']['calls'], 1)
+        self.assertEqual(calls['PaymentIntent.modify']['calls'], 2)
+        self.assertEqual(len(calls['PaymentIntent.modify']['times']), 2)
+        self.assertEqual(calls['PaymentIntent.modify']['failures'], 0)
+
+    async def test_slow_stripe_times_out(self):
+        """Response slower than the read timeout - StripeUnavailable"""
+        with mock.patch.object(stripe_client, 'READ_TIMEOUT', 0.2):
+            configure_stripe()
+        self.addCleanup(configure_stripe)
+        self.server.latency = 1
+        with self.assertRaises(StripeUnavailable):
+            await call_stripe(
+                stripe.PaymentIntent.create, amount=1000, currency='eur'
+                )
+        self.assertEqual(
+            stripe_metrics()['PaymentIntent.create']['failures'], 1
+            )
+
+    async def test_circuit_opens_when_stripe_down(self):
+        """
+        After FAILURE_THRESHOLD failed calls, calls are refused without a
+        request to Stripe. Bad requests don't count as failures.
+        """
+        intent = await call_stripe(
+            stripe.PaymentIntent.create, amount=1000, currency='eur'
+            )
+        with self.assertRaises(stripe.error.InvalidRequestError):
+            await call_stripe(stripe.PaymentIntent.retrieve, 'pi_missing')
+        self.assertEqual(breaker.failures, 0)
+        self.server.stop()
+        for _ in range(FAILURE_THRESHOLD):
+            with self.assertRaises(StripeUnavailable):
+                await call_stripe(stripe.PaymentIntent.retrieve, intent.id)
+        self.assertEqual(breaker.state, 'open')
+        with self.assertRaises(StripeUnavailable):
+            await call_stripe(stripe.PaymentIntent.retrieve, intent.id)
+        retrieve = stripe_metrics()['PaymentIntent.retrieve']
+        self.assertEqual(retrieve['refused'], 1)
+        # the refused call wasn't timed, as no request was made
+        self.assertEqual(retrieve['failures'], FAILURE_THRESHOLD)
+        self.assertEqual(len(retrieve['times']), FAILURE_THRESHOLD + 1)
+
+    async def test_other_error_in_trial_call_lets_next_call_through(self):
+        """
+        Error that isn't from Stripe in the trial call is raised, and the
+        next call is still allowed as a trial
+        """
+        for _ in range(FAILURE_THRESHOLD):
+            breaker.record_failure()
+        breaker.opened_at -= stripe_client.RESET_TIMEOUT
+
+        def broken_call():
+            raise TypeError('bug')
+
+        with self.assertRaises(TypeError):
+            await call_stripe(broken_call)
+        await call_stripe(
+            stripe.PaymentIntent.create, amount=1000, currency='eur'
+            )
+        self.assertEqual(breaker.state, 'closed')
+
+    async def test_checkout_fails_fast_when_circuit_open(self):
+        """Checkout page redirects to the bag with a message, no request"""
+        for _ in range(FAILURE_THRESHOLD):
+            breaker.record_failure()
+        response = await shopper(self.product.id).get('/checkout/')
+        self.assertRedirects(
+            response, '/cart/', fetch_redirect_response=False
+            )
+        self.assertEqual(self.server.requests, [])
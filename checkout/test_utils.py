@@ -0,0 +1,18 @@
+"""Helpers shared by the checkout app's tests"""
+from .models import Order
+
+
+def new_order(**fields):
+    """
+    return unsaved order with the delivery details - fields given (e.g.
+    stripe_pid) are used instead of the defaults
+    """
+    return Order(**{
+        'full_name': 'Name',
+        'email': 'email@email.com',
+        'phone_number': '12345678',
+        'street_address1': 'My street',
+        'town_or_city': 'My town',
+        'country': 'IE',
+        **fields,
+    })
@@ -4,6 +4,7 @@ from django.shortcuts import reverse
 from django.contrib.auth.models import User
 from django.contrib.messages import get_messages
 from django.conf import settings
+from cart.test_storage import cookie_cart
 from products.models import Product, Category
 from profiles.models import UserProfile
 from .models import Order
@@ -166,6 +167,94 @@ class TestCheckoutView(TestCase):
         self.assertFalse(form['county'].initial)
 
 
+class TestCheckoutViewPost(TestCase):
+    """Tests for posting the order form to the checkout view"""
+    @classmethod
+    def setUpTestData(cls):
+        """Create instance of Category and Product for test"""
+        Category.objects.create(
+            name='category_name',
+            friendly_name='Category'
+        )
+        Product.objects.create(
+            category=Category.objects.get(id=1),
+            name='Large Wall Hanging',
+            sku='12345',
+            description='product description',
+            price=123.45,
+            is_active=True,
+        )
+
+    def post_order_form(self, cart, client_secret='pi_123_secret_456'):
+        """put cart in the session, then post order form to checkout view"""
+        session = self.client.session
+        session['cart'] = cart
+        session.save()
+        return self.client.post('/checkout/', {
+            'full_name': 'Name',
+            'email': 'email@email.com',
+            'phone_number': '12345678',
+            'street_address1': 'My street',
+            'street_address2': '',
+            'town_or_city': 'My town',
+            'county': '',
+            'postcode': '',
+            'country': 'IE',
+            'client_secret': client_secret,
+        })
+
+    def test_order_created_and_redirects_to_success_page(self):
+        """Posting valid form creates order with line items and totals"""
+        response = self.post_order_form({'1': 2})
+        order = Order.objects.get(stripe_pid='pi_123')
+        self.assertRedirects(
+            response,
+            reverse('checkout_success', args=[order.order_number]),
+            fetch_redirect_response=False
+            )
+        self.assertEqual(order.lineitems.count(), 1)
+        self.assertEqual(str(order.grand_total), '246.90')
+
+    def test_order_from_webhook_used_if_already_created(self):
+        """
+        If the webhook created the order for the payment intent first,
+        redirect to that order, without creating another
+        """
+        first = self.post_order_form({'1': 2})
+        order = Order.objects.get(stripe_pid='pi_123')
+        response = self.post_order_form({'1': 1})
+        self.assertEqual(response.url, first.url)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(order.lineitems.get().quantity, 2)
+
+    def test_blank_or_malformed_client_secret_rejected(self):
+        """
+        Order with a blank stripe_pid (from before it was set) isn't
+        returned for a post with a blank or malformed client secret - back
+        to checkout with an error, no order created
+        """
+        self.post_order_form({'1': 1})
+        Order.objects.update(stripe_pid='')
+        for client_secret in ('', 'pi_', '_secret_1', 'pi_1_secret_1"'):
+            response = self.post_order_form({'1': 1}, client_secret)
+            self.assertRedirects(
+                response, reverse('checkout'), fetch_redirect_response=False
+                )
+        self.assertEqual(Order.objects.count(), 1)
+        messages = list(get_messages(response.wsgi_request))
+        self.assertEqual(messages[-1].tags, 'error')
+
+    def test_no_order_saved_if_product_not_found(self):
+        """If product in cart doesn't exist, no order and error message"""
+        response = self.post_order_form({'1': 2, '99': 1})
+        self.assertRedirects(
+            response, '/cart/', fetch_redirect_response=False
+            )
+        self.assertEqual(Order.objects.count(), 0)
+        messages = list(get_messages(response.wsgi_request))
+        self.assertEqual(messages[0].tags, 'error')
+
+
 class TestCacheCheckoutDataView(TestCase):
     """Tests for the cache_checkout_data view"""
     def test_405_returned_for_get_request(self):
@@ -274,20 +363,19 @@ class TestCheckoutSuccessView(TestCase):
             'An email will be sent to email@email.com with the order details.'
             )
 
-    def test_cart_session_variable_is_deleted(self):
+    def test_cart_cookie_is_deleted(self):
         """
-        add an item to cart, confirm the cart session variable is equal to a
-        dict containing item id and quantity.
+        add an item to cart, confirm the cart cookie contains the item id
+        and quantity.
         Create an order, go to checkout success page using order number.
-        Check that trying to access the 'cart' session variable raises a
-        KeyError - which shows that the variable was deleted
+        Check that the cart cookie is now empty - which shows that it was
+        deleted
         """
         self.client.post('/cart/add/1', {
             'quantity': 1,
             'redirect_url': '/products/1'
         })
-        cart = self.client.session['cart']
-        self.assertEqual(cart, {'1': 1})
+        self.assertEqual(cookie_cart(self.client), {'1': 1})
         order = Order.objects.create(
             full_name='Name',
             email='email@email.com',
@@ -297,7 +385,7 @@ class TestCheckoutSuccessView(TestCase):
             country='IE',
         )
         self.client.get(f'/checkout/checkout_success/{order.order_number}')
-        self.assertRaises(KeyError, lambda: self.client.session['cart'])
+        self.assertEqual(self.client.cookies['cart'].value, '')
 
     def test_profile_details_are_updated_if_save_info_is_true(self):
         """
@@ -0,0 +1,296 @@
+"""Tests for the stripe webhook view, handler and reconcile.py"""
+import hashlib
+import hmac
+import json
+import time
+from datetime import timedelta
+from unittest import mock
+from django.db import IntegrityError
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+from django.utils import timezone
+from products.models import Product, Category
+from profiles.models import UserProfile
+from .models import Order, OutboxEmail, WebhookEvent
+from .reconcile import (
+    claim_event, latency_by_event_type, process_event,
+    process_pending_events, retry_delay, RECONCILERS
+    )
+from .services import create_order, get_or_create_order
+from .test_utils import new_order
+
+WH_SECRET = 'whsec_test'
+
+
+def payment_intent_event(event_id='evt_1', pid='pi_1', username='User',
+                         save_info='true', cart='{"1": 2}'):
+    """payment_intent.succeeded event as sent by stripe"""
+    return {
+        'id': event_id,
+        'object': 'event',
+        'type': 'payment_intent.succeeded',
+        'data': {'object': {
+            'id': pid,
+            'object': 'payment_intent',
+            'metadata': {
+                'cart': cart,
+                'save_info': save_info,
+                'username': username,
+            },
+            'charges': {'data': [{
+                'amount': 1100,
+                'billing_details': {'email': 'email@email.com'},
+            }]},
+            'shipping': {
+                'name': 'Name',
+                'phone': '12345678',
+                'address': {
+                    'line1': 'My street',
+                    'line2': '',
+                    'city': 'My town',
+                    'state': 'My county',
+                    'postal_code': 'A12',
+                    'country': 'IE',
+                },
+            },
+        }},
+    }
+
+
+@override_settings(STRIPE_WH_SECRET=WH_SECRET)
+class TestWebhook(TestCase):
+    """Tests for the webhook view and payment_intent.succeeded handler"""
+
+    def post_event(self, event):
+        """post the event to the webhook url, signed like stripe does"""
+        payload = json.dumps(event)
+        timestamp = int(time.time())
+        signature = hmac.new(
+            WH_SECRET.encode(), f'{timestamp}.{payload}'.encode(),
+            hashlib.sha256
+            ).hexdigest()
+        return self.client.post(
+            '/checkout/wh/', payload, content_type='application/json',
+            HTTP_STRIPE_SIGNATURE=f't={timestamp},v1={signature}'
+            )
+
+    def test_event_recorded_and_200_returned_without_order(self):
+        """
+        Handler records the event and responds straight away, without
+        looking for the order or creating it
+        """
+        response = self.post_event(payment_intent_event())
+        self.assertEqual(response.status_code, 200)
+        webhook_event = WebhookEvent.objects.get()
+        self.assertEqual(webhook_event.stripe_event_id, 'evt_1')
+        self.assertEqual(webhook_event.status, WebhookEvent.PENDING)
+        self.assertEqual(
+            webhook_event.payload['data']['object']['id'], 'pi_1'
+            )
+        self.assertEqual(Order.objects.count(), 0)
+
+    def test_same_event_only_recorded_once(self):
+        """If stripe sends an event again, it isn't recorded twice"""
+        self.post_event(payment_intent_event())
+        response = self.post_event(payment_intent_event())
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Event already recorded')
+        self.assertEqual(WebhookEvent.objects.count(), 1)
+
+    def test_processed_event_sent_again_is_not_processed_again(self):
+        """
+        Event sent again after it was processed is found with one query
+        and left as processed
+        """
+        self.post_event(payment_intent_event())
+        WebhookEvent.objects.update(status=WebhookEvent.PROCESSED)
+        with self.assertNumQueries(1):
+            self.post_event(payment_intent_event())
+        self.assertEqual(
+            WebhookEvent.objects.get().status, WebhookEvent.PROCESSED
+            )
+        self.assertEqual(process_pending_events(), 0)
+
+    def test_payment_failed_event_recorded(self):
+        """payment_intent.payment_failed is recorded in the event log too"""
+        event = payment_intent_event(event_id='evt_2')
+        event['type'] = 'payment_intent.payment_failed'
+        response = self.post_event(event)
+        self.assertContains(response, 'Event recorded')
+        process_pending_events()
+        webhook_event = WebhookEvent.objects.get()
+        self.assertEqual(webhook_event.status, WebhookEvent.PROCESSED)
+        self.assertEqual(Order.objects.count(), 0)
+
+    def test_bad_signature_returns_400(self):
+        """Event that isn't signed with the webhook secret is rejected"""
+        response = self.client.post(
+            '/checkout/wh/', json.dumps(payment_intent_event()),
+            content_type='application/json',
+            HTTP_STRIPE_SIGNATURE=f't={int(time.time())},v1=bad'
+            )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(WebhookEvent.objects.count(), 0)
+
+
+class TestReconcile(TestCase):
+    """Tests for processing recorded events in reconcile.py"""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create category, product priced 5.00 and user with profile"""
+        Category.objects.create(
+            name='category_name',
+            friendly_name='Category'
+        )
+        Product.objects.create(
+            category=Category.objects.get(id=1),
+            name='product name',
+            sku='12345',
+            description='product description',
+            price=5,
+        )
+        User.objects.create_user(username='User', password='secret12')
+
+    def record_event(self, age=timedelta(minutes=1), **kwargs):
+        """record event as the handler does, created age ago"""
+        event = WebhookEvent.objects.create(
+            stripe_event_id=kwargs.get('event_id', 'evt_1'),
+            event_type='payment_intent.succeeded',
+            payload=payment_intent_event(**kwargs),
+        )
+        WebhookEvent.objects.filter(id=event.id).update(
+            created_on=timezone.now() - age
+            )
+        return event
+
+    def test_existing_order_found_by_stripe_pid(self):
+        """Order created by checkout view is found, not created again"""
+        order = create_order(new_order(stripe_pid='pi_1'), {'1': 2})
+        event = self.record_event(age=timedelta(0))
+        process_pending_events()
+        event.refresh_from_db()
+        self.assertEqual(event.status, WebhookEvent.PROCESSED)
+        self.assertEqual(Order.objects.get().id, order.id)
+        self.assertEqual(OutboxEmail.objects.count(), 1)
+
+    def test_order_created_if_not_found(self):
+        """
+        Order not created by checkout view is created from the payment
+        intent, and delivery info saved to the profile
+        """
+        event = self.record_event()
+        process_pending_events()
+        event.refresh_from_db()
+        self.assertEqual(event.status, WebhookEvent.PROCESSED)
+        order = Order.objects.get(stripe_pid='pi_1')
+        self.assertEqual(order.order_total, 10)
+        self.assertIsNone(order.street_address2)
+        self.assertEqual(order.user_profile.user.username, 'User')
+        profile = UserProfile.objects.get(user__username='User')
+        self.assertEqual(profile.default_postcode, 'A12')
+        self.assertEqual(OutboxEmail.objects.count(), 1)
+
+    def test_new_event_creates_order_straight_away(self):
+        """
+        Order created for a new event without waiting for the checkout
+        view, which then gets the same order
+        """
+        event = self.record_event(age=timedelta(0))
+        process_pending_events()
+        event.refresh_from_db()
+        self.assertEqual(event.status, WebhookEvent.PROCESSED)
+        order = Order.objects.get(stripe_pid='pi_1')
+        self.assertEqual(
+            get_or_create_order(new_order(stripe_pid='pi_1'), {'1': 2}),
+            (order, False)
+            )
+        self.assertEqual(OutboxEmail.objects.count(), 1)
+
+    def test_error_recorded_and_tried_again_later(self):
+        """
+        Event that fails isn't tried again until next_attempt_on, which
+        gets later after each attempt
+        """
+        event = self.record_event(cart='{"99": 1}', username='AnonymousUser')
+        self.assertEqual(process_pending_events(), 1)
+        event.refresh_from_db()
+        self.assertEqual(event.status, WebhookEvent.PENDING)
+        self.assertEqual(event.attempts, 1)
+        self.assertGreater(event.next_attempt_on, timezone.now())
+        # not due yet, so not processed
+        self.assertEqual(process_pending_events(), 0)
+        WebhookEvent.objects.update(next_attempt_on=timezone.now())
+        self.assertEqual(process_pending_events(), 1)
+        event.refresh_from_db()
+        self.assertEqual(event.attempts, 2)
+        self.assertEqual(retry_delay(1), timedelta(seconds=30))
+        self.assertEqual(retry_delay(3), timedelta(minutes=2))
+        self.assertEqual(retry_delay(20), timedelta(minutes=30))
+
+    def test_error_recorded_and_failed_after_max_attempts(self):
+        """Event for missing product is tried again, then marked failed"""
+        event = self.record_event(cart='{"99": 1}', username='AnonymousUser')
+        for _ in range(5):
+            WebhookEvent.objects.update(next_attempt_on=timezone.now())
+            process_pending_events()
+        event.refresh_from_db()
+        self.assertEqual(event.status, WebhookEvent.FAILED)
+        self.assertEqual(event.attempts, 5)
+        self.assertIn('99', event.last_error)
+        self.assertEqual(Order.objects.count(), 0)
+
+    def test_event_claimed_by_one_worker_only(self):
+        """
+        Event claimed by one worker isn't processed by another, unless the
+        claim is older than CLAIM_TIMEOUT (worker stopped)
+        """
+        event = self.record_event()
+        other_worker_copy = WebhookEvent.objects.get(id=event.id)
+        self.assertTrue(claim_event(event))
+        self.assertFalse(process_event(other_worker_copy))
+        self.assertEqual(process_pending_events(), 0)
+        self.assertEqual(Order.objects.count(), 0)
+        WebhookEvent.objects.filter(id=event.id).update(
+            started_on=timezone.now() - timedelta(minutes=10)
+            )
+        self.assertEqual(process_pending_events(), 1)
+        event.refresh_from_db()
+        self.assertEqual(event.status, WebhookEvent.PROCESSED)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_waiting_event_returned_to_pending(self):
+        """Event the reconciler isn't done with isn't left as processing"""
+        event = self.record_event()
+        with mock.patch.dict(RECONCILERS, {
+                'payment_intent.succeeded': lambda webhook_event: False}):
+            process_pending_events()
+        event.refresh_from_db()
+        self.assertEqual(event.status, WebhookEvent.PENDING)
+        self.assertEqual(event.attempts, 0)
+        self.assertIsNotNone(event.started_on)
+
+    def test_latency_recorded_by_event_type(self):
+        """Processing time recorded on each event, summarised by type"""
+        self.record_event()
+        self.record_event(event_id='evt_2', pid='pi_2')
+        WebhookEvent.objects.create(
+            stripe_event_id='evt_3', event_type='charge.refunded',
+            payload={},
+        )
+        process_pending_events()
+        for event in WebhookEvent.objects.all():
+            self.assertIsNotNone(event.processing_ms)
+        stats = latency_by_event_type()
+        self.assertEqual(
+            [(row['event_type'], row['events']) for row in stats],
+            [('charge.refunded', 1), ('payment_intent.succeeded', 2)]
+            )
+        self.assertGreaterEqual(stats[1]['max_ms'], stats[1]['avg_ms'])
+
+    def test_stripe_pid_is_unique(self):
+        """Second order can't be created for the same payment intent"""
+        create_order(new_order(stripe_pid='pi_1'), {'1': 1})
+        with self.assertRaises(IntegrityError):
+            create_order(new_order(stripe_pid='pi_1'), {'1': 1})
+        self.assertEqual(Order.objects.count(), 1)
@@ -1,24 +1,47 @@
-"""Views for checkout app - checkout page to complete a purchase"""
+"""
+Views for checkout app - checkout page to complete a purchase.
+checkout and cache_checkout_data call Stripe, so they're async views
+(served by uvicorn workers through asgi.py, see Procfile).
+"""
 import json
+from asgiref.sync import sync_to_async
+from django.http import HttpResponseNotAllowed
 from django.shortcuts import (
     render, redirect, reverse, get_object_or_404, HttpResponse
     )
-from django.views.decorators.http import require_POST
 from django.contrib import messages
 from django.conf import settings
 
 import stripe
 
-from cart.contexts import cart_contents
+from cart.contexts import get_cart_summary
+from cart.storage import get_cart
 from products.models import Product
 from profiles.models import UserProfile
 from profiles.forms import UserProfileForm
-from .models import OrderLineItem, Order
+from .models import Order
 from .forms import OrderForm
+from .payment_intents import (
+    get_payment_intent, forget_payment_intent, payment_intent_id
+    )
+from .services import get_or_create_order
+from .stripe_client import call_stripe, StripeUnavailable
 
 
-@require_POST
-def cache_checkout_data(request):
+def _checkout_metadata(request):
+    """
+    Metadata to add to the payment intent: cart contents, whether user wants
+    to save delivery info, and the username (reads the cart and user from
+    the database, so run with sync_to_async from the async view)
+    """
+    return {
+        'cart': json.dumps(get_cart(request).contents()),
+        'save_info': request.POST.get('save_info'),
+        'username': str(request.user),
+    }
+
+
+async def cache_checkout_data(request):
     """
     Cache the data in the webhooks process from stripe_elements.js
     Before calling confirmCardPayment js, makes a post request to this view
@@ -28,17 +51,20 @@ def cache_checkout_data(request):
     the order in the database and create it if it's not there. Save info will
     be added to session in checkout view, used by checkout success to save
     to user profile.
+    Async view, so waiting for Stripe doesn't hold up a worker - Stripe call
+    is made in a thread (see stripe_client.py). Post requests only (checked
+    here, as require_POST doesn't support async views in this version).
     Response sent back to js - 200 means will call confirmCardPayment Stripe
     method; 400 means page will reload to show the error message.
     """
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
     try:
-        pid = request.POST.get('client_secret').split('_secret')[0]
-        stripe.api_key = settings.STRIPE_SECRET_KEY
-        stripe.PaymentIntent.modify(pid, metadata={
-            'cart': json.dumps(request.session.get('cart', {})),
-            'save_info': request.POST.get('save_info'),
-            'username': request.user,
-        })
+        pid = payment_intent_id(request.POST.get('client_secret'))
+        if not pid:
+            raise ValueError('Invalid client secret')
+        metadata = await sync_to_async(_checkout_metadata)(request)
+        await call_stripe(stripe.PaymentIntent.modify, pid, metadata=metadata)
         return HttpResponse(status=200)
     except Exception as e:
         messages.error(
@@ -49,112 +75,13 @@ def cache_checkout_data(request):
         return HttpResponse(content=e, status=400)
 
 
-def checkout(request):
+def _render_checkout(request, order_form, client_secret):
     """
-    Get request:
-    Show the checkout page with Order form. If user logged in, get
-    default info from profile if it exists, otherwise blank form.
-    If nothing in cart, return to shop page with error message.
-    Get stripe variables, create payment intent using secret key.
-    Get client_secret back from the intent, pass it to context to confirm
-    payment, along with public key which is used to create element.
-    Post request:
-    Create instance of order form with the data posted, if form is valid then
-    for each item in the cart, get the product and create an orderlineitem
-    instance, save 'save-info' variable to session. In context add client
-    secret and original_cart. Return to success page.
-    If product doesn't exist, delete order, return cart page with error msg.
-    If form not valid, display error message.
+    Render the checkout page with the order form, the client_secret to
+    confirm payment, and public key which is used to create element.
+    Message alert if public key not set.
     """
     stripe_public_key = settings.STRIPE_PUBLIC_KEY
-    stripe_secret_key = settings.STRIPE_SECRET_KEY
-
-    if request.method == 'POST':
-        cart = request.session.get('cart', {})
-        # form data done manually so as to leave out the save info box
-        form_data = {
-            'full_name': request.POST['full_name'],
-            'email': request.POST['email'],
-            'phone_number': request.POST['phone_number'],
-            'street_address1': request.POST['street_address1'],
-            'street_address2': request.POST['street_address2'],
-            'town_or_city': request.POST['town_or_city'],
-            'county': request.POST['county'],
-            'postcode': request.POST['postcode'],
-            'country': request.POST['country'],
-        }
-        order_form = OrderForm(form_data)
-        if order_form.is_valid():
-            order = order_form.save(commit=False)
-            pid = request.POST.get('client_secret').split('_secret')[0]
-            order.stripe_pid = pid
-            order.original_cart = json.dumps(cart)
-            order.save()
-            for item_id, quantity in cart.items():
-                try:
-                    product = Product.objects.get(id=item_id)
-                    order_line_item = OrderLineItem(
-                        order=order,
-                        product=product,
-                        quantity=quantity,
-                    )
-                    order_line_item.save()
-                except Product.DoesNotExist:
-                    messages.error(request, (
-                        "One of the products in your bag wasn't found in our "
-                        "database. Please call us for assistance!")
-                    )
-                    order.delete()
-                    return redirect(reverse('view_cart'))
-            request.session['save_info'] = 'save-info' in request.POST
-            return redirect(
-                reverse('checkout_success', args=[order.order_number])
-                )
-        else:
-            messages.error(
-                request,
-                'There was an error with the information you entered into the '
-                'form. Please double check your information and try again.'
-                )
-    else:
-        cart = request.session.get('cart', {})
-        # error message if nothing in cart
-        if not cart:
-            messages.error(
-                request,
-                "Can't checkout as you don't have anything in your bag at the "
-                "moment! Add some items and try again."
-                )
-            return redirect(reverse('products'))
-
-        # stripe total must be an integer, set api key and create intent
-        stripe_total = round(cart_contents(request)['grand_total'] * 100)
-        stripe.api_key = stripe_secret_key
-        intent = stripe.PaymentIntent.create(
-            amount=stripe_total,
-            currency=settings.STRIPE_CURRENCY,
-        )
-        # generate order form - either prefilled or empty:
-        if request.user.is_authenticated:
-            try:
-                profile = UserProfile.objects.get(user=request.user)
-                order_form = OrderForm(initial={
-                    'full_name': str(profile.user),
-                    'email': profile.user.email,
-                    'phone_number': profile.default_phone_number,
-                    'country': profile.default_country,
-                    'postcode': profile.default_postcode,
-                    'town_or_city': profile.default_town_or_city,
-                    'street_address1': profile.default_street_address1,
-                    'street_address2': profile.default_street_address2,
-                    'county': profile.default_county,
-                })
-            except UserProfile.DoesNotExist:
-                order_form = OrderForm()
-        else:
-            order_form = OrderForm()
-
-    # message alert if public key not set
     if not stripe_public_key:
         messages.warning(
             request,
@@ -166,18 +93,154 @@ def checkout(request):
     context = {
         'order_form': order_form,
         'stripe_public_key': stripe_public_key,
-        'client_secret': intent.client_secret,
+        'client_secret': client_secret,
     }
 
     return render(request, template, context)
 
 
+def _submit_order(request):
+    """
+    Post request to checkout view:
+    Create instance of order form with the data posted, if form is valid then
+    create the order with an orderlineitem for each item in the cart (see
+    services.get_or_create_order), save 'save-info' variable to session. If
+    the order for the payment intent was already created from the webhook,
+    use that one. Return to success page.
+    If product doesn't exist, order isn't saved, return cart page with error
+    msg. If the client secret posted isn't a payment intent's, return to
+    the checkout page with error msg.
+    If form not valid, display error message and show the form again.
+    """
+    cart = get_cart(request).contents()
+    # form data done manually so as to leave out the save info box
+    form_data = {
+        'full_name': request.POST['full_name'],
+        'email': request.POST['email'],
+        'phone_number': request.POST['phone_number'],
+        'street_address1': request.POST['street_address1'],
+        'street_address2': request.POST['street_address2'],
+        'town_or_city': request.POST['town_or_city'],
+        'county': request.POST['county'],
+        'postcode': request.POST['postcode'],
+        'country': request.POST['country'],
+    }
+    order_form = OrderForm(form_data)
+    if order_form.is_valid():
+        pid = payment_intent_id(request.POST.get('client_secret'))
+        if not pid:
+            messages.error(
+                request,
+                "Sorry, we couldn't find the payment for your order. Please "
+                "try again."
+                )
+            return redirect(reverse('checkout'))
+        order = order_form.save(commit=False)
+        order.stripe_pid = pid
+        order.original_cart = json.dumps(cart)
+        try:
+            order, _ = get_or_create_order(order, cart)
+        except Product.DoesNotExist:
+            messages.error(request, (
+                "One of the products in your bag wasn't found in our "
+                "database. Please call us for assistance!")
+            )
+            return redirect(reverse('view_cart'))
+        request.session['save_info'] = 'save-info' in request.POST
+        return redirect(
+            reverse('checkout_success', args=[order.order_number])
+            )
+    messages.error(
+        request,
+        'There was an error with the information you entered into the '
+        'form. Please double check your information and try again.'
+        )
+    return _render_checkout(
+        request, order_form, request.POST.get('client_secret')
+        )
+
+
+def _checkout_page_data(request):
+    """
+    Get request to checkout view - return the cart, the Order form and the
+    grand total in cents (stripe total must be an integer). If user logged
+    in, form has default info from profile if it exists, otherwise blank
+    form. Form and total are None if nothing in cart.
+    """
+    cart = get_cart(request).contents()
+    if not cart:
+        return cart, None, None
+    stripe_total = round(get_cart_summary(cart)['grand_total'] * 100)
+    order_form = OrderForm()
+    if request.user.is_authenticated:
+        try:
+            profile = UserProfile.objects.get(user=request.user)
+            order_form = OrderForm(initial={
+                'full_name': str(profile.user),
+                'email': profile.user.email,
+                'phone_number': profile.default_phone_number,
+                'country': profile.default_country,
+                'postcode': profile.default_postcode,
+                'town_or_city': profile.default_town_or_city,
+                'street_address1': profile.default_street_address1,
+                'street_address2': profile.default_street_address2,
+                'county': profile.default_county,
+            })
+        except UserProfile.DoesNotExist:
+            pass
+    return cart, order_form, stripe_total
+
+
+async def checkout(request):
+    """
+    Get request:
+    Show the checkout page with Order form (see _checkout_page_data).
+    If nothing in cart, return to shop page with error message.
+    Get payment intent for the cart total - reusing the one from the
+    session if user already loaded the page (see payment_intents.py).
+    If Stripe is down (see stripe_client.py), return to the bag with an
+    error message.
+    Post request: place the order, see _submit_order.
+    Async view, so waiting for Stripe doesn't hold up a worker - database
+    work and rendering are run in a thread with sync_to_async, Stripe calls
+    in other threads (see stripe_client.py).
+    """
+    if request.method == 'POST':
+        return await sync_to_async(_submit_order)(request)
+
+    cart, order_form, stripe_total = await sync_to_async(
+        _checkout_page_data
+        )(request)
+    # error message if nothing in cart
+    if not cart:
+        messages.error(
+            request,
+            "Can't checkout as you don't have anything in your bag at the "
+            "moment! Add some items and try again."
+            )
+        return redirect(reverse('products'))
+
+    try:
+        client_secret = await get_payment_intent(request, stripe_total)
+    except StripeUnavailable:
+        messages.error(
+            request,
+            "Sorry, payments can't be taken right now. Please try again in "
+            "a few minutes."
+            )
+        return redirect(reverse('view_cart'))
+    return await sync_to_async(_render_checkout)(
+        request, order_form, client_secret
+        )
+
+
 def checkout_success(request, order_number):
     """
     Show the checkout success page, pass back order so order summary can be
-    displayed. Show success message, and delete cart session variable.
+    displayed. Show success message, and empty the cart.
     If user logged in, attach the user to the order, and if save-info session
     variable (set in checkout view) is true, update delivery info onto profile
+    Payment intent removed from session so next checkout gets a new one.
     """
     save_info = request.session.get('save_info')
     order = get_object_or_404(Order, order_number=order_number)
@@ -203,8 +266,8 @@ def checkout_success(request, order_number):
         request,
         f'Order number: {order_number} successfully created! '
         f'An email will be sent to {order.email} with the order details.')
-    if 'cart' in request.session:
-        del request.session['cart']
+    get_cart(request).clear()
+    forget_payment_intent(request)
     template = 'checkout/checkout_success.html'
     context = {
         'order': order,
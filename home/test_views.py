@@ -1,5 +1,8 @@
 """Tests for views in 'home' app"""
+from django.contrib.auth.models import User
 from django.test import TestCase
+from django.urls import reverse
+from products.models import Category, Product
 
 
 class TestViews(TestCase):
@@ -12,3 +15,94 @@ class TestViews(TestCase):
         response = self.client.get('/')
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, 'home/index.html')
+
+
+class TestPublicCacheHeaders(TestCase):
+    """
+    To test the Cache-Control headers from cache_headers.py on the pages
+    that are the same for every logged out user
+    """
+    @classmethod
+    def setUpTestData(cls):
+        """Create product and user for tests"""
+        category = Category.objects.create(
+            name='category_name', friendly_name='Category'
+            )
+        cls.product = Product.objects.create(
+            category=category,
+            name='Large Wall Hanging',
+            description='product description',
+            price=20,
+        )
+        cls.product_url = reverse('product_details', args=[cls.product.id])
+        cls.add_url = reverse('add_to_cart', args=[cls.product.id])
+        User.objects.create_user(username='User', password='secret12')
+
+    def test_pages_public_for_logged_out_users(self):
+        """Home, shop, product and markets pages can be cached"""
+        for url in ('/', '/products/', self.product_url, '/markets/'):
+            response = self.client.get(url)
+            self.assertEqual(
+                response['Cache-Control'], 'public, max-age=300', url
+                )
+            self.assertNotIn('csrftoken', response.cookies)
+
+    def test_public_pages_shared_between_visitors(self):
+        """
+        Public pages don't vary on Cookie, even once the bag summary has
+        set the CSRF cookie - so a CDN can give every visitor the same copy
+        """
+        self.client.get('/cart/summary/')
+        self.assertIn('csrftoken', self.client.cookies)
+        for url in ('/', '/products/', self.product_url, '/markets/'):
+            response = self.client.get(url)
+            self.assertEqual(
+                response['Cache-Control'], 'public, max-age=300', url
+                )
+            self.assertNotIn(
+                'cookie', response.get('Vary', '').lower(), url
+                )
+
+    def test_private_pages_vary_on_cookie(self):
+        """Logged in user's page still varies on Cookie"""
+        self.client.login(username='User', password='secret12')
+        response = self.client.get(self.product_url)
+        self.assertEqual(response['Cache-Control'], 'private')
+        self.assertIn('Cookie', response['Vary'])
+
+    def test_page_same_whatever_is_in_bag(self):
+        """Bag isn't in the page, so page doesn't depend on the session"""
+        first = self.client.get(self.product_url).content
+        self.client.post(self.add_url, {
+            'quantity': 2, 'redirect_url': '/products/'
+            })
+        self.client.get('/products/')
+        self.assertEqual(self.client.get(self.product_url).content, first)
+
+    def test_private_for_logged_in_user_or_messages(self):
+        """Page with user's details or a message toast isn't public"""
+        self.client.post(self.add_url, {
+            'quantity': 2, 'redirect_url': '/products/'
+            })
+        response = self.client.get('/products/')
+        self.assertContains(response, 'added to your bag')
+        self.assertEqual(response['Cache-Control'], 'private')
+        self.client.login(username='User', password='secret12')
+        response = self.client.get(self.product_url)
+        self.assertEqual(response['Cache-Control'], 'private')
+
+    def test_bag_summary(self):
+        """
+        Bag summary has the count and total, and a CSRF token for the
+        product page form, and isn't cached
+        """
+        self.client.post(self.add_url, {
+            'quantity': 2, 'redirect_url': '/products/'
+            })
+        response = self.client.get('/cart/summary/')
+        data = response.json()
+        self.assertEqual(data['product_count'], 2)
+        self.assertEqual(data['grand_total'], '44.00')
+        self.assertTrue(data['csrf_token'])
+        self.assertIn('csrftoken', response.cookies)
+        self.assertIn('no-cache', response['Cache-Control'])
@@ -1,7 +1,10 @@
 """Views for the 'home' app - home page"""
+from django.utils.decorators import method_decorator
 from django.views import generic
+from cache_headers import public_for_anonymous
 
 
+@method_decorator(public_for_anonymous(), name='dispatch')
 class HomePage(generic.TemplateView):
     """Home Page view, returns index.html. Static page, no model"""
     template_name = 'home/index.html'
@@ -0,0 +1,16 @@
+"""admin set up for 'images' app - to check on image jobs that failed"""
+from django.contrib import admin
+from .models import ImageJob
+
+
+class ImageJobAdmin(admin.ModelAdmin):
+    """
+    Admin set up for ImageJob model: List display, filters, ordering.
+    """
+    list_display = ('image_name', 'content_type', 'object_id', 'status',
+                    'attempts', 'created_on', 'finished_on',)
+    list_filter = ('status', 'content_type',)
+    ordering = ('-created_on',)
+
+
+admin.site.register(ImageJob, ImageJobAdmin)
@@ -0,0 +1,7 @@
+"""config for images app - resized renditions of uploaded images"""
+from django.apps import AppConfig
+
+
+class ImagesConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'images'
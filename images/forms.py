@@ -0,0 +1,23 @@
+"""Form mixin for images app - used by ProductForm and MarketForm"""
+from .jobs import enqueue_renditions
+
+
+class ImageRenditionsFormMixin:
+    """
+    For model forms with an image field, when the model has an
+    image_renditions field: when the image is changed (added, replaced or
+    removed), add a job to update the resized renditions of it (see
+    jobs.py), so the request doesn't wait for the image to be resized.
+    With commit=False, call save_renditions after saving the instance.
+    """
+    def save(self, commit=True):
+        """save the instance, then the renditions job if commit is True"""
+        instance = super().save(commit=commit)
+        if commit:
+            self.save_renditions()
+        return instance
+
+    def save_renditions(self):
+        """update the renditions if the image field was changed"""
+        if 'image' in self.changed_data:
+            enqueue_renditions(self.instance)
@@ -0,0 +1,137 @@
+"""
+Background processing of image rendition jobs (ImageJob) - used by the
+process_image_jobs and backfill_renditions management commands.
+Resizing images is CPU bound, so the renditions are created in a pool of
+processes (one per CPU core by default). The worker processes only read
+the image and save the renditions to storage; the database is only
+updated in the main process.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import timedelta
+import django
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import ImageJob
+from .renditions import create_renditions, delete_renditions
+
+# jobs are marked as failed after this many attempts
+MAX_ATTEMPTS = 3
+# running jobs not finished after this long are tried again (e.g. if the
+# worker was stopped while they were running)
+STALE_AFTER = timedelta(minutes=10)
+
+
+def enqueue_renditions(instance):
+    """
+    Add a job to create the renditions of the instance's (Product or
+    Market) image. If the image was removed, delete the old renditions
+    straight away, as there's nothing to resize.
+    """
+    if instance.image:
+        ImageJob.objects.create(
+            content_type=ContentType.objects.get_for_model(instance),
+            object_id=instance.pk,
+            image_name=instance.image.name,
+        )
+    else:
+        delete_renditions(instance.image_renditions)
+        instance.image_renditions = {}
+        instance.save(update_fields=['image_renditions'])
+
+
+def _init_worker():
+    """set up Django in each worker process, if not already set up"""
+    django.setup()
+
+
+def make_executor(workers=None):
+    """process pool for the jobs, with one process per CPU by default"""
+    return ProcessPoolExecutor(
+        max_workers=workers or os.cpu_count(), initializer=_init_worker
+        )
+
+
+def run_job(image_name):
+    """create renditions of the image - runs in a worker process"""
+    return create_renditions(image_name)
+
+
+def _claim_jobs(limit):
+    """
+    Mark up to limit pending (or stale running) jobs as running, and return
+    them. Rows are locked while claiming them where the database supports
+    it, so that two workers don't take the same jobs.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(
+            ImageJob.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status=ImageJob.PENDING)
+                | Q(status=ImageJob.RUNNING, started_on__lt=now - STALE_AFTER)
+                )[:limit]
+            )
+        for job in jobs:
+            job.status = ImageJob.RUNNING
+            job.started_on = now
+            job.attempts += 1
+        ImageJob.objects.bulk_update(
+            jobs, ['status', 'started_on', 'attempts']
+            )
+    return jobs
+
+
+def _save_result(job, renditions):
+    """
+    Save the new renditions to the instance and delete its old ones - or
+    delete the new ones if the instance was deleted, or its image changed
+    since the job was added (a newer job will create them).
+    Files with the same name in both are kept (see delete_renditions).
+    """
+    instance = job.item
+    if instance is None:
+        delete_renditions(renditions)
+    elif instance.image.name != job.image_name:
+        delete_renditions(renditions, keep=instance.image_renditions)
+    else:
+        old_renditions = instance.image_renditions
+        instance.image_renditions = renditions
+        instance.save(update_fields=['image_renditions'])
+        delete_renditions(old_renditions, keep=renditions)
+    job.status = ImageJob.DONE
+    job.finished_on = timezone.now()
+    job.save()
+
+
+def _record_failure(job, error):
+    """store the error, try again later unless out of attempts"""
+    job.last_error = str(error)
+    job.status = (
+        ImageJob.FAILED if job.attempts >= MAX_ATTEMPTS else ImageJob.PENDING
+        )
+    job.finished_on = timezone.now()
+    job.save()
+
+
+def process_pending_jobs(executor, limit=20):
+    """
+    Claim up to limit pending jobs and run them in the executor. Returns
+    tuple of (number done, number failed).
+    """
+    jobs = _claim_jobs(limit)
+    futures = {
+        executor.submit(run_job, job.image_name): job for job in jobs
+    }
+    done = failed = 0
+    for future in as_completed(futures):
+        job = futures[future]
+        try:
+            _save_result(job, future.result())
+            done += 1
+        except Exception as error:
+            _record_failure(job, error)
+            failed += 1
+    return done, failed
@@ -0,0 +1,54 @@
+"""
+Management command to create renditions for every existing Product and
+Market image, in parallel in a pool of worker processes, and report the
+throughput (images per second).
+Usage: python manage.py backfill_renditions [--workers N]
+"""
+import os
+import time
+from django.core.management.base import BaseCommand
+from images.jobs import (
+    enqueue_renditions, make_executor, process_pending_jobs
+    )
+from markets.models import Market
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Create renditions for all existing product and market images'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='number of worker processes (default: number of CPUs)'
+            )
+
+    def handle(self, *args, **options):
+        """add a job for each image, then process all the jobs, timed"""
+        queued = 0
+        for model in (Product, Market):
+            for instance in model.objects.exclude(image='').exclude(
+                    image__isnull=True):
+                enqueue_renditions(instance)
+                queued += 1
+        self.stdout.write(
+            f'Queued {queued} images, processing with '
+            f'{options["workers"]} workers'
+            )
+        total_done = total_failed = 0
+        start = time.perf_counter()
+        with make_executor(options['workers']) as executor:
+            while True:
+                done, failed = process_pending_jobs(
+                    executor, limit=options['workers'] * 4
+                    )
+                if not done and not failed:
+                    break
+                total_done += done
+                total_failed += failed
+        elapsed = time.perf_counter() - start
+        rate = total_done / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Rendered {total_done} images in {elapsed:.1f}s '
+            f'({rate:.1f} images/s), {total_failed} failed attempts'
+            ))
@@ -0,0 +1,47 @@
+"""
+Management command to process image rendition jobs in a pool of worker
+processes (see images/jobs.py). Run with --loop as the worker process.
+Usage: python manage.py process_image_jobs [--loop] [--interval N]
+       [--workers N]
+"""
+import os
+import time
+from django.core.management.base import BaseCommand
+from images.jobs import make_executor, process_pending_jobs
+
+
+class Command(BaseCommand):
+    help = 'Create renditions for pending image jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='keep running, checking for new jobs every interval'
+            )
+        parser.add_argument(
+            '--interval', type=float, default=2,
+            help='seconds to wait between checks with --loop (default 2)'
+            )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='number of worker processes (default: number of CPUs)'
+            )
+
+    def handle(self, *args, **options):
+        """
+        process jobs until there are none pending, then stop, or wait and
+        check again if --loop is set
+        """
+        with make_executor(options['workers']) as executor:
+            while True:
+                done, failed = process_pending_jobs(
+                    executor, limit=options['workers'] * 4
+                    )
+                if done or failed:
+                    self.stdout.write(
+                        f'Processed {done} image jobs, {failed} failed'
+                        )
+                    continue
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
@@ -0,0 +1,46 @@
+"""models for images app"""
+from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.contenttypes.models import ContentType
+from django.db import models
+
+
+class ImageJob(models.Model):
+    """
+    Job to create the resized renditions of a Product or Market image.
+    Added when the image is changed on the form (see forms.py), and
+    processed by the process_image_jobs management command (see jobs.py),
+    so the request doesn't wait for the image to be resized.
+    image_name is the image the job is for - if the image has changed again
+    by the time the job runs, the result isn't saved.
+    """
+    class Meta:
+        """oldest jobs first"""
+        ordering = ['created_on']
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveIntegerField()
+    item = GenericForeignKey('content_type', 'object_id')
+    image_name = models.CharField(max_length=255)
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=PENDING, db_index=True
+        )
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+    created_on = models.DateTimeField(auto_now_add=True)
+    started_on = models.DateTimeField(null=True, blank=True)
+    finished_on = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        """string method - return the image name and status"""
+        return f'{self.image_name} ({self.status})'
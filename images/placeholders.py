@@ -0,0 +1,114 @@
+"""
+Low quality placeholders for Product and Market images, shown on the
+listing pages while the image loads (see card_image.html and
+decodeBlurhashPlaceholders in script.js).
+Two placeholders are computed from a downsampled copy of the image:
+the dominant colour (hex), used as the background colour, and a BlurHash
+(https://blurha.sh) - a short string encoding a blurred version of the
+image, which script.js draws as the background image.
+Computed with NumPy over all the pixels at once, rather than pixel by
+pixel in Python.
+"""
+import numpy as np
+
+# size the image is reduced to before computing the placeholders
+SAMPLE_SIZE = 32
+# number of horizontal and vertical BlurHash components
+X_COMPONENTS = 4
+Y_COMPONENTS = 3
+BASE83 = (
+    '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+    '#$%*+,-.:;=?@[]^_{|}~'
+)
+
+
+def _base83(value, length):
+    """encode integer value as base 83 string of length characters"""
+    return ''.join(
+        BASE83[(value // 83 ** (length - position - 1)) % 83]
+        for position in range(length)
+        )
+
+
+def _srgb_to_linear(values):
+    """array of sRGB values 0-255 to linear light values 0-1"""
+    values = values / 255
+    return np.where(
+        values <= 0.04045, values / 12.92, ((values + 0.055) / 1.055) ** 2.4
+        )
+
+
+def _linear_to_srgb(value):
+    """linear light value 0-1 to sRGB integer 0-255"""
+    value = min(max(value, 0.0), 1.0)
+    if value <= 0.0031308:
+        return int(value * 12.92 * 255 + 0.5)
+    return int((1.055 * value ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def dominant_colour(pixels):
+    """
+    Most common colour in the pixels (array of height x width x 3 sRGB
+    values): colours are grouped into 16 levels per channel, and the
+    average of the most common group is returned as hex, e.g. '#a1b2c3'
+    """
+    pixels = pixels.reshape(-1, 3).astype(np.int64)
+    groups = pixels >> 4
+    keys = (groups[:, 0] << 8) | (groups[:, 1] << 4) | groups[:, 2]
+    most_common = np.bincount(keys, minlength=4096).argmax()
+    red, green, blue = pixels[keys == most_common].mean(axis=0).round()
+    return f'#{int(red):02x}{int(green):02x}{int(blue):02x}'
+
+
+def blurhash(pixels, x_components=X_COMPONENTS, y_components=Y_COMPONENTS):
+    """
+    BlurHash of the pixels (array of height x width x 3 sRGB values).
+    Each component is the sum over all pixels of the colour times a cosine
+    in x and y, calculated for all components at once with einsum.
+    """
+    height, width, _ = pixels.shape
+    linear = _srgb_to_linear(pixels.astype(np.float64))
+    basis_x = np.cos(
+        np.pi * np.arange(x_components)[:, None] * np.arange(width) / width
+        )
+    basis_y = np.cos(
+        np.pi * np.arange(y_components)[:, None] * np.arange(height) / height
+        )
+    factors = np.einsum('jy,ix,yxc->jic', basis_y, basis_x, linear)
+    normalisation = np.full((y_components, x_components, 1), 2.0)
+    normalisation[0, 0] = 1.0
+    factors = (factors * normalisation / (width * height)).reshape(-1, 3)
+    dc, ac = factors[0], factors[1:]
+
+    encoded = _base83((x_components - 1) + (y_components - 1) * 9, 1)
+    if len(ac):
+        quantised_max = int(
+            min(max(np.abs(ac).max() * 166 - 0.5, 0), 82)
+            )
+        maximum_value = (quantised_max + 1) / 166
+    else:
+        quantised_max = 0
+        maximum_value = 1
+    encoded += _base83(quantised_max, 1)
+    red, green, blue = (_linear_to_srgb(value) for value in dc)
+    encoded += _base83((red << 16) + (green << 8) + blue, 4)
+    # signed square root, scaled to 0-18 for each channel
+    scaled = np.sign(ac) * np.sqrt(np.abs(ac / maximum_value))
+    quantised = np.clip(np.floor(scaled * 9 + 9.5), 0, 18).astype(int)
+    for red, green, blue in quantised:
+        encoded += _base83(red * 19 * 19 + green * 19 + blue, 2)
+    return encoded
+
+
+def compute_placeholder(image):
+    """
+    Dominant colour and BlurHash for the image (RGB PIL Image), from a
+    copy reduced to SAMPLE_SIZE pixels
+    """
+    sample = image.copy()
+    sample.thumbnail((SAMPLE_SIZE, SAMPLE_SIZE))
+    pixels = np.asarray(sample)
+    return {
+        'colour': dominant_colour(pixels),
+        'blurhash': blurhash(pixels),
+    }
@@ -0,0 +1,106 @@
+"""
+Resized renditions of Product and Market images, for the srcset of the
+images on listing pages (see templatetags/image_tags.py).
+Each image is resized to the widths in RENDITION_WIDTHS (never larger than
+the original), saved as WebP and JPEG through the default storage (local
+media folder, or S3 with custom_storages.MediaStorage). The names of the
+files are stored in the image_renditions field of the model, so the
+template doesn't need to check storage.
+Renditions are created in a background worker, see jobs.py.
+"""
+import io
+import os
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+from .placeholders import compute_placeholder
+
+RENDITION_WIDTHS = (320, 640, 960)
+RENDITION_FOLDER = 'renditions'
+FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpeg': {'format': 'JPEG', 'quality': 80, 'optimize': True,
+             'progressive': True},
+}
+
+
+def _widths_for(original_width):
+    """widths to make - ones smaller than the original, or the original"""
+    widths = [width for width in RENDITION_WIDTHS if width < original_width]
+    return widths or [original_width]
+
+
+def _rgb(image):
+    """image as RGB, with any transparency on a white background"""
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def render_image(image_file):
+    """
+    Resize the image (file object) to each width, encode as each format.
+    Returns original (width, height), dict of
+    {format: {width: encoded bytes}}, and the placeholder for the image.
+    """
+    with Image.open(image_file) as opened:
+        image = _rgb(ImageOps.exif_transpose(opened))
+    width, height = image.size
+    encoded = {image_format: {} for image_format in FORMATS}
+    for rendition_width in _widths_for(width):
+        rendition_height = max(1, round(height * rendition_width / width))
+        resized = image.resize(
+            (rendition_width, rendition_height), Image.LANCZOS
+            )
+        for image_format, options in FORMATS.items():
+            buffer = io.BytesIO()
+            resized.save(buffer, **options)
+            encoded[image_format][rendition_width] = buffer.getvalue()
+    return (width, height), encoded, compute_placeholder(image)
+
+
+def rendition_names(renditions):
+    """set of the rendition file names in renditions dict"""
+    return {
+        name for image_format in FORMATS
+        for name in renditions.get(image_format, {}).values()
+    }
+
+
+def delete_renditions(renditions, storage=default_storage, keep=None):
+    """
+    delete the rendition files listed in renditions dict, except those in
+    the keep renditions dict - names are made from the image name and
+    width, so re-rendering an image (e.g. backfill_renditions) can write
+    the same names, overwriting the old files (S3)
+    """
+    for name in rendition_names(renditions) - rendition_names(keep or {}):
+        storage.delete(name)
+
+
+def create_renditions(image_name, storage=default_storage):
+    """
+    Create the renditions for the image (name of file in storage) and save
+    them to storage. Returns dict to store in image_renditions field:
+    {'source': image name, 'width': w, 'height': h,
+     'placeholder': {'colour': hex, 'blurhash': hash},
+     'webp': {width: file name}, 'jpeg': {width: file name}}
+    """
+    with storage.open(image_name, 'rb') as image_file:
+        (width, height), encoded, placeholder = render_image(image_file)
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    renditions = {'source': image_name, 'width': width, 'height': height,
+                  'placeholder': placeholder}
+    for image_format, sizes in encoded.items():
+        renditions[image_format] = {}
+        for rendition_width, content in sizes.items():
+            name = storage.save(
+                f'{RENDITION_FOLDER}/{stem}-{rendition_width}w.'
+                f'{image_format}',
+                ContentFile(content)
+                )
+            renditions[image_format][str(rendition_width)] = name
+    return renditions
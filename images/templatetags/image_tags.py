@@ -0,0 +1,55 @@
+"""
+Template tags for responsive images - srcset from the resized renditions
+of an image, and its placeholder (see renditions.py and placeholders.py)
+"""
+from django import template
+from django.core.files.storage import default_storage
+
+register = template.Library()
+
+
+def _current_renditions(item):
+    """
+    The item's (Product or Market) renditions, or empty dict if there are
+    none, or they are out of date (image was changed outside of the forms,
+    e.g. in admin, or the image job hasn't run yet)
+    """
+    renditions = item.image_renditions or {}
+    if not item.image or renditions.get('source') != item.image.name:
+        return {}
+    return renditions
+
+
+@register.simple_tag
+def srcset(item, image_format):
+    """
+    srcset attribute value for the item's image in the format ('webp' or
+    'jpeg'), e.g. 'url-320w.webp 320w, url-640w.webp 640w'
+    Empty string if there are no current renditions, so the template can
+    fall back to the original image.
+    """
+    sizes = sorted(
+        _current_renditions(item).get(image_format, {}).items(),
+        key=lambda size: int(size[0])
+        )
+    return ', '.join(
+        f'{default_storage.url(name)} {width}w' for width, name in sizes
+        )
+
+
+@register.simple_tag
+def image_details(item):
+    """
+    Dict of width and height of the item's original image and its
+    placeholder (dominant colour and blurhash), for the template to set the
+    image size and placeholder. Empty dict if there are no current
+    renditions.
+    """
+    renditions = _current_renditions(item)
+    if not renditions:
+        return {}
+    return {
+        'width': renditions['width'],
+        'height': renditions['height'],
+        'placeholder': renditions.get('placeholder', {}),
+    }
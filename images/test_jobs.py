@@ -0,0 +1,183 @@
+"""Tests for image rendition jobs in jobs.py and the management commands"""
+import io
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from markets.models import Market, County
+from products.models import Category, Product
+from .jobs import enqueue_renditions, make_executor, process_pending_jobs
+from .models import ImageJob
+from .test_renditions import make_image
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class TestImageJobs(TestCase):
+    """Tests for adding and processing image jobs"""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create category and county"""
+        Category.objects.create(name='category', friendly_name='Category')
+        County.objects.create(name='dublin', friendly_name='Dublin')
+
+    @classmethod
+    def tearDownClass(cls):
+        """remove the uploaded files"""
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def new_product(self, number):
+        """product with an image saved to storage"""
+        product = Product.objects.create(
+            category=Category.objects.get(id=1),
+            name=f'Product {number}',
+            description='description',
+            price=10,
+        )
+        product.image.save(
+            f'product{number}.jpg',
+            ContentFile(make_image(400, 300).read())
+            )
+        return product
+
+    def new_market(self):
+        """market with an image saved to storage"""
+        market = Market.objects.create(
+            name='Market',
+            location='Location',
+            county=County.objects.get(id=1),
+            date='2030-01-01',
+            start_time='10:00',
+            end_time='16:00',
+            website='https://www.test.com',
+        )
+        market.image.save(
+            'market.jpg', ContentFile(make_image(400, 300).read())
+            )
+        return market
+
+    def test_job_added_instead_of_resizing(self):
+        """Saving the form adds a job, renditions aren't made yet"""
+        product = self.new_product(1)
+        enqueue_renditions(product)
+        job = ImageJob.objects.get()
+        self.assertEqual(job.status, ImageJob.PENDING)
+        self.assertEqual(job.item, product)
+        self.assertEqual(job.image_name, product.image.name)
+        product.refresh_from_db()
+        self.assertEqual(product.image_renditions, {})
+
+    def test_jobs_processed_in_worker_processes(self):
+        """Product and market renditions made in a process pool"""
+        products = [self.new_product(number) for number in range(3)]
+        market = self.new_market()
+        for instance in products + [market]:
+            enqueue_renditions(instance)
+        with make_executor(2) as executor:
+            self.assertEqual(process_pending_jobs(executor), (4, 0))
+        self.assertFalse(
+            ImageJob.objects.exclude(status=ImageJob.DONE).exists()
+            )
+        for instance in products + [market]:
+            instance.refresh_from_db()
+            self.assertEqual(
+                instance.image_renditions['source'], instance.image.name
+                )
+            self.assertTrue(default_storage.exists(
+                instance.image_renditions['webp']['320']
+                ))
+
+    def test_result_discarded_if_image_changed(self):
+        """
+        If the image changed after the job was added, the renditions from
+        the job aren't used, and their files are deleted
+        """
+        product = self.new_product(1)
+        enqueue_renditions(product)
+        product.image.save(
+            'replaced.jpg', ContentFile(make_image(400, 300).read())
+            )
+        with mock.patch('images.jobs.delete_renditions') as delete:
+            with ThreadPoolExecutor(1) as executor:
+                self.assertEqual(process_pending_jobs(executor), (1, 0))
+        product.refresh_from_db()
+        self.assertEqual(product.image_renditions, {})
+        self.assertIn('product1', delete.call_args[0][0]['source'])
+
+    def test_rerender_keeps_files_written_under_same_names(self):
+        """
+        Re-rendering the same image writes the same names when storage
+        overwrites files (S3) - those files aren't deleted as old ones
+        """
+        def overwrite(name, max_length=None):
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            return name
+
+        product = self.new_product(1)
+        with mock.patch.object(
+                default_storage, 'get_available_name', side_effect=overwrite):
+            for _ in range(2):
+                enqueue_renditions(product)
+                with ThreadPoolExecutor(1) as executor:
+                    self.assertEqual(process_pending_jobs(executor), (1, 0))
+        product.refresh_from_db()
+        for widths in (product.image_renditions['webp'],
+                       product.image_renditions['jpeg']):
+            for name in widths.values():
+                self.assertTrue(default_storage.exists(name))
+
+    def test_failed_job_retried_then_marked_failed(self):
+        """Job for missing image is tried again, up to MAX_ATTEMPTS"""
+        product = self.new_product(1)
+        enqueue_renditions(product)
+        default_storage.delete(product.image.name)
+        with ThreadPoolExecutor(1) as executor:
+            for _ in range(3):
+                self.assertEqual(process_pending_jobs(executor), (0, 1))
+            self.assertEqual(process_pending_jobs(executor), (0, 0))
+        job = ImageJob.objects.get()
+        self.assertEqual(job.status, ImageJob.FAILED)
+        self.assertEqual(job.attempts, 3)
+
+    def test_removed_image_clears_renditions_without_job(self):
+        """No job needed when the image is removed"""
+        product = self.new_product(1)
+        product.image_renditions = {'source': 'old.jpg', 'webp': {}}
+        product.image = None
+        enqueue_renditions(product)
+        self.assertFalse(ImageJob.objects.exists())
+        product.refresh_from_db()
+        self.assertEqual(product.image_renditions, {})
+
+    def test_backfill_command(self):
+        """Backfill renders every image and reports throughput"""
+        for number in range(2):
+            self.new_product(number)
+        self.new_market()
+        Product.objects.create(
+            category=Category.objects.get(id=1),
+            name='No image',
+            description='description',
+            price=10,
+        )
+        output = io.StringIO()
+        call_command('backfill_renditions', workers=2, stdout=output)
+        self.assertIn('Queued 3 images', output.getvalue())
+        self.assertRegex(
+            output.getvalue(),
+            r'Rendered 3 images in [\d.]+s \([\d.]+ images/s'
+            )
+        self.assertEqual(
+            Product.objects.exclude(image_renditions={}).count(), 2
+            )
+        self.assertEqual(
+            Market.objects.exclude(image_renditions={}).count(), 1
+            )
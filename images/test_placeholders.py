@@ -0,0 +1,105 @@
+"""Tests for image placeholders in placeholders.py and card_image.html"""
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from PIL import Image
+from products.models import Category, Product
+from .jobs import enqueue_renditions, process_pending_jobs
+from .placeholders import blurhash, compute_placeholder, dominant_colour
+from .test_renditions import make_image
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def gradient_pixels():
+    """24 x 32 pixel array with a red/green gradient"""
+    pixels = np.zeros((24, 32, 3), dtype=np.uint8)
+    pixels[:, :, 0] = np.arange(32) * 8
+    pixels[:, :, 1] = (np.arange(24) * 10)[:, None]
+    pixels[:, :, 2] = 128
+    return pixels
+
+
+class TestPlaceholders(TestCase):
+    """Tests for the dominant colour and blurhash calculations"""
+
+    def test_blurhash_matches_reference(self):
+        """Same hash as the reference BlurHash implementation"""
+        self.assertEqual(
+            blurhash(gradient_pixels()), 'LxH27k2swxX8mHWWjtf7gJfjfQfj'
+            )
+        self.assertEqual(blurhash(gradient_pixels(), 1, 1), '00H27k')
+
+    def test_dominant_colour(self):
+        """Colour covering most of the image is returned"""
+        pixels = np.zeros((10, 10, 3), dtype=np.uint8)
+        pixels[:] = (200, 40, 40)
+        pixels[:3] = (10, 10, 250)
+        self.assertEqual(dominant_colour(pixels), '#c82828')
+
+    def test_compute_placeholder_from_large_image(self):
+        """Image is reduced before computing, result has both values"""
+        image = Image.new('RGB', (2000, 1500), (0, 128, 255))
+        placeholder = compute_placeholder(image)
+        self.assertEqual(placeholder['colour'], '#0080ff')
+        self.assertEqual(len(placeholder['blurhash']), 28)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class TestCardImages(TestCase):
+    """Tests for placeholder and lazy loading on the product cards"""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create category and products, with renditions for one of them"""
+        category = Category.objects.create(
+            name='category', friendly_name='Category'
+            )
+        for number in range(6):
+            Product.objects.create(
+                category=category,
+                name=f'Product {number}',
+                description='description',
+                price=10 + number,
+            )
+
+    @classmethod
+    def tearDownClass(cls):
+        """remove the uploaded files"""
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_placeholder_and_size_on_card(self):
+        """Card with renditions has size, colour and blurhash set"""
+        product = Product.objects.get(name='Product 0')
+        product.image.save(
+            'product.jpg', ContentFile(make_image(400, 300).read())
+            )
+        enqueue_renditions(product)
+        with ThreadPoolExecutor(1) as executor:
+            process_pending_jobs(executor)
+        product.refresh_from_db()
+        placeholder = product.image_renditions['placeholder']
+        response = self.client.get('/products/?sort=price&direction=asc')
+        self.assertContains(
+            response, f'background-color: {placeholder["colour"]};'
+            )
+        self.assertContains(
+            response, f'data-blurhash="{placeholder["blurhash"]}"'
+            )
+        self.assertContains(response, 'width="400" height="300"')
+
+    def test_cards_after_first_row_lazy_loaded(self):
+        """First 4 images load straight away, the rest lazily"""
+        response = self.client.get('/products/')
+        self.assertContains(response, 'loading="lazy"', count=2)
+
+    def test_infinite_scroll_cards_all_lazy_loaded(self):
+        """Every image in the next page of cards is lazy loaded"""
+        response = self.client.get('/products/page/')
+        self.assertEqual(
+            response.json()['html'].count('loading="lazy"'), 6
+            )
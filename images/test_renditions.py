@@ -0,0 +1,165 @@
+"""Tests for image renditions in renditions.py, forms.py and image_tags.py"""
+import io
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from PIL import Image
+from products.forms import ProductForm
+from products.models import Category, Product
+from .jobs import process_pending_jobs
+from .renditions import render_image, RENDITION_WIDTHS
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def make_image(width, height, name='photo.jpg', image_format='JPEG'):
+    """uploaded image file with a gradient, like a photo"""
+    image = Image.new('RGB', (width, height))
+    image.putdata([
+        (x * 255 // width, y * 255 // height, (x * y) % 256)
+        for y in range(height) for x in range(width)
+        ])
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, quality=95)
+    return SimpleUploadedFile(name, buffer.getvalue())
+
+
+class TestRenderImage(TestCase):
+    """Tests for resizing and encoding in render_image"""
+
+    def test_each_width_in_each_format(self):
+        """Image resized to each width smaller than it, keeping ratio"""
+        size, encoded, placeholder = render_image(make_image(1200, 800))
+        self.assertEqual(size, (1200, 800))
+        for image_format, pil_format in (('webp', 'WEBP'), ('jpeg', 'JPEG')):
+            self.assertEqual(
+                sorted(encoded[image_format]), list(RENDITION_WIDTHS)
+                )
+            with Image.open(io.BytesIO(encoded[image_format][320])) as image:
+                self.assertEqual(image.format, pil_format)
+                self.assertEqual(image.size, (320, 213))
+
+    def test_small_image_not_enlarged(self):
+        """Image smaller than all the widths is kept at its own width"""
+        size, encoded, placeholder = render_image(make_image(200, 100))
+        self.assertEqual(list(encoded['webp']), [200])
+
+    def test_transparent_png(self):
+        """PNG with transparency converted for JPEG"""
+        image = Image.new('RGBA', (400, 400), (255, 0, 0, 0))
+        buffer = io.BytesIO()
+        image.save(buffer, 'PNG')
+        buffer.seek(0)
+        size, encoded, placeholder = render_image(buffer)
+        with Image.open(io.BytesIO(encoded['jpeg'][320])) as jpeg:
+            self.assertEqual(jpeg.getpixel((0, 0)), (255, 255, 255))
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class TestRenditionsOnFormSave(TestCase):
+    """
+    Tests for renditions created when ProductForm is saved, and the job is
+    processed (in a thread here - see test_jobs.py for worker processes)
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create category for the products"""
+        Category.objects.create(name='category', friendly_name='Category')
+
+    @classmethod
+    def tearDownClass(cls):
+        """remove the uploaded files"""
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def save_form(self, image, instance=None, data=None):
+        """save ProductForm with the image, return the product"""
+        form = ProductForm(
+            data or {
+                'category': 1, 'name': 'Product', 'price': 10,
+                'description': 'description', 'is_active': True,
+            },
+            {'image': image} if image else {},
+            instance=instance,
+            )
+        self.assertTrue(form.is_valid(), form.errors)
+        product = form.save()
+        with ThreadPoolExecutor(1) as executor:
+            process_pending_jobs(executor)
+        product.refresh_from_db()
+        return product
+
+    def test_renditions_saved_to_storage(self):
+        """
+        Renditions saved through the storage, names stored on the product,
+        and the smallest WebP is a fraction of the size of the original
+        """
+        product = self.save_form(make_image(1600, 1200))
+        renditions = product.image_renditions
+        self.assertEqual(renditions['source'], product.image.name)
+        self.assertEqual(renditions['width'], 1600)
+        self.assertEqual(sorted(renditions['webp'], key=int),
+                         ['320', '640', '960'])
+        for name in renditions['webp'].values():
+            self.assertTrue(default_storage.exists(name))
+        smallest = default_storage.size(renditions['webp']['320'])
+        self.assertLess(smallest * 10, product.image.size)
+
+    def test_replacing_image_replaces_renditions(self):
+        """Old renditions deleted when the image changes or is removed"""
+        product = self.save_form(make_image(800, 600))
+        old_names = list(product.image_renditions['jpeg'].values())
+        data = {
+            'category': 1, 'name': 'Product', 'price': 10,
+            'description': 'description', 'is_active': True,
+        }
+        product = self.save_form(
+            make_image(700, 500, name='new.jpg'), instance=product, data=data
+            )
+        for name in old_names:
+            self.assertFalse(default_storage.exists(name))
+        self.assertEqual(product.image_renditions['width'], 700)
+        new_names = list(product.image_renditions['jpeg'].values())
+        product = self.save_form(
+            None, instance=product, data={**data, 'image-clear': 'on'}
+            )
+        self.assertEqual(product.image_renditions, {})
+        for name in new_names:
+            self.assertFalse(default_storage.exists(name))
+
+    def test_other_changes_keep_renditions(self):
+        """Saving without changing the image doesn't redo renditions"""
+        product = self.save_form(make_image(800, 600))
+        renditions = product.image_renditions
+        product = self.save_form(None, instance=product, data={
+            'category': 1, 'name': 'Renamed', 'price': 10,
+            'description': 'description', 'is_active': True,
+        })
+        self.assertEqual(product.image_renditions, renditions)
+
+    def test_srcset_tag(self):
+        """srcset lists the renditions by width, empty if out of date"""
+        product = self.save_form(make_image(800, 600))
+        template = Template(
+            "{% load image_tags %}{% srcset product 'webp' %}"
+            )
+        srcset = template.render(Context({'product': product}))
+        self.assertRegex(
+            srcset,
+            r'^/media/renditions/photo\w*-320w\.webp 320w, '
+            r'/media/renditions/photo\w*-640w\.webp 640w$'
+            )
+        product.image.name = 'changed-in-admin.jpg'
+        self.assertEqual(template.render(Context({'product': product})), '')
+
+    def test_shop_page_uses_srcset(self):
+        """Product card has picture element with WebP srcset"""
+        self.save_form(make_image(800, 600))
+        response = self.client.get('/products/')
+        self.assertContains(response, '<source type="image/webp" srcset=')
+        self.assertContains(response, '-320w.jpeg 320w')
@@ -2,6 +2,8 @@
 ASGI config for knot_art project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Served by gunicorn with uvicorn workers (see Procfile), so the async
+checkout views can wait for Stripe without holding up a worker.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
@@ -53,6 +53,7 @@ INSTALLED_APPS = [
     'checkout',
     'profiles',
     'markets',
+    'images',
     # other
     'crispy_forms',
     'storages',
@@ -60,11 +61,13 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'cache_headers.PublicCacheMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'cart.middleware.CartCookieMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -99,8 +102,9 @@ TEMPLATES = [
 ]
 
 
-# store messages in the session
-MESSAGE_STORAGE = 'django.contrib.messages.storage.session.SessionStorage'
+# store messages in a cookie, or in the session if too big for the cookie,
+# so showing a message doesn't usually write to the session table
+MESSAGE_STORAGE = 'django.contrib.messages.storage.fallback.FallbackStorage'
 
 
 # for allauth
@@ -143,6 +147,27 @@ else:
         }
     }
 
+# Cache shared by all the web and worker processes (see products/cache.py)
+# - memcached if MEMCACHED_SERVERS is set (comma separated host:port list),
+# otherwise the database, so no extra service is needed. With the database
+# cache a cached page costs two queries (version and page), and a miss
+# writes the page to the cache table during the request. Table created in
+# products migration 0013.
+if 'MEMCACHED_SERVERS' in os.environ:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+            'LOCATION': os.environ.get('MEMCACHED_SERVERS').split(','),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'knot_art_cache',
+        }
+    }
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -224,6 +249,9 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # variables to calculate delivery costs
 FREE_DELIVERY_THRESHOLD = 60
+# where the cart of a logged out user is kept - 'cookie' (signed cookie, no
+# session writes) or 'session' (see cart/storage.py)
+CART_STORAGE = 'cookie'
 STANDARD_DELIVERY_PERCENTAGE = 10
 
 # Stripe
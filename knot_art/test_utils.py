@@ -0,0 +1,13 @@
+"""
+Helpers shared by the tests of more than one app - SQLite query plans, for
+the tests that check queries use the indexes (test_indexes.py in products
+and markets)
+"""
+from django.db import connection
+
+
+def query_plan(sql):
+    """SQLite query plan for the sql, as one string"""
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        return ' '.join(row[-1] for row in cursor.fetchall())
@@ -20,6 +20,7 @@ class MarketAdmin(admin.ModelAdmin):
     """
     list_display = (
         'name', 'location', 'county', 'date', 'website', 'date_passed',
+        'save_count', 'comment_count',
         )
     list_filter = ('county',)
     search_fields = ['name', 'website', ]
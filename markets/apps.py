@@ -1,6 +1,15 @@
+"""
+config for markets app - added function to override ready method, to
+import signals module - used to keep the save and comment counts on
+Market up to date
+"""
 from django.apps import AppConfig
 
 
 class MarketsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'markets'
+
+    def ready(self):
+        """ override ready method - import signals module """
+        import markets.signals
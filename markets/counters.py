@@ -0,0 +1,41 @@
+"""
+Number of saves and comments stored on each Market (save_count and
+comment_count), so that pages showing them don't have to count them.
+Changed with F() expressions, so the database adds/subtracts in a single
+UPDATE and concurrent saves/comments aren't lost - see signals.py for
+when they're changed. recount_markets recalculates them from the saved
+market lists and comments, e.g. if they were changed outside of Django.
+"""
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from profiles.models import SavedMarketList
+from .models import Market, Comment
+
+
+def change_counts(market_ids, field, change):
+    """add change (positive or negative) to field for markets in ids"""
+    if market_ids:
+        Market.objects.filter(pk__in=market_ids).update(
+            **{field: F(field) + change}
+            )
+
+
+def recount_markets(markets=None):
+    """
+    Recalculate save_count and comment_count for the markets (queryset,
+    default all markets), in one UPDATE with subqueries. Returns number of
+    markets updated.
+    """
+    saves = SavedMarketList.market.through.objects.filter(
+        market=OuterRef('pk')
+        ).values('market').annotate(count=Count('*')).values('count')
+    comments = Comment.objects.filter(
+        market=OuterRef('pk')
+        ).order_by().values('market').annotate(
+            count=Count('*')
+            ).values('count')
+    markets = Market.objects.all() if markets is None else markets
+    return markets.update(
+        save_count=Coalesce(Subquery(saves), 0),
+        comment_count=Coalesce(Subquery(comments), 0),
+        )
@@ -2,14 +2,16 @@
 import datetime
 from django import forms
 from django.core.exceptions import ValidationError
+from images.forms import ImageRenditionsFormMixin
 from products.widgets import CustomClearableFileInput
 from .models import Market, County, Comment
 
 
-class MarketForm(forms.ModelForm):
+class MarketForm(ImageRenditionsFormMixin, forms.ModelForm):
     """
     Market form for admin user to add/edit market from frontend.
     Image field - uses custom file input widget that overrides Django one
+    Resized renditions of the image created on save (ImageRenditionsFormMixin)
     """
     class Meta:
         """
@@ -0,0 +1,19 @@
+"""
+Management command to recalculate the number of saves and comments stored
+on each market (see markets/counters.py), e.g. after rows were changed
+outside of Django.
+Usage: python manage.py recount_markets
+"""
+from django.core.management.base import BaseCommand
+from markets.counters import recount_markets
+
+
+class Command(BaseCommand):
+    help = 'Recalculate save_count and comment_count for all markets'
+
+    def handle(self, *args, **options):
+        """recount for all markets, report how many were updated"""
+        updated = recount_markets()
+        self.stdout.write(self.style.SUCCESS(
+            f'Recounted saves and comments for {updated} markets'
+            ))
@@ -0,0 +1,21 @@
+# Generated by Django 3.2 on 2026-10-18 07:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('markets', '0006_alter_market_county'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='market',
+            index=models.Index(fields=['date'], name='market_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='market',
+            index=models.Index(fields=['county', 'date'], name='market_county_date_idx'),
+        ),
+    ]
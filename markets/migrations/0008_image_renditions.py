@@ -0,0 +1,18 @@
+# Generated by Django 3.2 on 2026-10-18 07:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('markets', '0007_market_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='market',
+            name='image_renditions',
+            field=models.JSONField(default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 3.2 on 2026-10-18 09:12
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_saves_and_comments(apps, schema_editor):
+    """set save_count and comment_count for existing markets"""
+    Market = apps.get_model('markets', 'Market')
+    Comment = apps.get_model('markets', 'Comment')
+    SavedMarketList = apps.get_model('profiles', 'SavedMarketList')
+    saves = SavedMarketList.market.through.objects.filter(
+        market=OuterRef('pk')
+        ).values('market').annotate(count=Count('*')).values('count')
+    comments = Comment.objects.filter(
+        market=OuterRef('pk')
+        ).order_by().values('market').annotate(
+            count=Count('*')
+            ).values('count')
+    Market.objects.update(
+        save_count=Coalesce(Subquery(saves), 0),
+        comment_count=Coalesce(Subquery(comments), 0),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('markets', '0008_image_renditions'),
+        ('profiles', '0003_rename_savedmarket_savedmarketlist'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='market',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='market',
+            name='save_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(
+            count_saves_and_comments, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2 on 2026-10-18 08:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('markets', '0009_market_counts'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['market', 'created_on', 'id'], name='comment_market_created_idx'),
+        ),
+    ]
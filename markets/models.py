@@ -29,10 +29,25 @@ class County(models.Model):
 
 
 class Market(models.Model):
-    """Details about the markets - date time etc."""
+    """
+    Details about the markets - date time etc.
+    save_count (number of users' SavedMarketLists the market is in) and
+    comment_count are kept up to date by the signals in signals.py, so
+    pages don't need to count them. The recount_markets command
+    recalculates them.
+    """
     class Meta:
-        """order by date, newest date first"""
+        """
+        order by date, newest date first. Indexes for markets view, which
+        filters on date (upcoming or past markets) and on county and date.
+        """
         ordering = ['-date']
+        indexes = [
+            models.Index(fields=['date'], name='market_date_idx'),
+            models.Index(
+                fields=['county', 'date'], name='market_county_date_idx'
+                ),
+        ]
 
     name = models.CharField(max_length=50)
     location = models.CharField(max_length=100)
@@ -43,7 +58,11 @@ class Market(models.Model):
     start_time = models.TimeField()
     end_time = models.TimeField()
     image = models.ImageField(null=True, blank=True)
+    # resized copies of image for srcset, see images/renditions.py
+    image_renditions = models.JSONField(default=dict, editable=False)
     website = models.URLField(max_length=254,)
+    save_count = models.PositiveIntegerField(default=0, editable=False)
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
 
     @property
     def date_passed(self):
@@ -59,8 +78,18 @@ class Market(models.Model):
 class Comment(models.Model):
     """Model for users to add comments on markets"""
     class Meta:
-        """order by when created, oldest comments first"""
+        """
+        order by when created, oldest comments first. Index for the pages
+        of comments on the market details page (newest first, by
+        created_on and id, see views.py)
+        """
         ordering = ['created_on']
+        indexes = [
+            models.Index(
+                fields=['market', 'created_on', 'id'],
+                name='comment_market_created_idx'
+                ),
+        ]
 
     author = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name='market_comments'
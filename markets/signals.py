@@ -0,0 +1,88 @@
+"""
+To listen for signals from Comment and SavedMarketList, to keep the
+save_count and comment_count on Market up to date (see counters.py):
+- comment created or deleted
+- markets added to or removed from a SavedMarketList (m2m_changed, from
+  update_saved_markets_list view or admin), or the list deleted
+"""
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete
+    )
+from django.dispatch import receiver
+from profiles.models import SavedMarketList
+from .counters import change_counts
+from .models import Comment
+
+SavedMarket = SavedMarketList.market.through
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, raw=False, **kwargs):
+    """
+    Handles signals from the post_save event
+    When comment created, add 1 to the market's comment count
+    """
+    if created and not raw:
+        change_counts([instance.market_id], 'comment_count', 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    """
+    Handles signals from the post_delete event
+    When comment deleted, subtract 1 from the market's comment count
+    """
+    change_counts([instance.market_id], 'comment_count', -1)
+
+
+def _saved_markets(instance, reverse, pk_set):
+    """
+    Rows in the SavedMarketList/Market table for the m2m_changed signal:
+    instance is a SavedMarketList (or Market if reverse), pk_set the ids
+    on the other side (or None for all)
+    """
+    rows = SavedMarket.objects.filter(
+        **{'market' if reverse else 'savedmarketlist': instance}
+        )
+    if pk_set is not None:
+        rows = rows.filter(
+            **{'savedmarketlist__in' if reverse else 'market__in': pk_set}
+            )
+    return rows
+
+
+@receiver(m2m_changed, sender=SavedMarket)
+def count_saved_markets(sender, instance, action, reverse, pk_set,
+                        **kwargs):
+    """
+    Handles signals from markets being added to/removed from a saved list
+    After add, add 1 to the save count of each market added (pk_set only
+    has the ones that weren't already in the list). Before remove/clear,
+    subtract 1 for each row that's about to be deleted.
+    """
+    if action == 'post_add':
+        rows = _saved_markets(instance, reverse, pk_set)
+        change = 1
+    elif action in ('pre_remove', 'pre_clear'):
+        rows = _saved_markets(instance, reverse, pk_set)
+        change = -1
+    else:
+        return
+    market_ids = list(rows.values_list('market_id', flat=True))
+    if reverse:
+        # one market, changed by the number of lists
+        change_counts(market_ids[:1], 'save_count', change * len(market_ids))
+    else:
+        change_counts(market_ids, 'save_count', change)
+
+
+@receiver(pre_delete, sender=SavedMarketList)
+def count_deleted_saved_list(sender, instance, **kwargs):
+    """
+    Handles signals from the pre_delete event
+    When a SavedMarketList is deleted (e.g. user deleted), subtract 1 from
+    the save count of each market in it
+    """
+    change_counts(
+        list(instance.market.values_list('id', flat=True)), 'save_count', -1
+        )
@@ -0,0 +1,146 @@
+"""Tests for save_count and comment_count on Market, see counters.py"""
+import datetime
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from profiles.models import SavedMarketList, UserProfile
+from .models import County, Market, Comment
+
+
+class TestMarketCounters(TestCase):
+    """Counts changed by the signals in signals.py, and recount_markets"""
+    @classmethod
+    def setUpTestData(cls):
+        """2 markets and 2 users"""
+        county = County.objects.create(
+            name='dublin_3', friendly_name='Dublin 3'
+        )
+        cls.markets = [
+            Market.objects.create(
+                name=f'Market {number}',
+                location='The Street',
+                county=county,
+                date=datetime.date.today(),
+                start_time='09:00',
+                end_time='17:00',
+                website='http://www.crafted.ie',
+            )
+            for number in range(2)
+        ]
+        cls.users = [
+            User.objects.create_user(
+                username=f'user{number}', password='SecretCode14'
+                )
+            for number in range(2)
+        ]
+
+    def counts(self, market):
+        """(save_count, comment_count) from the database"""
+        market.refresh_from_db()
+        return market.save_count, market.comment_count
+
+    def saved_list(self, user):
+        """new SavedMarketList for the user"""
+        return SavedMarketList.objects.create(
+            user=UserProfile.objects.get(user=user)
+            )
+
+    def test_comment_created_and_deleted(self):
+        """Adding comments adds to the count, deleting subtracts"""
+        market = self.markets[0]
+        comments = [
+            Comment.objects.create(
+                market=market, author=self.users[0], comment='Comment'
+                )
+            for _ in range(3)
+        ]
+        self.assertEqual(self.counts(market), (0, 3))
+        comments[0].comment = 'Edited'
+        comments[0].save()
+        self.assertEqual(self.counts(market), (0, 3))
+        comments[1].delete()
+        self.assertEqual(self.counts(market), (0, 2))
+        self.assertEqual(self.counts(self.markets[1]), (0, 0))
+
+    def test_comment_views(self):
+        """Comment posted and deleted on the site changes the count"""
+        market = self.markets[0]
+        self.client.login(username='user0', password='SecretCode14')
+        url = reverse('market_details', args=[market.id])
+        self.client.post(url, {'comment': 'Great', 'redirect_url': url})
+        self.assertEqual(self.counts(market), (0, 1))
+        comment = Comment.objects.get(market=market)
+        self.client.post(reverse('delete_comment', args=[comment.id]))
+        self.assertEqual(self.counts(market), (0, 0))
+
+    def test_markets_added_and_removed(self):
+        """
+        Adding a market to a list adds 1, adding it again doesn't change
+        it, removing/clearing subtracts 1 for markets that were in the list
+        """
+        first, second = self.markets
+        saved_list = self.saved_list(self.users[0])
+        saved_list.market.add(first, second)
+        saved_list.market.add(first)
+        self.assertEqual(self.counts(first), (1, 0))
+        other_list = self.saved_list(self.users[1])
+        other_list.market.add(first)
+        self.assertEqual(self.counts(first), (2, 0))
+        other_list.market.remove(first, second)
+        self.assertEqual(self.counts(first), (1, 0))
+        self.assertEqual(self.counts(second), (1, 0))
+        saved_list.market.clear()
+        self.assertEqual(self.counts(first), (0, 0))
+        self.assertEqual(self.counts(second), (0, 0))
+
+    def test_lists_added_and_removed_from_market(self):
+        """Changes from the market side (reverse) change that market"""
+        market = self.markets[0]
+        lists = [self.saved_list(user) for user in self.users]
+        market.savedmarketlist_set.add(*lists)
+        self.assertEqual(self.counts(market), (2, 0))
+        market.savedmarketlist_set.remove(lists[0])
+        self.assertEqual(self.counts(market), (1, 0))
+        market.savedmarketlist_set.clear()
+        self.assertEqual(self.counts(market), (0, 0))
+
+    def test_saved_list_deleted(self):
+        """Deleting the list (or the user) subtracts from its markets"""
+        for user in self.users:
+            self.saved_list(user).market.add(*self.markets)
+        self.assertEqual(self.counts(self.markets[1]), (2, 0))
+        SavedMarketList.objects.get(user__user=self.users[0]).delete()
+        self.assertEqual(self.counts(self.markets[1]), (1, 0))
+        self.users[1].delete()
+        self.assertEqual(self.counts(self.markets[0]), (0, 0))
+        self.assertEqual(self.counts(self.markets[1]), (0, 0))
+
+    def test_save_view(self):
+        """Saving and removing on the site changes the count"""
+        market = self.markets[0]
+        self.client.login(username='user0', password='SecretCode14')
+        url = reverse('update_my_markets', args=[market.id])
+        self.client.post(url, {'redirect_url': '/markets/'})
+        self.assertEqual(self.counts(market), (1, 0))
+        response = self.client.get(
+            reverse('market_details', args=[market.id])
+            )
+        self.assertEqual(response.context['market'].save_count, 1)
+        self.client.post(url, {'redirect_url': '/markets/'})
+        self.assertEqual(self.counts(market), (0, 0))
+
+    def test_recount_command(self):
+        """Command corrects counts that are wrong"""
+        market = self.markets[0]
+        self.saved_list(self.users[0]).market.add(market)
+        Comment.objects.create(
+            market=market, author=self.users[0], comment='Comment'
+            )
+        Market.objects.update(save_count=7, comment_count=9)
+        out = StringIO()
+        call_command('recount_markets', stdout=out)
+        self.assertIn('2 markets', out.getvalue())
+        self.assertEqual(self.counts(market), (1, 1))
+        self.assertEqual(self.counts(self.markets[1]), (0, 0))
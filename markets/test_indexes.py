@@ -0,0 +1,64 @@
+"""
+Tests that the markets page queries use the indexes on Market, by
+checking the SQLite query plan (EXPLAIN QUERY PLAN) of the queries the
+show_markets view makes
+"""
+import datetime
+from unittest import skipUnless
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from knot_art.test_utils import query_plan
+from .models import County, Market
+
+
+@skipUnless(connection.vendor == 'sqlite', 'query plans are for SQLite')
+class TestMarketIndexes(TestCase):
+    """Query plans for the show_markets view"""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create two counties with markets in the past and future"""
+        today = datetime.date.today()
+        for name in ('Dublin', 'Cork'):
+            county = County.objects.create(name=name)
+            for days in range(-10, 10):
+                Market.objects.create(
+                    name=f'Market {days}',
+                    location='Location',
+                    county=county,
+                    date=today + datetime.timedelta(days=days),
+                    start_time='10:00',
+                    end_time='16:00',
+                    website='https://www.test.com',
+                )
+
+    def markets_plan(self, query_string=''):
+        """plan of the query that fetches the markets"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/markets/{query_string}')
+        self.assertEqual(response.status_code, 200)
+        sql = next(
+            query['sql'] for query in queries
+            if 'FROM "markets_market"' in query['sql']
+            and 'save_count' in query['sql']
+            )
+        return query_plan(sql)
+
+    def test_upcoming_markets_use_date_index(self):
+        """Upcoming markets found with a range search on the date index"""
+        plan = self.markets_plan()
+        self.assertIn('USING INDEX market_date_idx (date>?)', plan)
+
+    def test_past_markets_use_date_index(self):
+        """Past markets found with a range search on the date index"""
+        plan = self.markets_plan('?view=past')
+        self.assertIn('USING INDEX market_date_idx (date<?)', plan)
+
+    def test_county_filter_uses_county_date_index(self):
+        """Filtering by county uses the county and date index"""
+        plan = self.markets_plan('?county=Cork')
+        self.assertIn(
+            'USING INDEX market_county_date_idx (county_id=? AND date>?)',
+            plan
+            )
@@ -3,6 +3,9 @@ import datetime
 from django.test import TestCase
 from django.contrib.auth.models import User
 from django.contrib.messages import get_messages
+from django.http import QueryDict
+from django.urls import reverse
+from profiles.models import SavedMarketList
 from .models import County, Market, Comment
 
 
@@ -202,6 +205,89 @@ class TestShowMarketsView(TestCase):
             self.assertLess(market.date, datetime.date.today())
 
 
+class TestShowMarketsQueryCount(TestCase):
+    """
+    To test that the number of queries for show_markets page doesn't
+    depend on the number of markets, comments or saves
+    """
+    @classmethod
+    def setUpTestData(cls):
+        """Create 2 instances of County, and users to comment/save markets"""
+        County.objects.create(name='dublin_3', friendly_name='Dublin 3')
+        County.objects.create(name='dublin_4', friendly_name='Dublin 4')
+        cls.users = [
+            User.objects.create_user(
+                username=f'user{number}', password='secret'
+                )
+            for number in range(3)
+        ]
+
+    def create_markets(self, number_of_markets):
+        """
+        Create upcoming markets in alternating counties, each with a comment
+        and a save from every user
+        """
+        today = datetime.date.today()
+        for number in range(number_of_markets):
+            market = Market.objects.create(
+                name=f'Market {number}',
+                location='The Street',
+                county=County.objects.get(id=number % 2 + 1),
+                date=today + datetime.timedelta(days=number),
+                start_time='09:00',
+                end_time='17:00',
+                website='http://www.crafted.ie',
+            )
+            for user in self.users:
+                Comment.objects.create(
+                    author=user, market=market, comment='Comment'
+                    )
+                saved_markets_list, _ = SavedMarketList.objects.get_or_create(
+                    user=user.userprofile
+                    )
+                saved_markets_list.market.add(market)
+
+    def test_query_count_is_constant_for_logged_in_user(self):
+        """
+        Query count for markets page with 2 markets is the same as with 10.
+        Queries are: session, user, user's saved market ids, markets, and
+        markets for the county dropdown.
+        """
+        self.client.login(username='user0', password='secret')
+        self.create_markets(2)
+        with self.assertNumQueries(5):
+            response = self.client.get('/markets/')
+        self.assertEqual(len(response.context['markets']), 2)
+        self.create_markets(8)
+        with self.assertNumQueries(5):
+            response = self.client.get('/markets/')
+        self.assertEqual(len(response.context['markets']), 10)
+
+    def test_query_count_is_constant_for_superuser(self):
+        """Superuser page also shows saves, query count still constant"""
+        User.objects.create_user(
+            username='admin', password='secret', is_superuser=True
+            )
+        self.client.login(username='admin', password='secret')
+        self.create_markets(2)
+        with self.assertNumQueries(5):
+            self.client.get('/markets/')
+        self.create_markets(8)
+        with self.assertNumQueries(5):
+            self.client.get('/markets/')
+
+    def test_counts_and_saved_markets_are_correct(self):
+        """Each market has 3 comments, 3 saves, and is saved by user"""
+        self.client.login(username='user0', password='secret')
+        self.create_markets(3)
+        response = self.client.get('/markets/')
+        for market in response.context['markets']:
+            self.assertEqual(market.comment_count, 3)
+            self.assertEqual(market.save_count, 3)
+            self.assertIn(market.id, response.context['saved_market_ids'])
+        self.assertContains(response, 'Remove from My Markets', count=3)
+
+
 class TestMarketDetailsView(TestCase):
     """Tests for market_details view to show comments"""
     @classmethod
@@ -341,6 +427,129 @@ class TestMarketDetailsView(TestCase):
             )
 
 
+class TestMarketCommentsPages(TestCase):
+    """Tests for pages of comments on market_details and market_comments"""
+    @classmethod
+    def setUpTestData(cls):
+        """Market with 45 comments, by 15 different users"""
+        county = County.objects.create(
+            name='dublin_3', friendly_name='Dublin 3'
+        )
+        cls.market = Market.objects.create(
+            name='Popular Market',
+            location='The Street',
+            county=county,
+            date=datetime.date.today(),
+            start_time='09:00',
+            end_time='17:00',
+            website='http://www.crafted.ie',
+        )
+        users = [
+            User.objects.create_user(username=f'user{number}', password='pw')
+            for number in range(15)
+        ]
+        Comment.objects.bulk_create(
+            Comment(
+                author=users[number % 15],
+                market=cls.market,
+                comment=f'Comment {number}',
+            )
+            for number in range(45)
+        )
+        cls.newest_first = list(
+            cls.market.comments.order_by('-created_on', '-id')
+            .values_list('id', flat=True)
+            )
+
+    def test_first_page_is_newest_comments(self):
+        """First 20 comments, newest first, with link to older comments"""
+        response = self.client.get(
+            reverse('market_details', args=[self.market.id])
+            )
+        comments = response.context['comments']
+        self.assertEqual(
+            [comment.id for comment in comments], self.newest_first[:20]
+            )
+        self.assertTrue(response.context['older_comments_url'])
+        self.assertContains(response, 'id="load-older-comments"')
+
+    def test_query_count_does_not_depend_on_comments(self):
+        """Authors fetched with the comments, so 20 authors cost no more"""
+        url = reverse('market_details', args=[self.market.id])
+        with self.assertNumQueries(2):
+            self.client.get(url)
+        Comment.objects.create(
+            author=User.objects.get(username='user1'), market=self.market,
+            comment='Newest'
+            )
+        with self.assertNumQueries(2):
+            self.client.get(url)
+        with self.assertNumQueries(2):
+            self.client.get(
+                reverse('market_comments', args=[self.market.id])
+                )
+
+    def test_older_comments_pages(self):
+        """Following the cursors returns every comment once, in order"""
+        url = reverse('market_comments', args=[self.market.id])
+        response = self.client.get(
+            reverse('market_details', args=[self.market.id])
+            )
+        seen = [comment.id for comment in response.context['comments']]
+        cursor = QueryDict(
+            response.context['older_comments_url'][1:]
+            )['cursor']
+        pages = 0
+        while cursor:
+            response = self.client.get(url, {'cursor': cursor})
+            self.assertTemplateUsed(
+                response, 'markets/includes/comments.html'
+                )
+            seen.extend(
+                comment.id for comment in response.context['comments']
+                )
+            cursor = response.json()['next_cursor']
+            pages += 1
+        self.assertEqual(pages, 2)
+        self.assertEqual(seen, self.newest_first)
+
+    def test_link_works_without_javascript(self):
+        """Older comments link loads the next page on the details page"""
+        url = reverse('market_details', args=[self.market.id])
+        response = self.client.get(url)
+        response = self.client.get(
+            url + response.context['older_comments_url']
+            )
+        self.assertEqual(
+            [comment.id for comment in response.context['comments']],
+            self.newest_first[20:40]
+            )
+
+    def test_invalid_cursor_is_404(self):
+        """Altered cursor raises 404"""
+        for name in ('market_details', 'market_comments'):
+            response = self.client.get(
+                reverse(name, args=[self.market.id]), {'cursor': 'bad'}
+                )
+            self.assertEqual(response.status_code, 404)
+
+    def test_delete_modal_only_for_own_comments(self):
+        """Delete modal is rendered for the user's own comments only"""
+        self.client.login(username='user0', password='pw')
+        response = self.client.get(
+            reverse('market_details', args=[self.market.id])
+            )
+        own = sum(
+            comment.author.username == 'user0'
+            for comment in response.context['comments']
+            )
+        self.assertGreater(own, 0)
+        self.assertContains(
+            response, 'class="modal fade" id="deleteCommentModal',
+            count=own
+            )
+
+
 class TestEditCommentView(TestCase):
     """Tests for edit_comment view"""
     @classmethod
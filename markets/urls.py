@@ -6,6 +6,11 @@ from . import views
 urlpatterns = [
     path('', views.show_markets, name='markets'),
     path('<int:market_id>/', views.market_details, name='market_details'),
+    path(
+        '<int:market_id>/comments/',
+        views.market_comments,
+        name='market_comments'
+        ),
     path('add/', views.add_market, name='add_market'),
     path('edit/<int:market_id>/', views.edit_market, name='edit_market'),
     path('delete/<int:market_id>/', views.delete_market, name='delete_market'),
@@ -4,28 +4,40 @@ from django.shortcuts import render, redirect, get_object_or_404, reverse
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import PermissionDenied
 from django.views.decorators.http import require_POST
-from django.http import Http404
+from django.http import Http404, JsonResponse
 from django.contrib import messages
 from django.db.models.functions import Lower
+from django.template.loader import render_to_string
+from django.utils.http import urlencode
 from django.utils.safestring import mark_safe
+from cache_headers import public_for_anonymous
+from pagination import get_page, InvalidCursor
 from profiles.models import SavedMarketList, UserProfile
 from .models import Market, County, Comment
 from .forms import MarketForm, CommentForm
 
+# comments on market details page - newest first, id for a unique order
+COMMENTS_ORDERING = ['-created_on', '-id']
+COMMENTS_PAGE_SIZE = 20
 
+
+@public_for_anonymous()
 def show_markets(request):
     """
     Show markets with date of today or later, earliest first
     If superuser, show all markets (default ordering, latest first)
     If sort is present in the get request, then sort the markets by that
     option + pass current sorting back to context.
-    If user logged in, get their saved markets list if they have one (so
-    that template can show if market on their saved list or not)
+    If user logged in, get the ids of markets in their saved markets list
+    (so that template can show if market on their saved list or not)
     If 'county' in get request then filter results by that county.
     If 'view' in get request then show past markets only.
+    Markets are fetched in one query, with county - number of saves and
+    comments are stored on each market (see counters.py), so the number of
+    queries doesn't depend on the number of markets.
     """
     today = datetime.date.today()
-    saved_markets_list = None
+    saved_market_ids = set()
     sort = None
     sort_direction = None
     county = None
@@ -35,17 +47,14 @@ def show_markets(request):
         markets = Market.objects.all()
     else:
         markets = Market.objects.filter(date__gte=today).order_by('date')
+    markets = markets.select_related('county')
     # used in context to generate dropdown of available counties to filter by
     all_markets = markets.order_by('county')
 
     if request.user.is_authenticated:
-        user_profile = get_object_or_404(UserProfile, user=request.user)
-        try:
-            saved_markets_list = get_object_or_404(
-                SavedMarketList, user=user_profile
-                )
-        except Http404:
-            saved_markets_list = None
+        saved_market_ids = set(Market.objects.filter(
+            savedmarketlist__user__user=request.user
+            ).values_list('id', flat=True))
 
     # GET requests for sorting and filtering
     if request.GET:
@@ -54,7 +63,7 @@ def show_markets(request):
             view = request.GET['view']
             if view == 'past':
                 markets = Market.objects.filter(date__lt=today).order_by(
-                    'date')
+                    'date').select_related('county')
                 # to generate dropdown counties to filter by in template
                 all_markets = markets.order_by('county')
 
@@ -85,37 +94,55 @@ def show_markets(request):
     # used in template to determine options to show for button and sorting
     current_view = view
 
-    # dict for context so count of saves for each market can be got in template
-    markets_saves = {
-        market.id: SavedMarketList.objects.filter(market__in=[market]).count()
-        for market in markets
-        }
-
     context = {
         'markets': markets,
-        'saved_markets_list': saved_markets_list,
+        'saved_market_ids': saved_market_ids,
         'current_view': current_view,
         'current_sorting': current_sorting,
         'current_county': county,
         'all_markets': all_markets,
-        'markets_saves': markets_saves,
     }
     template = 'markets/markets.html'
     return render(request, template, context)
 
 
+def _get_comments_page(request, market):
+    """
+    Get the page of comments on the market after the 'cursor' in the GET
+    request (newest comments if no cursor), with the author of each comment
+    in the same query. Raise 404 if cursor is not valid.
+    Returns list of comments and the cursor for the next (older) page
+    """
+    try:
+        return get_page(
+            market.comments.select_related('author'),
+            COMMENTS_ORDERING,
+            cursor=request.GET.get('cursor'),
+            page_size=COMMENTS_PAGE_SIZE,
+            )
+    except InvalidCursor as error:
+        raise Http404 from error
+
+
 def market_details(request, market_id):
     """
     View to show an individual market and the comments on that market.
+    Comments are shown one page at a time, newest first (see
+    _get_comments_page) - older_comments_url is the link to the next page,
+    which script.js loads with market_comments view instead.
     Need to also retrieve the user's saved market list if they have one,
     so that the page shows whether the market is saved or not.
     Show comment form and handle posting of the form. If user not logged
     in then raise 403 as must be logged in to post comment.
     """
     saved_markets_list = None
-    market = get_object_or_404(Market, pk=market_id)
-    comments = market.comments.all()
-    market_saves = SavedMarketList.objects.filter(market__in=[market]).count()
+    market = get_object_or_404(
+        Market.objects.select_related('county'), pk=market_id
+        )
+    comments, next_cursor = _get_comments_page(request, market)
+    older_comments_url = None
+    if next_cursor:
+        older_comments_url = f'?{urlencode({"cursor": next_cursor})}'
 
     if request.user.is_authenticated:
         user_profile = get_object_or_404(UserProfile, user=request.user)
@@ -154,13 +181,29 @@ def market_details(request, market_id):
     context = {
         'market': market,
         'comments': comments,
+        'older_comments_url': older_comments_url,
         'form': form,
         'saved_markets_list': saved_markets_list,
-        'market_saves': market_saves,
     }
     return render(request, 'markets/market_details.html', context)
 
 
+def market_comments(request, market_id):
+    """
+    For the 'show older comments' link on the market details page - return
+    a page of comments as JSON, with the comments as a html fragment and
+    the cursor for the next page (null if there are no more comments).
+    """
+    market = get_object_or_404(Market, pk=market_id)
+    comments, next_cursor = _get_comments_page(request, market)
+    html = render_to_string(
+        'markets/includes/comments.html',
+        {'comments': comments},
+        request=request,
+        )
+    return JsonResponse({'html': html, 'next_cursor': next_cursor})
+
+
 @require_POST
 @login_required
 def delete_comment(request, comment_id):
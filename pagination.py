@@ -0,0 +1,96 @@
+"""
+Keyset (cursor) pagination for querysets - used for the shop listing and
+the comments on the market details page.
+Instead of OFFSET, each page is fetched with a WHERE clause on the values
+of the last item of the previous page, so a deep page costs the same as
+the first page. The cursor is those values and the ordering they're for,
+signed so it can't be altered - a cursor from one sort order can't be
+used with another.
+"""
+import datetime
+from decimal import Decimal
+from django.core import signing
+from django.db.models import Q
+
+CURSOR_SALT = 'pagination.cursor'
+
+
+class InvalidCursor(Exception):
+    """Raised when a cursor can't be decoded, or doesn't match the ordering"""
+
+
+def _field_name(field):
+    """field name without the '-' prefix for descending order"""
+    return field.lstrip('-')
+
+
+def encode_cursor(item, ordering):
+    """
+    Create cursor from the values of the ordering fields on item.
+    Decimals are stored as strings so they aren't rounded, dates/datetimes
+    as ISO format strings (the field converts them back when filtering).
+    """
+    values = []
+    for field in ordering:
+        value = getattr(item, _field_name(field))
+        if isinstance(value, Decimal):
+            value = str(value)
+        elif isinstance(value, (datetime.date, datetime.datetime)):
+            value = value.isoformat()
+        values.append(value)
+    return signing.dumps(
+        {'ordering': list(ordering), 'values': values},
+        salt=CURSOR_SALT, compress=True
+        )
+
+
+def decode_cursor(cursor, ordering):
+    """
+    Return the list of values in the cursor, raise InvalidCursor if bad or
+    made for a different ordering
+    """
+    try:
+        payload = signing.loads(cursor, salt=CURSOR_SALT)
+    except signing.BadSignature as error:
+        raise InvalidCursor('Invalid cursor') from error
+    if (not isinstance(payload, dict)
+            or payload.get('ordering') != list(ordering)
+            or len(payload.get('values', [])) != len(ordering)):
+        raise InvalidCursor('Cursor does not match the ordering')
+    return payload['values']
+
+
+def _after_cursor(ordering, values):
+    """
+    Q object for items after the cursor in the ordering, e.g. for ordering
+    ['-price', '-id']: price < x OR (price = x AND id < y)
+    """
+    condition = Q()
+    equal = {}
+    for field, value in zip(ordering, values):
+        name = _field_name(field)
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        condition |= Q(**equal, **{f'{name}__{lookup}': value})
+        equal[name] = value
+    return condition
+
+
+def get_page(queryset, ordering, cursor=None, page_size=24):
+    """
+    Get one page of the queryset, ordered by the list of fields in ordering.
+    The last field must be unique (e.g. 'id') so the order is always the
+    same. Fetch one extra item to know whether there is a next page.
+    Returns list of items and the cursor for the next page (None if this is
+    the last page).
+    """
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        queryset = queryset.filter(
+            _after_cursor(ordering, decode_cursor(cursor, ordering))
+            )
+    items = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        next_cursor = encode_cursor(items[-1], ordering)
+    return items, next_cursor
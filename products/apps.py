@@ -1,6 +1,15 @@
+"""
+config for products app - added function to override ready
+method, to import signals module - used to listen for signals
+from Product instance to keep the search index up to date
+"""
 from django.apps import AppConfig
 
 
 class ProductsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'products'
+
+    def ready(self):
+        """ override ready method - import signals module """
+        import products.signals
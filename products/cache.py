@@ -0,0 +1,69 @@
+"""
+Cache for the shop listing - used by show_products and products_page views.
+Each page of the listing is cached under a key made from the GET parameters
+that change the listing (category, sort, direction, search term, cursor),
+whether the user is superuser (who also sees inactive products), and the
+catalog version. The version is changed whenever a product or category is
+saved or deleted (see signals.py), so old entries are no longer used and
+expire from the cache.
+The cache is shared by every web and worker process (settings.CACHES), so
+they all see the same version - a product deactivated in one process is
+gone from the listing in all of them. It is memcached where configured,
+otherwise the database: no extra service, but each hit is two queries on
+the cache table and a miss writes to it.
+A new version is a new random value set in one write, rather than an
+increment, because incr isn't atomic in the database cache - two changes
+at once could both set the same next version, and a page cached between
+them would then be used after the second change.
+"""
+import hashlib
+import json
+import uuid
+from django.core.cache import cache
+from django.db import transaction
+
+CATALOG_VERSION_KEY = 'products:catalog_version'
+LISTING_CACHE_TIMEOUT = 60 * 60
+# GET parameters that change the products shown in the listing
+LISTING_PARAMS = ('category', 'sort', 'direction', 'q', 'cursor')
+
+
+def _new_version():
+    """catalog version that can't match one already used in cache keys"""
+    return uuid.uuid4().hex
+
+
+def get_catalog_version():
+    """
+    Current catalog version. If it isn't in the cache (first use, or
+    evicted), start a new one - if another process starts one at the same
+    time, add keeps theirs and it is read back.
+    """
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, _new_version(), None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def _bump_catalog_version():
+    """change the catalog version, so cached listings aren't used"""
+    cache.set(CATALOG_VERSION_KEY, _new_version(), None)
+
+
+def invalidate_listing_cache():
+    """
+    Change the catalog version now, and again when the transaction is
+    committed - otherwise a request between the two could cache the
+    listing from before the change under the new version.
+    """
+    _bump_catalog_version()
+    transaction.on_commit(_bump_catalog_version)
+
+
+def listing_cache_key(params, is_superuser):
+    """cache key for the listing page for the GET parameters and user"""
+    facets = [params.get(name) for name in LISTING_PARAMS]
+    facets.append(bool(is_superuser))
+    digest = hashlib.sha256(json.dumps(facets).encode()).hexdigest()
+    return f'products:listing:{get_catalog_version()}:{digest}'
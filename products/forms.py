@@ -1,11 +1,15 @@
 """Forms for 'products' app - shop"""
 from django import forms
+from images.forms import ImageRenditionsFormMixin
 from .widgets import CustomClearableFileInput
 from .models import Product, Category
 
 
-class ProductForm(forms.ModelForm):
-    """Product form for admin user to add/edit product from frontend"""
+class ProductForm(ImageRenditionsFormMixin, forms.ModelForm):
+    """
+    Product form for admin user to add/edit product from frontend.
+    Resized renditions of the image created on save (ImageRenditionsFormMixin)
+    """
     class Meta:
         """
         Form based on Product model.
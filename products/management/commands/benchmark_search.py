@@ -0,0 +1,154 @@
+"""
+Management command to benchmark product search on a large catalog.
+Creates a synthetic catalog (100,000 products by default), indexes it,
+times searches like those from the shop search box, then rolls everything
+back so the database is left unchanged.
+Usage: python manage.py benchmark_search [--products N] [--repeat N]
+"""
+import random
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from pagination import get_page
+from products.models import Category, Product
+from products.search import search_products, rebuild_search_index
+from products.views import PRODUCTS_PAGE_SIZE
+
+ADJECTIVES = [
+    'boho', 'rustic', 'large', 'mini', 'textured', 'cream', 'mustard',
+    'sage', 'navy', 'rainbow', 'natural', 'coiled', 'feather', 'diamond',
+    'vintage', 'colourful', 'autumnal', 'modern', 'chunky', 'delicate',
+]
+NOUNS = [
+    'hanging', 'dreamcatcher', 'planter', 'headboard', 'tapestry', 'garland',
+    'keyring', 'coaster', 'mirror', 'shelf', 'curtain', 'cushion', 'runner',
+    'basket', 'bunting', 'feather', 'tassel', 'swing', 'lampshade', 'rug',
+]
+SYLLABLES = [
+    'ka', 'lo', 'mi', 'ne', 'ru', 'sa', 'ti', 'vo', 'ze', 'po', 'qua', 'ben',
+    'dor', 'fel', 'gri', 'hul', 'jas', 'kir', 'lun', 'mar',
+]
+SEARCH_TERMS = [
+    'boho hanging', 'rustic', 'mini planter', 'hangings', 'cream tapestry',
+    'sage', 'dreamcatcher', 'navy headboard', 'mustard cushion',
+    'rainbow garland', 'vintage mirror', 'chunky rug',
+]
+TARGET_MS = 10
+
+
+class Command(BaseCommand):
+    help = 'Benchmark product search on a synthetic catalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--products', type=int, default=100000,
+            help='number of synthetic products to create (default 100000)'
+            )
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='number of times to run each search term (default 20)'
+            )
+
+    def handle(self, *args, **options):
+        """
+        Inside a transaction: create the catalog, rebuild the search index,
+        time each search term, print results, then roll back.
+        """
+        with transaction.atomic():
+            self._create_catalog(options['products'])
+            timings = self._time_searches(options['repeat'])
+            transaction.set_rollback(True)
+        self._report(timings)
+
+    def _create_catalog(self, number_of_products):
+        """
+        bulk create the synthetic products, then index them.
+        Names are 'adjective noun number'. Descriptions are 30 words from a
+        vocabulary of 8000 made-up words, picked with a Zipf distribution
+        (a few words are very common, most are rare) as in real text.
+        """
+        random.seed(0)
+        vocabulary = [
+            first + second + third
+            for first in SYLLABLES for second in SYLLABLES
+            for third in SYLLABLES
+            ] + ADJECTIVES + NOUNS
+        random.shuffle(vocabulary)
+        weights = [1 / rank for rank in range(1, len(vocabulary) + 1)]
+        category = Category.objects.create(
+            name='benchmark', friendly_name='Benchmark'
+            )
+        products = []
+        for number in range(number_of_products):
+            name = (
+                f'{random.choice(ADJECTIVES)} {random.choice(NOUNS)} '
+                f'{number}'
+                )
+            description = ' '.join(
+                random.choices(vocabulary, weights=weights, k=30)
+                )
+            products.append(Product(
+                category=category,
+                sku=f'BEN-{number:06}',
+                name=name,
+                description=description,
+                price=random.randint(5, 200),
+            ))
+        start = time.perf_counter()
+        Product.objects.bulk_create(products, batch_size=5000)
+        rebuild_search_index()
+        self.stdout.write(
+            f'Created and indexed {number_of_products} products in '
+            f'{time.perf_counter() - start:.1f}s'
+            )
+
+    def _time_searches(self, repeat):
+        """
+        Run each search term as the shop does (active products with their
+        category, most relevant first), fetching the first page of results
+        with get_page.
+        Return dict of search term: (number of matches, list of times in ms)
+        """
+        timings = {}
+        for search_term in SEARCH_TERMS:
+            matches = search_products(
+                Product.objects.filter(is_active=True), search_term
+                ).count()
+            timings[search_term] = (matches, [])
+            for _ in range(repeat):
+                products = Product.objects.filter(
+                    is_active=True
+                    ).select_related('category')
+                start = time.perf_counter()
+                get_page(
+                    search_products(products, search_term),
+                    ['rank', 'id'],
+                    page_size=PRODUCTS_PAGE_SIZE,
+                    )
+                timings[search_term][1].append(
+                    (time.perf_counter() - start) * 1000
+                    )
+        return timings
+
+    def _report(self, timings):
+        """print median and 95th percentile time for each search term"""
+        all_times = []
+        for search_term, (matches, times) in timings.items():
+            all_times.extend(times)
+            self.stdout.write(
+                f'{search_term:<20} {matches:>6} matches  '
+                f'median {statistics.median(times):6.2f}ms  '
+                f'max {max(times):6.2f}ms'
+                )
+        median = statistics.median(all_times)
+        p95 = statistics.quantiles(all_times, n=20)[-1]
+        message = f'Overall: median {median:.2f}ms, p95 {p95:.2f}ms'
+        if p95 < TARGET_MS:
+            self.stdout.write(self.style.SUCCESS(
+                f'{message} - under {TARGET_MS}ms target'
+                ))
+        else:
+            self.stdout.write(self.style.WARNING(
+                f'{message} - over {TARGET_MS}ms target'
+                ))
@@ -0,0 +1,59 @@
+# Generated by Django 3.2 on 2026-10-18 07:31
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    """
+    Create the full text search index for products and index existing
+    products. Postgres: GIN index on search_vector. SQLite: FTS5 table.
+    """
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            "UPDATE products_product SET search_vector = "
+            "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(description, '')), "
+            "'B')"
+        )
+        schema_editor.execute(
+            'CREATE INDEX products_product_search_vector_gin '
+            'ON products_product USING gin (search_vector)'
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE products_product_fts USING fts5('
+            "name, description, tokenize='porter unicode61')"
+        )
+        schema_editor.execute(
+            'INSERT INTO products_product_fts (rowid, name, description) '
+            'SELECT id, name, description FROM products_product'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    """Reverse of create_search_index"""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'DROP INDEX IF EXISTS products_product_search_vector_gin'
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS products_product_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_alter_product_category'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.2 on 2026-10-18 07:49
+
+from django.db import migrations, models
+import django.db.models.expressions
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_product_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(is_active=True), fields=['category', 'price', 'id'], name='product_active_cat_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(is_active=True), fields=['price', 'id'], name='product_active_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(django.db.models.functions.text.Lower('name'), django.db.models.expressions.F('id'), condition=models.Q(is_active=True), name='product_active_lower_name_idx'),
+        ),
+    ]
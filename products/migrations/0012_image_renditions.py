@@ -0,0 +1,31 @@
+# Generated by Django 3.2 on 2026-10-18 07:54
+
+import django.db.models.expressions
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0011_product_indexes'),
+    ]
+
+    # Adding a field makes SQLite rebuild the table, which fails in Django
+    # 3.2 with an expression index on it - so drop the lower name index
+    # first and add it back after
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_active_lower_name_idx',
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='image_renditions',
+            field=models.JSONField(default=dict, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(django.db.models.functions.text.Lower('name'), django.db.models.expressions.F('id'), condition=models.Q(is_active=True), name='product_active_lower_name_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+from django.core.management import call_command
+from django.db import migrations
+
+
+def create_cache_table(apps, schema_editor):
+    """table for the database cache backend in settings.CACHES"""
+    call_command(
+        'createcachetable', database=schema_editor.connection.alias,
+        verbosity=0
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0012_image_renditions'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_cache_table, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.2 on 2026-10-18 09:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+import products.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0013_cache_table'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchIndex',
+            fields=[
+                ('product', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to='products.product')),
+                ('name', models.TextField()),
+                ('description', models.TextField()),
+                ('document', products.models.SearchDocumentField(db_column='products_product_fts')),
+                ('rank', products.models.SearchRankField()),
+            ],
+            options={
+                'db_table': 'products_product_fts',
+                'managed': False,
+            },
+        ),
+    ]
@@ -1,5 +1,7 @@
 """models for products app"""
 from django.db import models
+from django.contrib.postgres.search import SearchVectorField
+from django.db.models.functions import Lower
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
@@ -25,6 +27,32 @@ class Category(models.Model):
 
 class Product(models.Model):
     """Product model - for products in shop"""
+    class Meta:
+        """
+        Indexes for the shop listing (see products views) - partial indexes
+        on active products, which is all the shop shows unless superuser:
+        by category sorted by price, sorted by price, and sorted by
+        lowercase name. Filtering by category alone uses the category
+        foreign key index.
+        """
+        indexes = [
+            models.Index(
+                fields=['category', 'price', 'id'],
+                name='product_active_cat_price_idx',
+                condition=models.Q(is_active=True),
+            ),
+            models.Index(
+                fields=['price', 'id'],
+                name='product_active_price_idx',
+                condition=models.Q(is_active=True),
+            ),
+            models.Index(
+                Lower('name'), 'id',
+                name='product_active_lower_name_idx',
+                condition=models.Q(is_active=True),
+            ),
+        ]
+
     category = models.ForeignKey(
         'Category',
         on_delete=models.CASCADE,
@@ -35,8 +63,12 @@ class Product(models.Model):
     description = models.TextField()
     price = models.DecimalField(max_digits=6, decimal_places=2)
     image = models.ImageField(null=True, blank=True)
+    # resized copies of image for srcset, see images/renditions.py
+    image_renditions = models.JSONField(default=dict, editable=False)
     is_active = models.BooleanField(default=True)
     is_new = models.BooleanField(default=True)
+    # full text search index - only populated on Postgres, see search.py
+    search_vector = SearchVectorField(null=True, editable=False)
 
     def generate_sku(self):
         """generate sku, called by post save method add_sku_when_created"""
@@ -48,6 +80,64 @@ class Product(models.Model):
         return f'{self.name} in {self.category}'
 
 
+class SearchDocumentField(models.TextField):
+    """
+    The hidden column of an SQLite FTS5 table, which has the table's name -
+    for the 'match' lookup with a full text query (see search.py)
+    """
+
+
+class SearchRankField(models.FloatField):
+    """
+    The hidden rank column of an SQLite FTS5 table - lower is a better
+    match. Its 'match' lookup sets the ranking function (see search.py).
+    """
+
+
+class Match(models.Lookup):
+    """FTS5 MATCH - column MATCH 'query' (or 'ranking function' for rank)"""
+    lookup_name = 'match'
+    prepare_rhs = False
+
+    def as_sql(self, compiler, connection):
+        """lhs MATCH rhs"""
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+SearchDocumentField.register_lookup(Match)
+SearchRankField.register_lookup(Match)
+
+
+class ProductSearchIndex(models.Model):
+    """
+    The SQLite FTS5 full text search table, created in migration 0010 and
+    not managed by Django - rowid is the product id. Lets a search join the
+    products to the index (see search.py).
+    """
+    class Meta:
+        """FTS5 table, created and kept up to date by search.py"""
+        managed = False
+        db_table = 'products_product_fts'
+
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_column='rowid',
+        related_name='search_index',
+        )
+    name = models.TextField()
+    description = models.TextField()
+    document = SearchDocumentField(db_column='products_product_fts')
+    rank = SearchRankField()
+
+    def __str__(self):
+        """string method - return the product name"""
+        return self.name
+
+
 @receiver(post_save, sender=Product)
 def add_sku_when_created(sender, instance, created, **kwargs):
     """
@@ -0,0 +1,140 @@
+"""
+Full text search for products in the shop - used by show_products view.
+Product name and description are indexed, with the name weighted higher.
+Postgres: search_vector column on Product (tsvector), with GIN index.
+SQLite: FTS5 virtual table products_product_fts, rowid is the product id,
+joined to the products through the ProductSearchIndex model.
+Both use English stemming, so e.g. 'hanging' also matches 'hangings'.
+Index created in migration 0010, and kept up to date by signals.py
+"""
+import re
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVector
+    )
+from django.db import connections
+from django.db.models import F, Q, Value, IntegerField
+from django.db.models.functions import Cast
+from .models import Product
+
+SEARCH_CONFIG = 'english'
+FTS_TABLE = 'products_product_fts'
+# relevance weights for name and description columns in FTS5 bm25 ranking
+FTS_WEIGHTS = (10.0, 1.0)
+# Postgres rank is a whole number (float rank times this), so the rank
+# stored in a pagination cursor compares equal to the rank in the database.
+# The SQLite rank is a 64 bit float, which comes back equal from the cursor.
+RANK_SCALE = 1000000
+
+
+def _whole_number_rank(rank):
+    """
+    Float rank expression as an integer. Float ranks (Postgres float4
+    ts_rank) don't come back equal after going through the JSON cursor, so
+    keyset pagination on them skips or repeats results.
+    """
+    return Cast(rank * RANK_SCALE, IntegerField())
+
+
+def _no_rank():
+    """rank for results that aren't ranked"""
+    return Value(0, output_field=IntegerField())
+
+
+def _search_vector():
+    """tsvector expression for the product name and description (Postgres)"""
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('description', weight='B', config=SEARCH_CONFIG)
+        )
+
+
+def _fts_match_expression(search_term):
+    """
+    Turn the search term into an FTS5 match expression. Each word is quoted
+    so that characters in the search term aren't read as FTS5 syntax, words
+    are combined with AND. Returns empty string if there are no words.
+    """
+    words = re.findall(r'\w+', search_term)
+    return ' '.join(f'"{word}"' for word in words)
+
+
+def update_search_index(product):
+    """Add the product to the search index, or update it if already there"""
+    connection = connections[product._state.db or 'default']
+    if connection.vendor == 'postgresql':
+        Product.objects.filter(pk=product.pk).update(
+            search_vector=_search_vector()
+            )
+    elif connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [product.pk]
+                )
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, description) '
+                'VALUES (%s, %s, %s)',
+                [product.pk, product.name, product.description]
+                )
+
+
+def remove_from_search_index(product):
+    """Remove deleted product from the search index (SQLite only)"""
+    connection = connections[product._state.db or 'default']
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [product.pk]
+                )
+
+
+def rebuild_search_index(using='default'):
+    """
+    Re-index every product - e.g. after products are loaded with
+    bulk_create, which doesn't send the signals that keep the index updated
+    """
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        Product.objects.using(using).update(search_vector=_search_vector())
+    elif connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, description) '
+                f'SELECT id, name, description FROM '
+                f'{Product._meta.db_table}'
+                )
+
+
+def search_products(products, search_term):
+    """
+    Filter the products queryset to products matching the search term.
+    Results are annotated with 'rank' - lower is a better match - so the
+    view can order (and paginate) by relevance.
+    For other databases, fall back to icontains search with no ranking.
+    """
+    vendor = connections[products.db].vendor
+    if vendor == 'postgresql':
+        query = SearchQuery(
+            search_term, config=SEARCH_CONFIG, search_type='websearch'
+            )
+        # SearchRank is higher for better matches, so negate it
+        return products.filter(search_vector=query).annotate(
+            rank=_whole_number_rank(-SearchRank(F('search_vector'), query))
+            )
+    if vendor == 'sqlite':
+        match = _fts_match_expression(search_term)
+        if not match:
+            return products.none().annotate(rank=_no_rank())
+        name_weight, description_weight = FTS_WEIGHTS
+        return products.filter(
+            search_index__document__match=match,
+            search_index__rank__match=(
+                f'bm25({name_weight}, {description_weight})'
+                ),
+            ).annotate(rank=F('search_index__rank'))
+    matches_search = Q(
+        name__icontains=search_term
+        ) | Q(
+            description__icontains=search_term
+            )
+    return products.filter(matches_search).annotate(rank=_no_rank())
@@ -0,0 +1,42 @@
+"""
+To listen for signals from Product - when an instance is saved or deleted,
+update the full text search index (see search.py) so that search results
+match the product's current name and description.
+Also for Product and Category, invalidate the cached shop listing (see
+cache.py) so the shop shows the change.
+"""
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Product, Category
+from .cache import invalidate_listing_cache
+from .search import update_search_index, remove_from_search_index
+
+
+@receiver(post_save, sender=Product)
+def update_search_index_on_save(sender, instance, **kwargs):
+    """
+    Handles signals from the post_save event
+    When product created/updated, add/update it in the search index
+    """
+    update_search_index(instance)
+
+
+@receiver(post_delete, sender=Product)
+def update_search_index_on_delete(sender, instance, **kwargs):
+    """
+    Handles signals from the post_delete event
+    When product deleted, remove it from the search index
+    """
+    remove_from_search_index(instance)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_listing_cache_on_change(sender, **kwargs):
+    """
+    Handles signals from the post_save and post_delete events
+    When a product or category changes, cached shop pages are out of date
+    """
+    invalidate_listing_cache()
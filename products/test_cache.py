@@ -0,0 +1,163 @@
+"""Tests for the shop listing cache in cache.py"""
+from unittest import mock
+from django.contrib.auth.models import User
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.db import DatabaseCache
+from django.test import TestCase
+from .cache import get_catalog_version, listing_cache_key
+from .models import Category, Product
+
+
+class TestListingCache(TestCase):
+    """Tests for caching of show_products and products_page views"""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create two categories, each with an active and inactive product"""
+        for name in ('category1', 'category2'):
+            category = Category.objects.create(
+                name=name, friendly_name=name.title()
+                )
+            for is_active in (True, False):
+                Product.objects.create(
+                    category=category,
+                    name=f'{name} product {is_active}',
+                    description='product description',
+                    price=10,
+                    is_active=is_active,
+                )
+        User.objects.create_superuser(
+            username='Admin', password='secret12', email='admin@admin.com'
+            )
+
+    def setUp(self):
+        """start each test with an empty cache"""
+        cache.clear()
+
+    def product_names(self, url='/products/'):
+        """names of the products shown on the shop page"""
+        response = self.client.get(url)
+        return [product.name for product in response.context['products']]
+
+    def test_repeat_request_served_from_cache(self):
+        """
+        Second request for the same page only reads the cache - the
+        version and the page, from the cache table
+        """
+        first = self.product_names()
+        cache_table = settings.CACHES['default']['LOCATION']
+        with self.assertNumQueries(2) as queries:
+            self.assertEqual(self.product_names(), first)
+        self.client.get('/products/page/')
+        with self.assertNumQueries(2) as page_queries:
+            response = self.client.get('/products/page/')
+        self.assertEqual(len(response.json()['products']), 2)
+        for query in queries.captured_queries + page_queries.captured_queries:
+            self.assertIn(cache_table, query['sql'])
+
+    def test_facets_cached_separately(self):
+        """Each category, sort and search has its own cache entry"""
+        self.product_names()
+        self.assertEqual(
+            self.product_names('/products/?category=category2'),
+            ['category2 product True']
+            )
+        self.assertEqual(
+            self.product_names('/products/?sort=name&direction=desc'),
+            ['category2 product True', 'category1 product True']
+            )
+
+    def test_superuser_listing_cached_separately(self):
+        """Inactive products shown to superuser are not shown to others"""
+        self.client.login(username='Admin', password='secret12')
+        self.assertEqual(len(self.product_names()), 4)
+        self.client.logout()
+        self.assertEqual(len(self.product_names()), 2)
+
+    def test_cache_key_facets(self):
+        """Key changes with each facet, the superuser flag and version"""
+        params = {'category': 'category1', 'sort': 'price'}
+        key = listing_cache_key(params, False)
+        self.assertEqual(key, listing_cache_key(params, False))
+        self.assertNotEqual(key, listing_cache_key(params, True))
+        self.assertNotEqual(
+            key, listing_cache_key({**params, 'direction': 'desc'}, False)
+            )
+        self.assertNotEqual(
+            key, listing_cache_key({**params, 'q': 'product'}, False)
+            )
+        Product.objects.get(id=1).save()
+        self.assertNotEqual(key, listing_cache_key(params, False))
+
+    def test_product_changes_invalidate_cache(self):
+        """Saving or deleting a product shows up straight away"""
+        self.product_names()
+        product = Product.objects.get(name='category1 product True')
+        product.name = 'renamed product'
+        product.save()
+        self.assertIn('renamed product', self.product_names())
+        product.delete()
+        self.assertNotIn('renamed product', self.product_names())
+        inactive = Product.objects.get(name='category1 product False')
+        inactive.is_active = True
+        inactive.save()
+        self.assertIn('category1 product False', self.product_names())
+
+    def test_category_changes_invalidate_cache(self):
+        """Saving or deleting a category changes the catalog version"""
+        version = get_catalog_version()
+        category = Category.objects.get(name='category2')
+        category.friendly_name = 'Renamed'
+        category.save()
+        self.assertNotEqual(get_catalog_version(), version)
+        version = get_catalog_version()
+        category.delete()
+        self.assertNotEqual(get_catalog_version(), version)
+        self.assertEqual(
+            self.product_names(), ['category1 product True']
+            )
+
+    def test_version_restarts_if_evicted(self):
+        """If the version is evicted from the cache, a new one is used"""
+        version = get_catalog_version()
+        cache.clear()
+        self.assertNotEqual(get_catalog_version(), version)
+
+    def test_version_shared_between_processes(self):
+        """
+        Product saved in one process changes the version seen by another -
+        a second cache backend instance here, with the same settings
+        """
+        other_process_cache = DatabaseCache(
+            settings.CACHES['default']['LOCATION'], {}
+            )
+        version = get_catalog_version()
+        product = Product.objects.get(name='category1 product True')
+        product.is_active = False
+        product.save()
+        other_version = other_process_cache.get('products:catalog_version')
+        self.assertNotEqual(other_version, version)
+        self.assertEqual(other_version, get_catalog_version())
+
+    def test_changes_at_the_same_time_give_new_versions(self):
+        """
+        Two processes changing the catalog from the same version each set
+        a version not seen before, rather than both setting version + 1 -
+        the other process here still reads the version from before the
+        first change
+        """
+        other_process_cache = DatabaseCache(
+            settings.CACHES['default']['LOCATION'], {}
+            )
+        version = get_catalog_version()
+        Product.objects.get(name='category1 product True').save()
+        first_change = get_catalog_version()
+        with mock.patch('products.cache.cache', other_process_cache), \
+                mock.patch.object(other_process_cache, 'get',
+                                  return_value=version):
+            Product.objects.get(name='category2 product True').save()
+        second_change = get_catalog_version()
+        self.assertEqual(
+            len({version, first_change, second_change}), 3
+            )
@@ -0,0 +1,62 @@
+"""
+Tests that the shop listing queries use the indexes on Product, by
+checking the SQLite query plan (EXPLAIN QUERY PLAN) of the queries the
+show_products view makes
+"""
+from unittest import skipUnless
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from knot_art.test_utils import query_plan
+from .models import Category, Product
+
+
+@skipUnless(connection.vendor == 'sqlite', 'query plans are for SQLite')
+class TestShopIndexes(TestCase):
+    """Query plans for the show_products view"""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create category with 30 products, every third one inactive"""
+        category = Category.objects.create(
+            name='category_name', friendly_name='Category'
+            )
+        for number in range(30):
+            Product.objects.create(
+                category=category,
+                name=f'Product {number}',
+                description='product description',
+                price=number + 1,
+                is_active=number % 3 != 0,
+            )
+
+    def listing_plan(self, query_string):
+        """plan of the query that fetches the page of products"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/products/{query_string}')
+        self.assertEqual(response.status_code, 200)
+        sql = next(
+            query['sql'] for query in queries
+            if query['sql'].startswith('SELECT')
+            and 'LIMIT' in query['sql']
+            and 'FROM "products_product"' in query['sql']
+            )
+        return query_plan(sql)
+
+    def test_sort_by_price_uses_partial_price_index(self):
+        """Sorting active products by price reads the index, no sort"""
+        for direction in ('asc', 'desc'):
+            plan = self.listing_plan(f'?sort=price&direction={direction}')
+            self.assertIn('product_active_price_idx', plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_sort_by_name_uses_lower_name_index(self):
+        """Sorting by Lower('name') uses the functional index, no sort"""
+        plan = self.listing_plan('?sort=name&direction=asc')
+        self.assertIn('product_active_lower_name_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_category_filter_uses_index(self):
+        """Filtering by category searches an index, not the whole table"""
+        plan = self.listing_plan('?category=category_name')
+        self.assertIn('SEARCH products_product USING INDEX', plan)
@@ -0,0 +1,101 @@
+"""Tests for full text search of products in 'products' app"""
+from django.test import TestCase
+from .models import Category, Product
+from .search import search_products, rebuild_search_index
+
+
+class TestSearchProducts(TestCase):
+    """To test search_products and that the search index is kept updated"""
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Create instance of Category and 3 instances of Product for tests.
+        'hanging' is in the name of one product, and the description of
+        another.
+        """
+        category = Category.objects.create(
+            name='category_name',
+            friendly_name='Category'
+        )
+        Product.objects.create(
+            category=category,
+            name='Large Wall Hanging',
+            description='product description',
+            price=10,
+        )
+        Product.objects.create(
+            category=category,
+            name='Dream Catcher',
+            description='Pretty enough for hanging on any wall',
+            price=10,
+        )
+        Product.objects.create(
+            category=category,
+            name='Plant Holder',
+            description='product description',
+            price=10,
+        )
+
+    def search(self, search_term):
+        """return names of products matching search term, best match first"""
+        results = search_products(Product.objects.all(), search_term)
+        return [product.name for product in results.order_by('rank')]
+
+    def test_search_uses_stemming(self):
+        """Searching for 'hangings' finds products with 'hanging'"""
+        self.assertEqual(len(self.search('hangings')), 2)
+
+    def test_match_in_name_ranked_above_match_in_description(self):
+        """Product with search term in name should be the first result"""
+        self.assertEqual(
+            self.search('hanging'), ['Large Wall Hanging', 'Dream Catcher']
+            )
+
+    def test_all_words_in_search_term_must_match(self):
+        """Only products containing every word are returned"""
+        self.assertEqual(self.search('pretty wall'), ['Dream Catcher'])
+
+    def test_filters_applied_before_ranking(self):
+        """
+        Weaker match is found when the products are filtered, e.g. by
+        category or active products only
+        """
+        Product.objects.filter(name='Large Wall Hanging').update(
+            is_active=False
+            )
+        results = search_products(
+            Product.objects.filter(is_active=True), 'hanging'
+            )
+        self.assertEqual(
+            [product.name for product in results], ['Dream Catcher']
+            )
+
+    def test_search_syntax_characters_are_ignored(self):
+        """Quotes and operators in search term don't cause an error"""
+        self.assertEqual(self.search('"plant" -*:'), ['Plant Holder'])
+        self.assertEqual(self.search('!!!'), [])
+
+    def test_index_updated_when_product_edited(self):
+        """After editing a product, search matches the new name only"""
+        product = Product.objects.get(name='Plant Holder')
+        product.name = 'Macrame Basket'
+        product.save()
+        self.assertEqual(self.search('plant'), [])
+        self.assertEqual(self.search('basket'), ['Macrame Basket'])
+
+    def test_index_updated_when_product_deleted(self):
+        """Deleted product is removed from the search index"""
+        Product.objects.get(name='Dream Catcher').delete()
+        self.assertEqual(self.search('wall'), ['Large Wall Hanging'])
+
+    def test_rebuild_search_index_indexes_bulk_created_products(self):
+        """Products added by bulk_create are searchable after a rebuild"""
+        Product.objects.bulk_create([Product(
+            category=Category.objects.get(name='category_name'),
+            name='Mirror',
+            description='product description',
+            price=10,
+        )])
+        self.assertEqual(self.search('mirror'), [])
+        rebuild_search_index()
+        self.assertEqual(self.search('mirror'), ['Mirror'])
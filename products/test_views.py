@@ -1,9 +1,13 @@
 """Tests for views in 'product' app (shop)"""
 from decimal import Decimal
+from django.conf import settings
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
 from django.contrib.messages import get_messages
 from .models import Category, Product
+from .search import search_products
 
 
 class TestShowProductsView(TestCase):
@@ -250,6 +254,142 @@ class TestShowProductsView(TestCase):
             )
 
 
+class TestShopPagination(TestCase):
+    """To test keyset pagination of the shop page and products_page view"""
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Create instance of Category and 50 instances of Product, with
+        repeated prices so that pages split between products with the same
+        price. Every product has 'hanging' in the description.
+        """
+        category = Category.objects.create(
+            name='category_name',
+            friendly_name='Category'
+        )
+        for product in range(50):
+            Product.objects.create(
+                category=category,
+                name=f'Product {product:02}',
+                description='wall hanging',
+                price=10 + product % 7,
+                is_active=True,
+            )
+
+    def get_all_pages(self, params):
+        """
+        Get first page from shop page, then remaining pages from the
+        products_page view, return list of ids of all products in order
+        """
+        response = self.client.get('/products/', params)
+        ids = [product.id for product in response.context['products']]
+        next_page_url = response.context['next_page_url']
+        while next_page_url:
+            response = self.client.get(f'/products/page/{next_page_url}')
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            self.assertEqual(
+                data['html'].count('card-group'), len(data['products'])
+                )
+            ids.extend(product['id'] for product in data['products'])
+            next_page_url = None
+            if data['next_cursor']:
+                next_page_url = f'?cursor={data["next_cursor"]}&' + '&'.join(
+                    f'{key}={value}' for key, value in params.items()
+                    )
+        return ids
+
+    def test_first_page_has_page_size_products_and_total_count(self):
+        """First page shows 24 products, and count of all 50 products"""
+        response = self.client.get('/products/')
+        self.assertEqual(len(response.context['products']), 24)
+        self.assertEqual(response.context['total_products'], 50)
+        self.assertContains(response, '50 products')
+        self.assertContains(response, 'Show')
+
+    def test_pages_match_unpaginated_order_for_each_sort(self):
+        """
+        For each sort option and direction, getting every page gives all
+        products once, in the same order as sorting the whole list.
+        """
+        products = list(Product.objects.all())
+        expected_orders = {
+            ('price', 'asc'): sorted(
+                products, key=lambda p: (p.price, p.id)),
+            ('price', 'desc'): sorted(
+                products, key=lambda p: (p.price, p.id), reverse=True),
+            ('name', 'asc'): sorted(
+                products, key=lambda p: (p.name.lower(), p.id)),
+            ('name', 'desc'): sorted(
+                products, key=lambda p: (p.name.lower(), p.id), reverse=True),
+        }
+        for (sort, direction), expected in expected_orders.items():
+            ids = self.get_all_pages({'sort': sort, 'direction': direction})
+            self.assertEqual(ids, [product.id for product in expected])
+
+    def test_pages_with_search_and_category_filter(self):
+        """Paging through search results in a category gives all products"""
+        ids = self.get_all_pages({
+            'q': 'hanging', 'category': 'category_name'
+            })
+        self.assertEqual(sorted(ids), sorted(
+            Product.objects.values_list('id', flat=True)
+            ))
+
+    def test_invalid_cursor_returns_404(self):
+        """A cursor that has been altered is not accepted"""
+        response = self.client.get('/products/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get('/products/page/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 404)
+
+    def test_cursor_for_other_sort_returns_404(self):
+        """Cursor from sorting by name isn't accepted when sorting by price"""
+        cursor = self.client.get(
+            '/products/page/', {'sort': 'name'}
+            ).json()['next_cursor']
+        for url in ('/products/', '/products/page/'):
+            response = self.client.get(
+                url, {'sort': 'price', 'cursor': cursor}
+                )
+            self.assertEqual(response.status_code, 404)
+
+    def test_search_pages_by_rank_give_each_product_once(self):
+        """
+        Paging through search results ordered by relevance, with different
+        ranks, gives every match once, best match first
+        """
+        for product in Product.objects.all()[:30]:
+            product.description = 'hanging ' * (product.id % 5 + 1)
+            product.save()
+        ids = self.get_all_pages({'q': 'hanging'})
+        self.assertEqual(ids, list(
+            search_products(Product.objects.all(), 'hanging')
+            .order_by('rank', 'id').values_list('id', flat=True)
+            ))
+        self.assertEqual(len(ids), 50)
+
+    def test_empty_search_term_returns_400_from_products_page(self):
+        """products_page returns 400 if search term is empty"""
+        response = self.client.get('/products/page/?q=')
+        self.assertEqual(response.status_code, 400)
+
+    def test_deep_page_query_does_not_use_offset(self):
+        """Later pages are fetched with a WHERE clause, not OFFSET"""
+        response = self.client.get('/products/', {'sort': 'price'})
+        next_page_url = response.context['next_page_url']
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(f'/products/page/{next_page_url}')
+        # the rest are reading and writing the cache table, in a savepoint
+        product_queries = [
+            query['sql'] for query in queries.captured_queries
+            if settings.CACHES['default']['LOCATION'] not in query['sql']
+            and not query['sql'].startswith(('SAVEPOINT', 'RELEASE'))
+            ]
+        self.assertEqual(len(product_queries), 1)
+        self.assertNotIn('OFFSET', product_queries[0])
+
+
 class TestProductDetailsView(TestCase):
     """Test product details view - page showing individual product in shop"""
     @classmethod
@@ -5,6 +5,7 @@ from . import views
 
 urlpatterns = [
     path('', views.show_products, name='products'),
+    path('page/', views.products_page, name='products_page'),
     path('<int:product_id>', views.product_details, name='product_details'),
     path('add/', views.add_product, name='add_product'),
     path('edit/<int:product_id>/', views.edit_product, name='edit_product'),
@@ -1,50 +1,67 @@
 """Views for products app - shop pages, product admin"""
 from django.shortcuts import render, get_object_or_404, redirect, reverse
-from django.http import Http404
-from django.db.models import Q
+from django.core.cache import cache
+from django.http import Http404, JsonResponse
+from django.template.loader import render_to_string
 from django.db.models.functions import Lower
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_POST
 from django.core.exceptions import PermissionDenied
+from cache_headers import public_for_anonymous
+from pagination import get_page, InvalidCursor
 from .models import Product, Category
+from .cache import listing_cache_key, LISTING_CACHE_TIMEOUT
 from .forms import ProductForm
+from .search import search_products
 
 
-def show_products(request):
+# sort options for shop page - sort value in GET request: field to order by
+SORT_FIELDS = {
+    'price': 'price',
+    'name': 'lower_name',
+}
+PRODUCTS_PAGE_SIZE = 24
+
+
+def _get_shop_products(request):
     """
-    View to display the products in shop
+    Get the products for the shop from the GET request parameters.
     Only active products are shown, unless user is superuser.
-    Products are then filtered if there is a get request with 'q'
+    Products are then filtered if there is a get request with 'q', using
+    the full text search index, and ordered by relevance if not sorted
     Or filtered by category if get request with category
     And sorted if there is a get request with sort in it
+    Returns dict with the products queryset, list of fields to order by
+    (always ending with id, for keyset pagination), and values for context.
     """
     if request.user.is_superuser:
         products = Product.objects.all()
     else:
         products = Product.objects.filter(is_active=True)
+    products = products.select_related('category')
 
     search_term = None
     category = None
     sort = None
     sort_direction = None
+    ordering = ['id']
 
     # GET requests for search, categories and sorting
     if request.GET:
         # handles sorting
-        if 'sort' in request.GET:
-            sortkey = request.GET['sort']
-            sort = sortkey
+        if request.GET.get('sort') in SORT_FIELDS:
+            sort = request.GET['sort']
+            sortkey = SORT_FIELDS[sort]
             # if sorting by product name, add lowercase name to model to sort
-            if sortkey == 'name':
-                sortkey = 'lower_name'
+            if sortkey == 'lower_name':
                 products = products.annotate(lower_name=Lower('name'))
+            ordering = [sortkey, 'id']
             # if direction is descending then reverse the sorting
             if 'direction' in request.GET:
                 sort_direction = request.GET['direction']
                 if sort_direction == 'desc':
-                    sortkey = f'-{sortkey}'
-            products = products.order_by(sortkey)
+                    ordering = [f'-{field}' for field in ordering]
 
         # handles filtering by category
         if 'category' in request.GET:
@@ -53,31 +70,132 @@ def show_products(request):
             products = products.filter(category=category)
 
         # handles searches
-        if 'q' in request.GET:
+        if request.GET.get('q'):
             search_term = request.GET['q']
-            if not search_term:
-                messages.error(
-                    request,
-                    "You didn't enter anything in the search box! Try again."
-                    )
-                return redirect(reverse('products'))
-            matches_search = Q(
-                name__icontains=search_term
-                ) | Q(
-                    description__icontains=search_term
-                    )
-            products = products.filter(matches_search)
-    # used in context for select box to show the selected option
-    current_sorting = f'{sort}_{sort_direction}'
-    context = {
+            products = search_products(products, search_term)
+            # most relevant results first, unless user chose a sort option
+            if not sort:
+                ordering = ['rank', 'id']
+
+    return {
         'products': products,
+        'ordering': ordering,
         'search_term': search_term,
         'current_category': category,
-        'current_sorting': current_sorting,
+        # used in context for select box to show the selected option
+        'current_sorting': f'{sort}_{sort_direction}',
+    }
+
+
+def _get_products_page(request, shop):
+    """
+    Get the page of products after the 'cursor' in the GET request (first
+    page if no cursor). Raise 404 if cursor is not valid.
+    Returns list of products and the cursor for the next page
+    """
+    try:
+        return get_page(
+            shop['products'],
+            shop['ordering'],
+            cursor=request.GET.get('cursor'),
+            page_size=PRODUCTS_PAGE_SIZE,
+            )
+    except InvalidCursor as error:
+        raise Http404 from error
+
+
+def _get_listing(request, with_total=False):
+    """
+    Get the page of products for the request, with the values for the
+    context, from the cache if it's there (see cache.py), otherwise from
+    the database and then add it to the cache.
+    Total number of products is only counted if with_total is True (as
+    products_page view doesn't need it), and is then cached with the page.
+    """
+    key = listing_cache_key(request.GET, request.user.is_superuser)
+    listing = cache.get(key)
+    shop = None
+    if listing is None:
+        shop = _get_shop_products(request)
+        products, next_cursor = _get_products_page(request, shop)
+        listing = {
+            'products': products,
+            'next_cursor': next_cursor,
+            'search_term': shop['search_term'],
+            'current_category': shop['current_category'],
+            'current_sorting': shop['current_sorting'],
+        }
+        cache.set(key, listing, LISTING_CACHE_TIMEOUT)
+    if with_total and 'total_products' not in listing:
+        shop = shop or _get_shop_products(request)
+        listing['total_products'] = shop['products'].count()
+        cache.set(key, listing, LISTING_CACHE_TIMEOUT)
+    return listing
+
+
+@public_for_anonymous()
+def show_products(request):
+    """
+    View to display the products in shop, one page at a time.
+    See _get_shop_products for filtering and sorting of the products, the
+    page is cached by _get_listing.
+    If search box posted without any search terms, show error message.
+    next_page_url is the current url with the cursor for the next page, for
+    the load more link (used by script.js to load the next page with
+    products_page view instead, for infinite scroll).
+    """
+    if 'q' in request.GET and not request.GET['q']:
+        messages.error(
+            request,
+            "You didn't enter anything in the search box! Try again."
+            )
+        return redirect(reverse('products'))
+
+    listing = _get_listing(request, with_total=True)
+    next_page_url = None
+    if listing['next_cursor']:
+        params = request.GET.copy()
+        params['cursor'] = listing['next_cursor']
+        next_page_url = f'?{params.urlencode()}'
+
+    context = {
+        'products': listing['products'],
+        'total_products': listing['total_products'],
+        'next_page_url': next_page_url,
+        'search_term': listing['search_term'],
+        'current_category': listing['current_category'],
+        'current_sorting': listing['current_sorting'],
     }
     return render(request, 'products/products.html', context)
 
 
+def products_page(request):
+    """
+    For infinite scroll on the shop page - return a page of products as JSON,
+    with the product cards as a html fragment, basic details of each product,
+    and the cursor for the next page (null if there are no more products).
+    Takes the same GET parameters as show_products.
+    """
+    if 'q' in request.GET and not request.GET['q']:
+        return JsonResponse({'error': 'Empty search term'}, status=400)
+    listing = _get_listing(request)
+    products = listing['products']
+    html = render_to_string(
+        'products/includes/product_cards.html',
+        {'products': products, 'lazy_images': True},
+        request=request,
+        )
+    return JsonResponse({
+        'html': html,
+        'products': [
+            {'id': product.id, 'name': product.name, 'price': product.price}
+            for product in products
+            ],
+        'next_cursor': listing['next_cursor'],
+    })
+
+
+@public_for_anonymous()
 def product_details(request, product_id):
     """
     View to show individual product details from shop page
@@ -143,6 +261,7 @@ def edit_product(request, product_id):
             if product.sku[:3] != product.category.name[:3].upper():
                 product.sku = product.generate_sku()
             product.save()
+            form.save_renditions()
             messages.success(
                 request, f'Updates made to product: { product.name }!'
                 )
@@ -0,0 +1,22 @@
+/**
+ * To load older orders into the Order History table on the profile page. The first page of orders
+ * is in the page, if there are more then the 'show older orders' link is shown below the table.
+ */
+
+/**
+ * When the link scrolls into view in the order history box (or is clicked), get the next page of
+ * orders from the order_history view (data-json-url) and add the rows to the table (see
+ * loadPagesFromLink in script.js).
+ */
+function loadOlderOrders() {
+    let olderOrdersLink = document.getElementById("load-older-orders");
+    if(olderOrdersLink) {
+        loadPagesFromLink(
+            olderOrdersLink, document.getElementById("order-history-rows"), olderOrdersLink.dataset.jsonUrl, true
+        );
+    }
+}
+
+document.addEventListener("DOMContentLoaded", function () {
+    loadOlderOrders();
+});
@@ -3,10 +3,13 @@ import datetime
 from django.test import TestCase
 from django.contrib.auth.models import User
 from django.contrib.messages import get_messages
+from django.http import QueryDict
+from django.urls import reverse
 from products.models import Category, Product
-from checkout.models import Order
+from checkout.models import Order, OrderLineItem
 from markets.models import Market, County
 from .models import UserProfile, SavedMarketList
+from .views import ORDERS_PAGE_SIZE
 
 
 class TestProfileView(TestCase):
@@ -224,6 +227,106 @@ class TestProfileView(TestCase):
         self.assertEqual(len(response.context['orders']), 1)
 
 
+class TestOrderHistoryPages(TestCase):
+    """Tests for pages of order history on profile and order_history view"""
+    @classmethod
+    def setUpTestData(cls):
+        """
+        User with 300 orders, each with 3 line items of different products
+        """
+        User.objects.create_user(username='Shopper', password='secret')
+        profile = UserProfile.objects.get(user__username='Shopper')
+        category = Category.objects.create(
+            name='category', friendly_name='Category'
+        )
+        Product.objects.bulk_create(
+            Product(
+                category=category, name=f'Product {number}',
+                sku=f'sku{number}', description='description', price=10,
+            )
+            for number in range(20)
+        )
+        products = list(Product.objects.all())
+        Order.objects.bulk_create(
+            Order(
+                order_number=f'{number:032d}',
+                full_name='Name',
+                user_profile=profile,
+                email='email@email.com',
+                phone_number='123456',
+                street_address1='My Street',
+                town_or_city='My Town',
+                country='IE',
+            )
+            for number in range(300)
+        )
+        orders = profile.orders.all()
+        OrderLineItem.objects.bulk_create(
+            OrderLineItem(
+                order=order, product=products[(index + item) % 20],
+                quantity=1, lineitem_total=10,
+            )
+            for index, order in enumerate(orders) for item in range(3)
+        )
+        cls.newest_first = list(
+            profile.orders.order_by('-date', '-id')
+            .values_list('order_number', flat=True)
+            )
+
+    def setUp(self):
+        """Log in the user"""
+        self.client.login(username='Shopper', password='secret')
+
+    def test_query_count_is_fixed(self):
+        """
+        First page of orders, their line items and products fetched in one
+        query each, however many orders the user has
+        """
+        with self.assertNumQueries(6):
+            response = self.client.get(reverse('profile'))
+        self.assertEqual(len(response.context['orders']), ORDERS_PAGE_SIZE)
+        self.assertContains(response, 'id="load-older-orders"')
+        with self.assertNumQueries(6):
+            self.client.get(reverse('order_history'))
+
+    def test_pages_cover_all_orders(self):
+        """Following the cursors returns every order once, newest first"""
+        response = self.client.get(reverse('profile'))
+        seen = [order.order_number for order in response.context['orders']]
+        cursor = QueryDict(
+            response.context['older_orders_url'][1:]
+            )['cursor']
+        while cursor:
+            response = self.client.get(
+                reverse('order_history'), {'cursor': cursor}
+                )
+            seen.extend(
+                order.order_number for order in response.context['orders']
+                )
+            cursor = response.json()['next_cursor']
+        self.assertEqual(seen, self.newest_first)
+
+    def test_page_has_line_items(self):
+        """Rows for the orders list the products in each order"""
+        response = self.client.get(reverse('order_history'))
+        html = response.json()['html']
+        self.assertEqual(html.count('<tr>'), ORDERS_PAGE_SIZE)
+        self.assertEqual(html.count('x1'), ORDERS_PAGE_SIZE * 3)
+
+    def test_invalid_cursor_is_404(self):
+        """Altered cursor raises 404"""
+        response = self.client.get(
+            reverse('order_history'), {'cursor': 'bad'}
+            )
+        self.assertEqual(response.status_code, 404)
+
+    def test_redirects_if_not_logged_in(self):
+        """order_history view requires login"""
+        self.client.logout()
+        response = self.client.get(reverse('order_history'))
+        self.assertEqual(response.status_code, 302)
+
+
 class TestPreviousOrderDetailView(TestCase):
     """Tests for previous_order_detail view"""
     @classmethod
@@ -435,7 +538,7 @@ class TestUpdateSavedMarketsView(TestCase):
         saved_market_list = SavedMarketList.objects.create(
             user=user_profile
             )
-        markets = Market.objects.all()
+        markets = Market.objects.order_by('id')
         for market in markets:
             saved_market_list.market.add(market)
         self.client.login(username='Tester', password='SecretCode14')
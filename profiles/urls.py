@@ -5,6 +5,7 @@ from . import views
 
 urlpatterns = [
     path('', views.profile, name='profile'),
+    path('order_history/', views.order_history, name='order_history'),
     path(
         'order_history/<order_number>',
         views.previous_order_detail,
@@ -3,19 +3,47 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_POST
 from django.contrib import messages
-from django.http import Http404
+from django.http import Http404, JsonResponse
 from django.db.models.functions import Lower
+from django.template.loader import render_to_string
+from django.utils.http import urlencode
 from checkout.models import Order
+from pagination import get_page, InvalidCursor
 from markets.models import Market, County
 from .models import UserProfile, SavedMarketList
 from .forms import UserProfileForm
 
+# order history on profile page - newest first, id for a unique order
+ORDERS_ORDERING = ['-date', '-id']
+ORDERS_PAGE_SIZE = 10
+
+
+def _get_orders_page(request, user_profile):
+    """
+    Get the page of the user's orders after the 'cursor' in the GET request
+    (newest orders if no cursor), with the line items and their products
+    fetched in one query each for the whole page. Raise 404 if cursor is
+    not valid.
+    Returns list of orders and the cursor for the next (older) page
+    """
+    try:
+        return get_page(
+            user_profile.orders.prefetch_related('lineitems__product'),
+            ORDERS_ORDERING,
+            cursor=request.GET.get('cursor'),
+            page_size=ORDERS_PAGE_SIZE,
+            )
+    except InvalidCursor as error:
+        raise Http404 from error
+
 
 @login_required
 def profile(request):
     """
     Show the user profile page with form pre-populated with saved info and
-    order history list.
+    order history list - first page of orders (see _get_orders_page),
+    older_orders_url is the link to the next page, which order_history.js
+    loads with order_history view when it scrolls into view.
     If post request, update the profile with the data from the form.
     """
     user_profile = get_object_or_404(UserProfile, user=request.user)
@@ -30,16 +58,37 @@ def profile(request):
     else:
         form = UserProfileForm(instance=user_profile)
 
-    orders = user_profile.orders.all().order_by('-date')
+    orders, next_cursor = _get_orders_page(request, user_profile)
+    older_orders_url = None
+    if next_cursor:
+        older_orders_url = f'?{urlencode({"cursor": next_cursor})}'
     template = 'profiles/profile.html'
     context = {
         'form': form,
         'orders': orders,
+        'older_orders_url': older_orders_url,
     }
 
     return render(request, template, context)
 
 
+@login_required
+def order_history(request):
+    """
+    For the order history on the profile page - return a page of the user's
+    orders as JSON, with the table rows as a html fragment and the cursor
+    for the next page (null if there are no more orders).
+    """
+    user_profile = get_object_or_404(UserProfile, user=request.user)
+    orders, next_cursor = _get_orders_page(request, user_profile)
+    html = render_to_string(
+        'profiles/includes/order_history_rows.html',
+        {'orders': orders},
+        request=request,
+        )
+    return JsonResponse({'html': html, 'next_cursor': next_cursor})
+
+
 @login_required
 def previous_order_detail(request, order_number):
     """
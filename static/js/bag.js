@@ -0,0 +1,35 @@
+/**
+ * Bag in the header, loaded on every page (base.html). The pages don't include the bag total, so that they
+ * are the same for everyone and can be cached (see cache_headers.py) - it's loaded from the bag summary
+ * url after the page loads, and updated by script.js after a change to the bag.
+ */
+
+/**
+ * Show the bag icon (filled if there are items in the bag) and grand total in the header.
+ * @param {object} data object with product_count and grand_total, from the bag summary or cart JSON views
+ */
+function updateBagInHeader(data) {
+    let bagIcon = document.getElementById("bag-icon");
+    bagIcon.classList.toggle("bi-bag-fill", data.product_count > 0);
+    bagIcon.classList.toggle("bi-bag", data.product_count === 0);
+    document.getElementById("bag-total").textContent = `€${data.grand_total}`;
+}
+
+/**
+ * Load the bag summary after the page loads - the pages don't include it so that they can be cached.
+ * Show it in the header, and put the CSRF token from it into forms that don't have one (product
+ * details page for logged out users).
+ */
+function loadBagSummary() {
+    let bagLink = document.getElementById("bag-link");
+    if(bagLink) {
+        $.getJSON(bagLink.dataset.summaryUrl, function(data) {
+            updateBagInHeader(data);
+            for(let input of document.querySelectorAll('input[name="csrfmiddlewaretoken"][value=""]')) {
+                input.value = data.csrf_token;
+            }
+        });
+    }
+}
+
+document.addEventListener("DOMContentLoaded", loadBagSummary);
@@ -1,7 +1,9 @@
 /**
  * This file contains functions used throughout the site: select box sorting for shop
  * and markets pages, quantity inputs on cart and checkout, back to top btn, file name
- * for image upload field for markets and products.
+ * for image upload field for markets and products, infinite scroll on shop page, older comments on
+ * market details page, blurred placeholders for product and market images, adding to/updating the
+ * bag without reloading the page.
  */
 
 /**
@@ -15,6 +17,8 @@ function selectBoxSorting() {
     if(document.getElementById("sorting-selector")) {
         document.getElementById("sorting-selector").addEventListener("change", function() {
             let currentUrl = new URL(window.location);
+            // cursor is for the old order, so start again from page one
+            currentUrl.searchParams.delete("cursor");
             if(this.value != "reset"){
                 currentUrl.searchParams.set("sort", this.value.split("_")[0]);
                 currentUrl.searchParams.set("direction", this.value.split("_")[1]);
@@ -88,21 +92,100 @@ function enableDisableQtyBtns(itemId) {
     document.getElementById(`increment-qty_${itemId}`).disabled = plusDisabled;
 }
 
+/**
+ * Show the toast from a cart JSON view response (success toast with the bag summary, or error toast)
+ * in place of any toasts already showing, and update the bag icon and total in the header.
+ * @param {object} data the JSON response from add_to_cart_json/adjust_cart_json/remove_from_cart_json
+ */
+function showCartChange(data) {
+    let container = document.querySelector(".message-container");
+    if(!container) {
+        container = document.createElement("div");
+        container.className = "message-container";
+        container.setAttribute("aria-live", "polite");
+        container.setAttribute("aria-atomic", "true");
+        document.body.appendChild(container);
+    }
+    $(container).empty().append(data.toast);
+    $(container).find(".toast").toast("show");
+    updateBagInHeader(data);
+}
+
+/**
+ * Post a form or data to a cart JSON view, show the toast from the response, then call onSuccess with
+ * the response if the change was made (error responses have status 400 and only show the toast).
+ * @param {string} url the url of the JSON view
+ * @param {string|object} data the data to post, including the csrf token
+ * @param {function} onSuccess optional function to update the page with the response
+ */
+function postCartChange(url, data, onSuccess) {
+    $.post(url, data)
+        .done(function(response) {
+            showCartChange(response);
+            if(onSuccess) {
+                onSuccess(response);
+            }
+        })
+        .fail(function(xhr) {
+            if(xhr.responseJSON) {
+                showCartChange(xhr.responseJSON);
+            }
+        });
+}
+
+/**
+ * Update the cart page after a quantity change or removal: the item's subtotal and quantity (or remove
+ * its row if it was removed), and the totals. If the bag is now empty, reload to show the empty bag.
+ * @param {string} itemId the id of the product that changed
+ * @param {object} data the JSON response from adjust_cart_json/remove_from_cart_json
+ */
+function updateCartPage(itemId, data) {
+    if(data.product_count === 0) {
+        location.reload();
+        return;
+    }
+    if(data.item) {
+        document.getElementById(`subtotal-${itemId}`).textContent = data.item.subtotal;
+        document.getElementById(`id_qty_${itemId}`).value = data.item.quantity;
+        enableDisableQtyBtns(itemId);
+    } else {
+        let row = document.getElementById(`cart-item-${itemId}`);
+        if(row.nextElementSibling && row.nextElementSibling.tagName === "HR") {
+            row.nextElementSibling.remove();
+        }
+        row.remove();
+    }
+    document.getElementById("cart-total").textContent = data.total;
+    document.getElementById("cart-delivery").textContent = data.delivery;
+    document.getElementById("cart-grand-total").textContent = data.grand_total;
+    document.getElementById("cart-free-delivery-spend").textContent = data.free_delivery_spend_needed;
+    document.getElementById("cart-free-delivery").classList.toggle(
+        "d-none", parseFloat(data.free_delivery_spend_needed) === 0);
+}
+
 /**
  * Used in the cart page to submit the updated quantity. Using requestSubmit() in order to 
  * invoke html form constraint validation so min/max on form input is validated.
+ * The submitted form is posted to the adjust_cart_json view rather than reloading the page.
  */
 function submitQuantityUpdateForm() {
     if($('.update-link')) {
         $('.update-link').click(function() {
             $(this).prev('.update-form')[0].requestSubmit();
         });
+        $('.update-form').submit(function(event) {
+            event.preventDefault();
+            let itemId = $(this).find(".qty_input").attr("data-item_id");
+            postCartChange(this.dataset.jsonUrl, $(this).serialize(), function(data) {
+                updateCartPage(itemId, data);
+            });
+        });
     }
 }
 
 /**
- * Used in the cart page to remove item. When link is clicked, get csrf token and create url using 
- * item id, post the data to the url, and reload the page when done.
+ * Used in the cart page to remove item. When link is clicked, get csrf token and the url of the
+ * remove_from_cart_json view, post the data to the url, and update the page when done.
  * Credit: Code Institute, with some modifications
  */
 function removeItemFromCart() {
@@ -110,18 +193,27 @@ function removeItemFromCart() {
         $(".remove-item").click(function () {
             let csrfToken = this.getAttribute("data-csrf");
             let itemId = this.getAttribute("id").split("remove_")[1];
-            let url = `/cart/remove/${itemId}/`;
             let data = {
                 "csrfmiddlewaretoken": csrfToken
             };
-            $.post(url, data)
-                .done(function () {
-                    location.reload();
-                });
+            postCartChange(this.dataset.jsonUrl, data, function(response) {
+                updateCartPage(itemId, response);
+            });
         });
     }
 }
 
+/**
+ * Used in the product details page - post the Add to Bag form to the add_to_cart_json view, and show
+ * the bag summary in a toast, rather than reloading the page.
+ */
+function addToCartFromProductPage() {
+    $(".add-to-cart-form").submit(function(event) {
+        event.preventDefault();
+        postCartChange(this.dataset.jsonUrl, $(this).serialize());
+    });
+}
+
 /**
  * listen for click on link, scroll back to top of page
  */
@@ -146,6 +238,187 @@ function scrollBackToTop() {
         }
     }
 
+/**
+ * Load the next page of a list when its 'show more' link is clicked, instead of following the link.
+ * The page is got from jsonUrl, with the search parameters from the link (including the cursor), and
+ * its html is added to the end of the container. Then the link is updated with the cursor for the
+ * following page, or removed if there are no more. If loadOnScroll is true, the next page is also
+ * loaded automatically when the link scrolls into view. onPageAdded (optional) is called after each
+ * page is added.
+ */
+function loadPagesFromLink(link, container, jsonUrl, loadOnScroll, onPageAdded) {
+    let loading = false;
+    let observer = null;
+    let loadNextPage = function() {
+        if(loading) {
+            return;
+        }
+        loading = true;
+        let pageUrl = new URL(link.href);
+        $.getJSON(`${jsonUrl}${pageUrl.search}`)
+            .done(function(data) {
+                $(container).append(data.html);
+                if(onPageAdded) {
+                    onPageAdded();
+                }
+                if(data.next_cursor) {
+                    pageUrl.searchParams.set("cursor", data.next_cursor);
+                    link.href = pageUrl;
+                } else {
+                    if(observer) {
+                        observer.disconnect();
+                    }
+                    link.parentElement.remove();
+                }
+            })
+            .always(function() {
+                loading = false;
+            });
+    };
+    link.addEventListener("click", function(event) {
+        event.preventDefault();
+        loadNextPage();
+    });
+    if(loadOnScroll && "IntersectionObserver" in window) {
+        observer = new IntersectionObserver(function(entries) {
+            if(entries[0].isIntersecting) {
+                loadNextPage();
+            }
+        });
+        observer.observe(link);
+    }
+}
+
+/**
+ * Infinite scroll on the Shop page. If the 'show more' link exists, the next page of products is got
+ * from the products_page view and the product cards added to the page, when the link is clicked or
+ * scrolls into view (see loadPagesFromLink).
+ */
+function loadMoreProducts() {
+    let loadMoreLink = document.getElementById("load-more-products");
+    if(loadMoreLink) {
+        let productCards = document.getElementById("product-cards");
+        loadPagesFromLink(loadMoreLink, productCards, "/products/page/", true, function() {
+            decodeBlurhashPlaceholders(productCards);
+        });
+    }
+}
+
+/**
+ * Older comments on the Market details page. If the 'show older comments' link exists, when it's clicked
+ * the next page of comments is got from the market_comments view (data-json-url) and added to the end
+ * of the comments (see loadPagesFromLink).
+ */
+function loadOlderComments() {
+    let olderCommentsLink = document.getElementById("load-older-comments");
+    if(olderCommentsLink) {
+        loadPagesFromLink(
+            olderCommentsLink, document.getElementById("comments"), olderCommentsLink.dataset.jsonUrl, false
+        );
+    }
+}
+
+/**
+ * The digits of the base 83 numbers in a blurhash, in order.
+ * Decoding follows the BlurHash algorithm: https://github.com/woltapp/blurhash
+ */
+const BASE83 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~";
+
+/**
+ * Convert part of a blurhash from base 83 to a number.
+ * @param {string} text the base 83 digits
+ * @returns {number} the value of the digits
+ */
+function decodeBase83(text) {
+    let value = 0;
+    for(let character of text) {
+        value = value * 83 + BASE83.indexOf(character);
+    }
+    return value;
+}
+
+/**
+ * Convert an sRGB colour channel to linear light, which the blurhash colours are averaged in.
+ * @param {number} value the channel value, 0 to 255
+ * @returns {number} the linear value, 0 to 1
+ */
+function srgbToLinear(value) {
+    let v = value / 255;
+    return v <= 0.04045 ? v / 12.92 : Math.pow((v + 0.055) / 1.055, 2.4);
+}
+
+/**
+ * Convert a linear light colour channel back to sRGB for the canvas, clamped to the valid range.
+ * @param {number} value the linear value, 0 to 1
+ * @returns {number} the channel value, 0 to 255
+ */
+function linearToSrgb(value) {
+    let v = Math.max(0, Math.min(1, value));
+    return v <= 0.0031308 ? Math.round(v * 12.92 * 255) : Math.round((1.055 * Math.pow(v, 1 / 2.4) - 0.055) * 255);
+}
+
+/**
+ * Decode a blurhash to pixels: read the number of components and the colour of each from the hash,
+ * then add up the cosine of each component for every pixel.
+ * @param {string} hash the blurhash, from the data-blurhash attribute
+ * @param {number} width the width of the image to draw, in pixels
+ * @param {number} height the height of the image to draw, in pixels
+ * @returns {Uint8ClampedArray} RGBA values for each pixel, for ImageData
+ */
+function decodeBlurhash(hash, width, height) {
+    let sizeFlag = decodeBase83(hash[0]);
+    let numX = (sizeFlag % 9) + 1;
+    let numY = Math.floor(sizeFlag / 9) + 1;
+    let maximumValue = (decodeBase83(hash[1]) + 1) / 166;
+    let dc = decodeBase83(hash.substring(2, 6));
+    let colours = [[srgbToLinear(dc >> 16), srgbToLinear((dc >> 8) & 255), srgbToLinear(dc & 255)]];
+    for(let i = 1; i < numX * numY; i++) {
+        let value = decodeBase83(hash.substring(4 + i * 2, 6 + i * 2));
+        colours.push([Math.floor(value / 361), Math.floor(value / 19) % 19, value % 19].map(function(quantised) {
+            let v = (quantised - 9) / 9;
+            return Math.sign(v) * v * v * maximumValue;
+        }));
+    }
+    let pixels = new Uint8ClampedArray(width * height * 4);
+    for(let y = 0; y < height; y++) {
+        for(let x = 0; x < width; x++) {
+            let rgb = [0, 0, 0];
+            for(let j = 0; j < numY; j++) {
+                for(let i = 0; i < numX; i++) {
+                    let basis = Math.cos(Math.PI * x * i / width) * Math.cos(Math.PI * y * j / height);
+                    let colour = colours[i + j * numX];
+                    rgb = rgb.map((channel, index) => channel + colour[index] * basis);
+                }
+            }
+            let offset = 4 * (x + y * width);
+            pixels.set(rgb.map(linearToSrgb).concat(255), offset);
+        }
+    }
+    return pixels;
+}
+
+/**
+ * Draw the blurred placeholder behind product and market card images while they load. The
+ * blurhash in the data-blurhash attribute (computed in images/placeholders.py) is decoded to a
+ * small canvas, which is set as the background image of the element. The attribute is then
+ * removed, so placeholders aren't drawn again when more cards are added to the page.
+ * @param {Element} container optional element holding new cards, default the whole document
+ */
+function decodeBlurhashPlaceholders(container) {
+    let placeholders = (container || document).querySelectorAll("[data-blurhash]");
+    let canvas = document.createElement("canvas");
+    canvas.width = 32;
+    canvas.height = 32;
+    let context = canvas.getContext("2d");
+    for(let placeholder of placeholders) {
+        let imageData = context.createImageData(32, 32);
+        imageData.data.set(decodeBlurhash(placeholder.dataset.blurhash, 32, 32));
+        context.putImageData(imageData, 0, 0);
+        placeholder.style.backgroundImage = `url(${canvas.toDataURL()})`;
+        placeholder.removeAttribute("data-blurhash");
+    }
+}
+
 /** initialise the links/buttons that are listening for click/change events
 */
 document.addEventListener("DOMContentLoaded", function () {
@@ -153,6 +426,10 @@ document.addEventListener("DOMContentLoaded", function () {
     handleQuantityInput();
     submitQuantityUpdateForm();
     removeItemFromCart();
+    addToCartFromProductPage();
     scrollBackToTop();
     fileInputShowFileName();
+    loadMoreProducts();
+    loadOlderComments();
+    decodeBlurhashPlaceholders();
 });
\ No newline at end of file